@@ -1,191 +1,509 @@
-from Lexer import Lexer, Token 
+import io
+import sys
+from collections import deque
+
+from Lexer import KEYWORD_IDS, KEYWORD_LIST, KIND_NAMES, TOKEN_KINDS, Lexer, Token 
+
+# 语法分析的所有判断都只比较 Token.kind 这个整数 (见 Lexer.TOKEN_KINDS)。
+# 保留字的种类就是它的符号 id
+KW_PROGRAM, KW_TYPE, KW_VAR, KW_PROCEDURE, KW_BEGIN, KW_END, KW_IF, KW_READ, KW_WRITE, \
+    KW_THEN, KW_ELSE, KW_FI, KW_ENDWH, KW_INTEGER, KW_CHAR = (KEYWORD_IDS[name] for name in (
+        "program", "type", "var", "procedure", "begin", "end", "if", "read", "write",
+        "then", "else", "fi", "endwh", "integer", "char"))
+# 其他 Token 类型和分界符的种类
+K_EOF, K_ID, K_INTC, K_LPAREN, K_RPAREN, K_LBRACKET, K_RBRACKET, K_SEMI, K_COMMA, K_ASSIGN, K_EQ, K_DOT = (
+    TOKEN_KINDS[token_type] for token_type in ("EOF", "ID", "INTC", "(", ")", "[", "]", ";", ",", ":=", "=", "."))
+# 控制流语句中的语句序列在这些关键字处结束
+STM_LIST_END_KINDS = frozenset((KW_ELSE, KW_FI, KW_ENDWH, KW_END))
+# 表达式中二元运算符的优先级 (数值越大结合越紧)；关系运算符每层表达式最多出现一个。
+# BINARY_PRECEDENCE 按种类下标，不是二元运算符的种类为 None
+BINARY_OPERATOR_PRECEDENCE = {"<": 1, "=": 1, "+": 2, "-": 2, "*": 3, "/": 3}
+BINARY_PRECEDENCE = [BINARY_OPERATOR_PRECEDENCE.get(name) for name in KIND_NAMES]
+RELATIONAL_PRECEDENCE = 1
+
+# 语句的分派表：语句第一个 Token 的种类 -> 产生式方法名
+STATEMENT_PRODUCTIONS = {KW_IF: "conditional_stm", KW_READ: "input_stm", KW_WRITE: "output_stm", K_ID: "id_stm"}
+# 程序和过程中依次可选的声明部分：(开头关键字的种类, 产生式方法名)
+DECLARATION_PRODUCTIONS = ((KW_TYPE, "type_declarations"), (KW_VAR, "var_declarations"))
+# 类型名的分派表：种类 -> 节点类型 (IdK 是用户定义的类型名)
+TYPE_NAME_NODES = {KW_INTEGER: "IntegerK", KW_CHAR: "CharK", K_ID: "IdK"}
+# 能开始一条变量声明的种类 (目前只支持 integer、char 和用户定义类型名)
+VAR_DECLARATION_START_KINDS = frozenset(TYPE_NAME_NODES)
+
+# 错误恢复模式下各结构的同步集合 (Token 种类的集合)。
+# 某个结构出错后跳过 Token，直到当前 Token 的种类属于它的同步集合，再从那里继续解析。
+DECLARATION_HEAD_SYNC = frozenset((K_EOF, KW_TYPE, KW_VAR, KW_PROCEDURE, KW_BEGIN))
+DECLARATION_SYNC = frozenset((K_SEMI, K_EOF, KW_TYPE, KW_VAR, KW_PROCEDURE, KW_BEGIN))
+PROCEDURE_SYNC = frozenset((K_EOF, KW_PROCEDURE, KW_BEGIN))
+PARAM_LIST_SYNC = frozenset((K_RPAREN, K_EOF, KW_TYPE, KW_VAR, KW_PROCEDURE, KW_BEGIN))
+BEGIN_SYNC = frozenset((K_EOF, KW_BEGIN))
+BODY_STM_SYNC = frozenset((K_SEMI, K_EOF, KW_END))
+CONTROL_STM_SYNC = frozenset((K_SEMI, K_EOF)) | STM_LIST_END_KINDS
+CONDITION_SYNC = frozenset((K_SEMI, K_EOF, KW_THEN, KW_ELSE, KW_FI, KW_END))
+# 恢复模式默认最多记录的语法错误数，达到后停止解析
+DEFAULT_MAX_SYNTAX_ERRORS = 50
+
+# AST 中所有的节点类型。arena_ast 用下标作为节点类型编码，语义分析器按它建立分派表
+NODE_TYPES = ("ProK", "PheadK", "TypeK", "VarK", "ProcDecK", "DecK", "ParamListK", "IntegerK", "CharK", "IdK",
+              "StmLK", "StmtK", "ProcIdK", "ArgListK", "ExpK")
 
 class TreeNode:
-    def __init__(self, node_type, value=None):
+    __slots__ = ("node_type", "value", "children", "start", "sym")
+
+    def __init__(self, node_type, value=None, start=None, sym=None):
         self.node_type = node_type # AST 节点类型, e.g., "PheadK", "AssignK"
         self.value = value       # 节点关联的值, e.g., program name, operator, var name, const value
         self.children = []
+        self.start = start       # 节点对应 Token 在源码中的起始偏移，用于错误信息中的行:列
+        self.sym = sym           # 标识符节点 (程序名、类型名、变量名、过程名等) 的符号 id
 
     def add_child(self, child):
         if child is not None: # 确保不添加None子节点
             self.children.append(child)
 
-    def __str__(self, level=0):
-        indent = "  " * level # 使用两个空格作为缩进单位
-        node_str = f"{indent}{self.node_type}"
-        if self.value is not None: # 检查 value 是否为 None
-            node_str += f" {self.value}" # 书上的风格通常是类型和值在一行
-        
-        for child in self.children:
-            node_str += "\n" + child.__str__(level + 1)
-        return node_str
+    def __str__(self):
+        # 每个节点一行：两个空格一级缩进，类型和值在一行 (书上的风格)，见 write_ast
+        sink = io.StringIO()
+        write_ast(self, sink)
+        return sink.getvalue()
+
+# --- 表达式节点 ---
+# 语法分析器直接生成下面这些带类型字段的 ExpK 节点，语义分析按类型和字段判断，不再拆分 "Op +" 这类字符串。
+# 它们是 TreeNode 的子类：node_type 固定为 "ExpK"，value 和 children 在读取时按原来的编码现场生成
+# ("Op +"、"IdV x"、"Const 10"、"ArrayAccess")，所以按 TreeNode 读取 AST 的代码和 AST 的显示都不用改。
+class ExpNode(TreeNode):
+    __slots__ = ()
+    node_type = "ExpK"
+    children = ()
+
+class OpExp(ExpNode):
+    """二元运算 left op right，op 是运算符 Token 的类型 ("+"、"-"、"*"、"/"、"<"、"=")。"""
+    __slots__ = ("op", "left", "right")
+
+    def __init__(self, op, left, right, start=None):
+        self.op = op; self.left = left; self.right = right
+        self.start = start; self.sym = None
+
+    @property
+    def value(self): return f"Op {self.op}"
+
+    @property
+    def children(self): return [self.left, self.right]
+
+class IdExp(ExpNode):
+    """变量引用，sym 是变量名的符号 id。"""
+    __slots__ = ("name",)
+
+    def __init__(self, name, start=None, sym=None):
+        self.name = name
+        self.start = start; self.sym = sym
+
+    @property
+    def value(self): return f"IdV {self.name}"
+
+class ConstExp(ExpNode):
+    """整数常量，number 是 int。"""
+    __slots__ = ("number",)
+
+    def __init__(self, number, start=None):
+        self.number = number
+        self.start = start; self.sym = None
+
+    @property
+    def value(self): return f"Const {self.number}"
+
+class ArrayAccessExp(ExpNode):
+    """数组元素 array[index]，array 是 IdExp，index 是下标表达式。"""
+    __slots__ = ("array", "index")
+
+    def __init__(self, array, index, start=None):
+        self.array = array; self.index = index
+        self.start = start; self.sym = None
+
+    value = "ArrayAccess"
+
+    @property
+    def children(self): return [self.array, self.index]
+
+def to_plain_tree(node):
+    """把 AST 复制成只由普通 TreeNode 组成的树 (表达式节点换成 value 为字符串编码的 TreeNode)，供需要修改 children 的代码使用。"""
+    if node is None:
+        return None
+    plain = TreeNode(node.node_type, node.value, node.start, node.sym)
+    for child in node.children:
+        plain.add_child(to_plain_tree(child))
+    return plain
+
+# --- 语法分析的输入 ---
+# SNL 的语法只需要向前看 2 个 Token (当前 Token，以及 stm() 中区分过程调用和赋值时的下一个)
+PARSER_LOOKAHEAD = 2
+
+class LexicalError(Exception):
+    """语法分析取 Token 时词法分析器抛出的错误 (信息不变)，Parser.parse 不把它包装成语法错误。"""
+
+class TokenStream:
+    """
+    语法分析器的输入：按需从任意 Token 迭代器 (如 Lexer.iter_tokens()) 取 Token，
+    只在最多 lookahead 个元素的队列中保存尚未消耗的 Token，已消耗的 Token 不再被引用，可以被回收。
+    迭代器结束之后一直返回 Token("EOF", "EOF")。
+    """
+    def __init__(self, tokens, lookahead=PARSER_LOOKAHEAD):
+        self._pull_next = iter(tokens).__next__
+        self._current = None   # 当前 Token (None: 还没有取，或者已经被 advance() 消耗)
+        self._ahead = deque()  # 当前 Token 之后已经取到的 Token (最多 lookahead - 1 个)
+        self.lookahead = lookahead
+
+    def _pull(self):
+        try:
+            return self._pull_next()
+        except StopIteration:
+            return Token("EOF", "EOF")
+        except Exception as e:
+            # from None: 只转换异常类型，日志中的堆栈不再附带一份原异常的堆栈
+            raise LexicalError(str(e)) from None
+
+    def peek(self, k=0):
+        """返回当前 Token 之后的第 k 个 Token (k=0 即当前 Token)。"""
+        if self._current is None:
+            self._current = self._ahead.popleft() if self._ahead else self._pull()
+        if k == 0:
+            return self._current
+        if k >= self.lookahead:
+            raise Exception(f"内部错误: 向前看 {k} 个 Token 超出了缓冲区大小 {self.lookahead}")
+        ahead = self._ahead
+        while len(ahead) < k:
+            ahead.append(self._pull())
+        return ahead[k - 1]
+
+    def advance(self):
+        """消耗当前 Token。"""
+        if self._current is None:
+            self.peek()
+        self._current = None
+
+    def next(self):
+        """消耗当前 Token 并返回新的当前 Token (Parser.advance 的快速路径，等价于 advance() 后 peek())。"""
+        if self._current is None:
+            self.peek()
+        if self._ahead:
+            token = self._ahead.popleft()
+        else:
+            try:
+                token = self._pull_next()
+            except StopIteration:
+                token = Token("EOF", "EOF")
+            except Exception as e:
+                raise LexicalError(str(e)) from None
+        self._current = token
+        return token
+
+class _TooManySyntaxErrors(Exception):
+    """恢复模式下错误数达到上限，结束解析。"""
 
 class Parser: # 这个类名应该与你在 analyzer.py 中导入时使用的名称一致 (AS ASTParser)
-    def __init__(self, tokens):
-        self.tokens = tokens
-        self.pos = 0
-        self.current_token = self.tokens[self.pos] if self.pos < len(self.tokens) else Token("EOF", "EOF")
+    def __init__(self, tokens, line_index=None, recover=False, max_errors=DEFAULT_MAX_SYNTAX_ERRORS):
+        # tokens 可以是 Token 列表、任意 Token 迭代器或 TokenStream；Parser 只通过 TokenStream 按需取 Token
+        self.tokens = tokens if isinstance(tokens, TokenStream) else TokenStream(tokens)
+        self.pos = 0 # 已消耗的 Token 数，用于错误信息
+        self.current_token = self.tokens.peek()
         self.root = None
+        # Lexer.line_index：把 Token 的偏移换算成行:列，只在报错时使用
+        self.line_index = line_index
+        # 错误恢复模式：记录每个语法错误后跳到同步点继续解析，parse() 返回部分 AST，错误都在 errors 中
+        self.recover = recover
+        self.max_errors = max_errors
+        self.errors = []
+        self._last_error_pos = None # 最近一个被记录的错误所在的 Token 下标
+        # 按 Token 种类分派的产生式，绑定到本对象 (子类重写的产生式同样生效)
+        self._statement_productions = {kind: getattr(self, name) for kind, name in STATEMENT_PRODUCTIONS.items()}
+        self._declaration_productions = tuple((kind, getattr(self, name)) for kind, name in DECLARATION_PRODUCTIONS)
+
+    def _location(self, token):
+        """错误信息中 token 的行:列后缀；没有位置信息时为空串。"""
+        if self.line_index is not None and token.start is not None:
+            return f" ({self.line_index.describe(token.start)})"
+        return ""
+
+    def _error_context(self):
+        """错误信息末尾的出错位置说明。"""
+        return f"(在词法单元索引 {self.pos} 附近{self._location(self.current_token)}, 当前词法单元: {self.current_token})"
+
+    # --- 错误恢复 ---
+    def _record_error(self, message):
+        """
+        恢复模式下记录一个语法错误；达到 max_errors 时停止解析。
+        与上一个错误停在同一个 Token 上的错误 (如缺少 end 之后接着缺少 "." 和 "输入未完全解析") 是它引起的，不再记录。
+        """
+        if self.pos == self._last_error_pos:
+            return
+        self._last_error_pos = self.pos
+        if not message.startswith("语法错误"):
+            message = f"语法错误: {message}"
+        self.errors.append(f"{message} {self._error_context()}")
+        if len(self.errors) >= self.max_errors:
+            self.errors.append(f"语法错误过多 (已达到上限 {self.max_errors} 个)，停止语法分析。")
+            raise _TooManySyntaxErrors()
+
+    def _error(self, message):
+        """报告语法错误：普通模式抛出异常，恢复模式只记录下来，由调用者继续解析。"""
+        if not self.recover:
+            raise Exception(message)
+        self._record_error(message)
+
+    def _skip_to(self, sync):
+        """跳过 Token，直到当前 Token 的种类属于同步集合 sync。"""
+        while self.current_token.kind not in sync:
+            self.advance()
+
+    def guarded(self, production, sync):
+        """
+        调用产生式 production。恢复模式下它出错时记录错误、跳到同步点并返回 None (attach 会忽略 None)；
+        普通模式下直接调用，错误照常抛出。
+        """
+        if not self.recover:
+            return production()
+        try:
+            return production()
+        except (LexicalError, _TooManySyntaxErrors):
+            raise
+        except Exception as e:
+            self._record_error(str(e))
+            self._skip_to(sync)
+            return None
+
+    def expect(self, kind):
+        """匹配结构末尾的分界符：恢复模式下缺少时只记录错误，当作已经补上，返回 None。"""
+        if not self.recover or self.current_token.kind == kind:
+            return self.match_kind(kind)
+        try:
+            return self.match_kind(kind)
+        except Exception as e:
+            self._record_error(str(e))
+            return None
+
+    def statement_separator(self):
+        """
+        语句序列中一条语句之后：当前 Token 是 ";" 时消耗它，返回 True (后面还有语句)。
+        恢复模式下当前 Token 能开始一条语句时，是漏写了 ";"：记录错误，当作已经补上，同样返回 True。
+        """
+        if self.current_token.kind == K_SEMI:
+            self.advance()
+            return True
+        if self.recover and self.current_token.kind in self._statement_productions:
+            self.expect(K_SEMI)
+            return True
+        return False
+
+    def expect_keyword(self, keyword_sym, sync=None):
+        """
+        与 expect 相同，用于 begin / end / then / fi 等关键字。
+        给出 sync 时，缺少关键字后先跳到同步点，如果停在了这个关键字上就匹配它。
+        """
+        if not self.recover or self.current_token.kind == keyword_sym:
+            return self.match_keyword(keyword_sym)
+        try:
+            return self.match_keyword(keyword_sym)
+        except Exception as e:
+            self._record_error(str(e))
+        if sync is not None:
+            self._skip_to(sync)
+            if self.current_token.kind == keyword_sym:
+                return self.match_keyword(keyword_sym)
+        return None
+
+    # --- AST 构造 ---
+    # 各产生式只通过下面这些方法创建和连接节点；子类可以改用其他的 AST 存储 (见 arena_ast.ArenaParser)
+    def build_node(self, node_type, value=None, start=None, sym=None):
+        return TreeNode(node_type, value, start, sym)
+
+    def build_op(self, op, left, right, start=None):
+        return OpExp(op, left, right, start)
+
+    def build_id(self, name, start=None, sym=None):
+        return IdExp(name, start, sym)
+
+    def build_const(self, number, start=None):
+        return ConstExp(number, start)
+
+    def build_array_access(self, array, index, start=None):
+        return ArrayAccessExp(array, index, start)
+
+    def attach(self, parent, child):
+        parent.add_child(child)
+
+    def node_start(self, node):
+        return node.start
+
+    def has_children(self, node):
+        return bool(node.children)
 
     def advance(self):
         self.pos += 1
-        if self.pos < len(self.tokens):
-            self.current_token = self.tokens[self.pos]
-        else:
-            self.current_token = Token("EOF", "EOF")
+        self.current_token = self.tokens.next()
 
     def match(self, expected_type, expected_value=None):
+        # 错误信息不带位置：Parser.parse / _record_error 包装时由 _error_context() 统一给出
         token = self.current_token
         if token.type == expected_type:
             if expected_value is None or token.value == expected_value:
                 self.advance()
                 return token
             else:
-                raise Exception(f"语法错误: 期待值 {expected_value} for {expected_type}, 实际 {token.value} at pos {self.pos}")
+                raise Exception(f"语法错误: 期待值 {expected_value} for {expected_type}, 实际 {token.value}")
         else:
-            raise Exception(f"语法错误: 期待类型 {expected_type}, 实际 {token.type} ({token.value}) at pos {self.pos}")
+            raise Exception(f"语法错误: 期待类型 {expected_type}, 实际 {token.type} ({token.value})")
+
+    def match_kind(self, kind):
+        """匹配种类为 kind 的 Token，错误信息与 match(类型) 或 match("KEYWORD", 关键字) 相同。"""
+        token = self.current_token
+        if token.kind == kind:
+            self.advance()
+            return token
+        if kind < len(KEYWORD_LIST):
+            return self.match("KEYWORD", KIND_NAMES[kind]) # 抛出与原来相同的语法错误
+        return self.match(KIND_NAMES[kind])
+
+    def match_keyword(self, keyword_sym):
+        """匹配符号 id 为 keyword_sym 的关键字 (关键字的种类就是它的符号 id)。"""
+        return self.match_kind(keyword_sym)
 
     def program(self):
         # 1. node = TreeNode("ProK")
         #    首先，创建一个 TreeNode 对象，作为整个程序抽象语法树 (AST) 的根节点
-        node = TreeNode("ProK") 
+        node = self.build_node("ProK", start=self.current_token.start) 
+        self.root = node # 恢复模式下解析中途停止时，parse() 返回这棵部分 AST
         #接着，调用 self.program_head() 方法去解析程序的头部。
-        node.add_child(self.program_head())
-        #    检查当前的词法单元 (token) 是否是关键字 "type"。
-    #    如果是，说明接下来是类型声明部分。
-    #    于是调用 self.type_declarations() 方法去解析所有的类型声明。
-        if self.current_token.type == "KEYWORD" and self.current_token.value == "type":
-            node.add_child(self.type_declarations())
-#    类似地，检查当前的词法单元是否是关键字 "var"。
-    #    如果是，说明接下来是变量声明部分。
-    #    调用 self.var_declarations() 方法去解析所有的变量声明。
-        if self.current_token.type == "KEYWORD" and self.current_token.value == "var":
-            node.add_child(self.var_declarations())
+        self.attach(node, self.guarded(self.program_head, DECLARATION_HEAD_SYNC))
+        # 当前 Token 是 "type" / "var" 时解析对应的声明部分 (见 DECLARATION_PRODUCTIONS)
+        self.declaration_parts(node)
 #    只要当前的词法单元是关键字 "procedure"，就认为还有一个过程声明需要解析。
     #    调用 self.proc_declaration() 方法解析一个过程声明。
-        while self.current_token.type == "KEYWORD" and self.current_token.value == "procedure":
-            node.add_child(self.proc_declaration()) 
+        while self.current_token.kind == KW_PROCEDURE:
+            self.attach(node, self.guarded(self.proc_declaration, PROCEDURE_SYNC)) 
 
-        node.add_child(self.program_body())
-        self.match(".") 
+        self.attach(node, self.program_body())
+        self.expect(K_DOT) 
         return node
 
+    def declaration_parts(self, node):
+        """依次解析可选的类型声明和变量声明部分，接到 node 下。"""
+        for kind, production in self._declaration_productions:
+            if self.current_token.kind == kind:
+                self.attach(node, production())
+
     def program_head(self):
-        self.match("KEYWORD", "program") 
-        id_token = self.match("ID")
-        return TreeNode("PheadK", value=id_token.value)
+        self.match_keyword(KW_PROGRAM) 
+        id_token = self.match_kind(K_ID)
+        return self.build_node("PheadK", value=id_token.value, start=id_token.start, sym=id_token.sym)
 
     def type_declarations(self):
-        node = TreeNode("TypeK")
-        self.match("KEYWORD", "type") 
-        while self.current_token.type == "ID": 
-            type_id_token = self.match("ID")
-            self.match("=") 
-            type_name_node = self.type_name() 
-            self.match(";") 
-            
-            dec_node = TreeNode("DecK", value=type_id_token.value) 
-            dec_node.add_child(type_name_node) 
-            node.add_child(dec_node)
+        node = self.build_node("TypeK", start=self.match_keyword(KW_TYPE).start)
+        while self.current_token.kind == K_ID: 
+            dec_node = self.guarded(self.type_declaration, DECLARATION_SYNC)
+            if dec_node is None and self.current_token.kind == K_SEMI: # 出错后停在了这条声明末尾的 ";"
+                self.advance()
+            self.attach(node, dec_node)
         return node
 
+    def type_declaration(self):
+        type_id_token = self.match_kind(K_ID)
+        self.match_kind(K_EQ) 
+        type_name_node = self.type_name() 
+        self.match_kind(K_SEMI) 
+        
+        dec_node = self.build_node("DecK", value=type_id_token.value, start=type_id_token.start, sym=type_id_token.sym) 
+        self.attach(dec_node, type_name_node) 
+        return dec_node
+
     def type_name(self):
         token = self.current_token
-        if token.type == "KEYWORD":
-            if token.value == "integer":
-                self.advance()
-                return TreeNode("IntegerK")
-            elif token.value == "char":
-                self.advance()
-                return TreeNode("CharK")
-            # TODO: elif token.value == "array": return self.array_type_ast_node_creation()
-            # TODO: elif token.value == "record": return self.record_type_ast_node_creation()
-            else: 
+        node_type = TYPE_NAME_NODES.get(token.kind)
+        # TODO: array / record 类型: 在 TYPE_NAME_NODES 之外单独分派到 array_type / record_type 产生式
+        if node_type is None:
+            if token.type == "KEYWORD":
                 raise Exception(f"Unexpected keyword for type: {token.value}")
-        elif token.type == "ID": 
-            self.advance()
-            return TreeNode("IdK", value=token.value) 
-        else:
             raise Exception(f"Invalid token for type name: {token}")
+        self.advance()
+        if token.kind == K_ID: # 用户定义的类型名
+            return self.build_node(node_type, value=token.value, start=token.start, sym=token.sym)
+        return self.build_node(node_type, start=token.start)
 
     def var_declarations(self):
-        node = TreeNode("VarK")
-        self.match("KEYWORD", "var") 
+        node = self.build_node("VarK", start=self.match_keyword(KW_VAR).start)
         
-        while (self.current_token.type == "ID") or \
-              (self.current_token.type == "KEYWORD" and \
-               self.current_token.value in ["integer", "char"]): # 简化：目前只支持integer, char和用户定义类型ID
-                                                                  # 如果支持 array, record, 在此添加
-            
-            type_ast_node = self.type_name() 
-            
-            var_names_nodes = []
-            id_token = self.match("ID")
-            var_names_nodes.append(TreeNode("IdK", value=id_token.value)) 
-            
-            while self.current_token.type == ",":
-                self.match(",") 
-                id_token = self.match("ID")
-                var_names_nodes.append(TreeNode("IdK", value=id_token.value))
-            
-            self.match(";") 
-            
-            dec_node = TreeNode("DecK") 
-            dec_node.add_child(type_ast_node) 
-            for var_node in var_names_nodes:
-                dec_node.add_child(var_node)
-            node.add_child(dec_node)
+        while self.current_token.kind in VAR_DECLARATION_START_KINDS: # 如果支持 array, record, 在 TYPE_NAME_NODES 中添加
+            dec_node = self.guarded(self.var_declaration, DECLARATION_SYNC)
+            if dec_node is None and self.current_token.kind == K_SEMI: # 出错后停在了这条声明末尾的 ";"
+                self.advance()
+            self.attach(node, dec_node)
         return node
 
-    def proc_declaration(self):
-        self.match("KEYWORD", "procedure")
-        proc_name_token = self.match("ID")
-        proc_node = TreeNode("ProcDecK", value=proc_name_token.value)
+    def var_declaration(self):
+        type_ast_node = self.type_name() 
+        
+        var_names_nodes = []
+        id_token = self.match_kind(K_ID)
+        var_names_nodes.append(self.build_node("IdK", value=id_token.value, start=id_token.start, sym=id_token.sym)) 
+        
+        while self.current_token.kind == K_COMMA:
+            self.advance() 
+            id_token = self.match_kind(K_ID)
+            var_names_nodes.append(self.build_node("IdK", value=id_token.value, start=id_token.start, sym=id_token.sym))
+        
+        self.match_kind(K_SEMI) 
+        
+        dec_node = self.build_node("DecK", start=self.node_start(type_ast_node)) 
+        self.attach(dec_node, type_ast_node) 
+        for var_node in var_names_nodes:
+            self.attach(dec_node, var_node)
+        return dec_node
 
-        self.match("(")
-        if self.current_token.type != ")": 
-            param_dec_list_node = self.param_dec_list() 
-            proc_node.add_child(param_dec_list_node) 
-        self.match(")")
-        self.match(";")
+    def proc_declaration(self):
+        self.match_keyword(KW_PROCEDURE)
+        proc_name_token = self.match_kind(K_ID)
+        proc_node = self.build_node("ProcDecK", value=proc_name_token.value, start=proc_name_token.start, sym=proc_name_token.sym)
 
-        if self.current_token.type == "KEYWORD" and self.current_token.value == "type":
-            proc_node.add_child(self.type_declarations())
+        self.match_kind(K_LPAREN)
+        if self.current_token.kind != K_RPAREN: 
+            param_dec_list_node = self.guarded(self.param_dec_list, PARAM_LIST_SYNC) 
+            self.attach(proc_node, param_dec_list_node) 
+        self.match_kind(K_RPAREN)
+        self.match_kind(K_SEMI)
 
-        if self.current_token.type == "KEYWORD" and self.current_token.value == "var":
-            proc_node.add_child(self.var_declarations())
+        self.declaration_parts(proc_node)
 
-        proc_node.add_child(self.program_body()) 
+        self.attach(proc_node, self.program_body()) 
         return proc_node
 
     def param_dec_list(self):
-        param_list_node = TreeNode("ParamListK") 
+        param_list_node = self.build_node("ParamListK", start=self.current_token.start) 
         while True: 
             param_mode = "value" 
-            if self.current_token.type == "KEYWORD" and self.current_token.value == "var":
-                self.match("KEYWORD", "var")
+            param_start = self.current_token.start
+            if self.current_token.kind == KW_VAR:
+                self.advance()
                 param_mode = "var" 
             
             type_ast_node = self.type_name() 
             
             param_names_nodes = []
-            id_token = self.match("ID")
-            param_names_nodes.append(TreeNode("IdK", value=id_token.value))
+            id_token = self.match_kind(K_ID)
+            param_names_nodes.append(self.build_node("IdK", value=id_token.value, start=id_token.start, sym=id_token.sym))
             
-            while self.current_token.type == ",":
-                self.match(",")
-                id_token = self.match("ID")
-                param_names_nodes.append(TreeNode("IdK", value=id_token.value))
+            while self.current_token.kind == K_COMMA:
+                self.advance()
+                id_token = self.match_kind(K_ID)
+                param_names_nodes.append(self.build_node("IdK", value=id_token.value, start=id_token.start, sym=id_token.sym))
 
-            dec_node = TreeNode("DecK", value=f"{param_mode} param") 
-            dec_node.add_child(type_ast_node)
+            dec_node = self.build_node("DecK", value=f"{param_mode} param", start=param_start) 
+            self.attach(dec_node, type_ast_node)
             for name_node in param_names_nodes:
-                dec_node.add_child(name_node)
-            param_list_node.add_child(dec_node)
+                self.attach(dec_node, name_node)
+            self.attach(param_list_node, dec_node)
 
-            if self.current_token.type == ";":
-                self.match(";") 
-                if self.current_token.type == ")": 
+            if self.current_token.kind == K_SEMI:
+                self.advance() 
+                if self.current_token.kind == K_RPAREN: 
                     break 
             else: 
                 break
@@ -193,190 +511,195 @@ class Parser: # 这个类名应该与你在 analyzer.py 中导入时使用的名
 
     def program_body(self):
         #    函数首先期望并匹配关键字 "begin"。
-        self.match("KEYWORD", "begin")
+        begin_token = self.expect_keyword(KW_BEGIN, BEGIN_SYNC)
         #代表 "Statement List Kind"
-        stm_list_node = TreeNode("StmLK")
+        stm_list_node = self.build_node("StmLK", start=(begin_token or self.current_token).start)
         
-        if not (self.current_token.type == "KEYWORD" and self.current_token.value == "end"):
-            stm_node = self.stm()
-            stm_list_node.add_child(stm_node)
+        if self.current_token.kind != KW_END:
+            stm_node = self.guarded(self.stm, BODY_STM_SYNC)
+            self.attach(stm_list_node, stm_node)
         
-            while self.current_token.type == ";":
-                self.match(";") 
-                if self.current_token.type == "KEYWORD" and self.current_token.value == "end":
+            while self.statement_separator():
+                if self.current_token.kind == KW_END:
                     break 
-                if self.current_token.type == "EOF": 
-                    raise Exception("Unexpected EOF in statement list")
-                stm_node = self.stm()
-                stm_list_node.add_child(stm_node)
+                if self.current_token.kind == K_EOF: 
+                    self._error("Unexpected EOF in statement list")
+                    break
+                stm_node = self.guarded(self.stm, BODY_STM_SYNC)
+                self.attach(stm_list_node, stm_node)
         
-        self.match("KEYWORD", "end")
+        self.expect_keyword(KW_END)
         return stm_list_node
 
     def stm(self):
         token = self.current_token# 获取当前的词法单元，用于做决策
-        # 情况一：语句以关键字 (KEYWORD) 开头
+        # 按第一个 Token 的种类查 STATEMENT_PRODUCTIONS：if / read / write 开头的语句，或以标识符开头的调用/赋值
+        production = self._statement_productions.get(token.kind)
+        if production is not None:
+            return production()
         if token.type == "KEYWORD":
-            # 如果关键字是 "if"，那么这是一条条件语句。
-            # 将解析任务委托给 self.conditional_stm() 函数
-            if token.value == "if":
-                return self.conditional_stm()
-            elif token.value == "read":
-                return self.input_stm() # 调用修正后的 input_stm
-            elif token.value == "write":
-                return self.output_stm()
-            else:
-                raise Exception(f"Unexpected keyword statement: {token.value}")
-        elif token.type == "ID":
-            if self.pos + 1 < len(self.tokens) and self.tokens[self.pos+1].type == "(":
-                proc_id_token = self.match("ID")
-                call_node = TreeNode("StmtK", value="Call") 
-                call_node.add_child(TreeNode("ProcIdK", value=proc_id_token.value)) 
-                
-                self.match("(")
-                arg_list_node = TreeNode("ArgListK") 
-                if self.current_token.type != ")":
-                    arg_list_node.add_child(self.exp()) 
-                    while self.current_token.type == ",":
-                        self.match(",")
-                        arg_list_node.add_child(self.exp())
-                self.match(")")
-                if arg_list_node.children: 
-                    call_node.add_child(arg_list_node)
-                return call_node
-            else: 
-                assign_node = TreeNode("StmtK", value="Assign")
-                lhs_var_node = self.variable() 
-                assign_node.add_child(lhs_var_node)
-                self.match(":=") 
-                rhs_exp_node = self.exp()
-                assign_node.add_child(rhs_exp_node)
-                return assign_node
-        else:
-            raise Exception(f"Invalid start of statement: {token}")
+            raise Exception(f"Unexpected keyword statement: {token.value}")
+        raise Exception(f"Invalid start of statement: {token}")
+
+    def id_stm(self):
+        """以标识符开头的语句：下一个 Token 是 "(" 时为过程调用，否则为赋值。"""
+        if self.tokens.peek(1).kind == K_LPAREN:
+            return self.call_stm()
+        return self.assign_stm()
+
+    def call_stm(self):
+        proc_id_token = self.match_kind(K_ID)
+        call_node = self.build_node("StmtK", value="Call", start=proc_id_token.start) 
+        self.attach(call_node, self.build_node("ProcIdK", value=proc_id_token.value, start=proc_id_token.start, sym=proc_id_token.sym)) 
+        
+        arg_list_node = self.build_node("ArgListK", start=self.match_kind(K_LPAREN).start) 
+        if self.current_token.kind != K_RPAREN:
+            self.attach(arg_list_node, self.exp()) 
+            while self.current_token.kind == K_COMMA:
+                self.advance()
+                self.attach(arg_list_node, self.exp())
+        self.match_kind(K_RPAREN)
+        if self.has_children(arg_list_node): 
+            self.attach(call_node, arg_list_node)
+        return call_node
+
+    def assign_stm(self):
+        assign_node = self.build_node("StmtK", value="Assign", start=self.current_token.start)
+        lhs_var_node = self.variable() 
+        self.attach(assign_node, lhs_var_node)
+        self.match_kind(K_ASSIGN) 
+        rhs_exp_node = self.exp()
+        self.attach(assign_node, rhs_exp_node)
+        return assign_node
 
     def conditional_stm(self):
-        self.match("KEYWORD", "if")
-        if_node = TreeNode("StmtK", value="If")
-        condition_exp_node = self.exp() 
-        if_node.add_child(condition_exp_node)
-        self.match("KEYWORD", "then")
-        if_node.add_child(self.stm_list_for_control_flow()) # 使用独立的语句列表解析
-        if self.current_token.type == "KEYWORD" and self.current_token.value == "else":
-            self.match("KEYWORD", "else")
-            if_node.add_child(self.stm_list_for_control_flow()) # 使用独立的语句列表解析
+        if_token = self.match_keyword(KW_IF)
+        if_node = self.build_node("StmtK", value="If", start=if_token.start)
+        condition_exp_node = self.guarded(self.exp, CONDITION_SYNC) 
+        self.attach(if_node, condition_exp_node)
+        self.expect_keyword(KW_THEN)
+        self.attach(if_node, self.stm_list_for_control_flow()) # 使用独立的语句列表解析
+        if self.current_token.kind == KW_ELSE:
+            self.advance()
+            self.attach(if_node, self.stm_list_for_control_flow()) # 使用独立的语句列表解析
         else: 
-              if_node.add_child(TreeNode("StmLK")) 
-        self.match("KEYWORD", "fi")
+              self.attach(if_node, self.build_node("StmLK", start=self.current_token.start)) 
+        self.expect_keyword(KW_FI)
         return if_node
         
     def stm_list_for_control_flow(self):
-        list_node = TreeNode("StmLK")
+        list_node = self.build_node("StmLK", start=self.current_token.start)
         # SNL的if/while子句中的StmList至少有一个Stm
-        if self.current_token.type not in ["KEYWORD"] or \
-           self.current_token.value not in ["else", "fi", "endwh", "end"]: # 确保不是直接结束
-            list_node.add_child(self.stm())
-            while self.current_token.type == ";":
-                self.match(";")
-                if self.current_token.type == "KEYWORD" and \
-                   self.current_token.value in ["else", "fi", "endwh", "end"]:
+        if self.current_token.kind not in STM_LIST_END_KINDS: # 确保不是直接结束
+            self.attach(list_node, self.guarded(self.stm, CONTROL_STM_SYNC))
+            while self.statement_separator():
+                if self.current_token.kind in STM_LIST_END_KINDS:
                     break
-                list_node.add_child(self.stm())
+                self.attach(list_node, self.guarded(self.stm, CONTROL_STM_SYNC))
         return list_node
 
     # input_stm 方法中的修改点，确保子节点是正确的类型
     def input_stm(self):
-        self.match("KEYWORD", "read")
-        read_node = TreeNode("StmtK", value="Read")
-        self.match("(")
-        id_token = self.match("ID")
+        read_token = self.match_keyword(KW_READ)
+        read_node = self.build_node("StmtK", value="Read", start=read_token.start)
+        self.match_kind(K_LPAREN)
+        id_token = self.match_kind(K_ID)
         # 根据你的AST设计，read的子节点应该是变量本身，而不是ExpK。
         # 如果你的语义分析器期望read(x)的x是一个变量节点，那么这里应该是：
         # variable_node = TreeNode("IdK", value=id_token.value) # 或者更复杂的 self.variable() 如果read支持复杂变量
         # read_node.add_child(variable_node)
         # 如果你的设计确实是 ExpK IdV，那么你原来的也没错，但要确保一致性。
         # 我们暂时保留你原来的，但请注意这里的AST结构对后续分析很重要。
-        variable_expression_node = TreeNode("ExpK", value=f"IdV {id_token.value}")
-        read_node.add_child(variable_expression_node)
-        self.match(")")
+        variable_expression_node = self.build_id(id_token.value, start=id_token.start, sym=id_token.sym)
+        self.attach(read_node, variable_expression_node)
+        self.match_kind(K_RPAREN)
         return read_node
 
 
     def output_stm(self):
-        self.match("KEYWORD", "write")
-        write_node = TreeNode("StmtK", value="Write")
-        self.match("(")
+        write_token = self.match_keyword(KW_WRITE)
+        write_node = self.build_node("StmtK", value="Write", start=write_token.start)
+        self.match_kind(K_LPAREN)
         exp_node = self.exp() 
-        write_node.add_child(exp_node)
-        self.match(")")
+        self.attach(write_node, exp_node)
+        self.match_kind(K_RPAREN)
         return write_node
 
     def exp(self):
-        node = self.simple_exp()
-        if self.current_token.type in ["<", "="]: # 仅处理 < 和 = 作为关系运算符
-            op_token = self.current_token # self.match(self.current_token.type) 会消耗
-            self.advance() 
-            right_node = self.simple_exp()
-            op_node = TreeNode("ExpK", value=f"Op {op_token.value}") 
-            op_node.add_child(node) 
-            op_node.add_child(right_node) 
-            return op_node
-        else:
-            return node 
-
-    def simple_exp(self): 
-        node = self.term()
-        while self.current_token.type in ["+", "-"]:
-            op_token = self.current_token
-            self.advance()
-            right_node = self.term()
-            op_node = TreeNode("ExpK", value=f"Op {op_token.value}")
-            op_node.add_child(node)
-            op_node.add_child(right_node)
-            node = op_node 
-        return node
+        """
+        表达式: exp ::= simple_exp [(< | =) simple_exp]，simple_exp ::= term {(+ | -) term}，
+        term ::= factor {(* | /) factor}，factor ::= INTC | variable | ( exp )，variable ::= ID [ [ exp ] ]。
+        用优先级爬升代替逐层递归下降：每层括号或数组下标是一个上下文，有自己的操作数栈和运算符栈，
+        外层上下文保存在显式栈 contexts 中，所以嵌套深度和表达式长度都不受 Python 递归深度限制。
+        生成的 AST 和错误信息与逐层递归下降相同：同一优先级左结合，每层最多一个关系运算符 (第二个关系运算符留给调用者)。
+        """
+        contexts = [] # 外层上下文: (操作数栈, 运算符栈, 是否已有关系运算符, 结束符的种类, 数组下标所属的数组节点)
+        operands, operators, relational, closer, array_node = [], [], False, None, None
+        while True:
+            # 1. 读一个操作数；遇到 "(" 或数组下标的 "[" 时进入新的上下文
+            token = self.current_token
+            kind = token.kind
+            if kind == K_INTC:
+                self.advance()
+                operands.append(self.build_const(int(token.value), start=token.start))
+            elif kind == K_ID:
+                self.advance()
+                id_node = self.build_id(token.value, start=token.start, sym=token.sym)
+                if self.current_token.kind == K_LBRACKET:
+                    self.advance()
+                    contexts.append((operands, operators, relational, closer, array_node))
+                    operands, operators, relational, closer, array_node = [], [], False, K_RBRACKET, id_node
+                    continue
+                operands.append(id_node)
+            elif kind == K_LPAREN:
+                self.advance()
+                contexts.append((operands, operators, relational, closer, array_node))
+                operands, operators, relational, closer, array_node = [], [], False, K_RPAREN, None
+                continue
+            else:
+                raise Exception(f"Invalid factor: {token.type} ({token.value})")
 
-    def term(self): 
-        node = self.factor()
-        while self.current_token.type in ["*", "/"]: # 假设词法分析器能区分 / 和注释
-            op_token = self.current_token
+            # 2. 读一个运算符；当前 Token 不能接在这一层后面时，归约并结束这一层，回到外层继续
+            while True:
+                op_token = self.current_token
+                precedence = BINARY_PRECEDENCE[op_token.kind]
+                if precedence is not None and not (precedence == RELATIONAL_PRECEDENCE and relational):
+                    break
+                while operators:
+                    self._reduce_operator(operands, operators)
+                node = operands[0]
+                if not contexts:
+                    return node
+                self.match_kind(closer)
+                if closer == K_RBRACKET:
+                    node = self.build_array_access(array_node, node, start=self.node_start(array_node))
+                operands, operators, relational, closer, array_node = contexts.pop()
+                operands.append(node)
+            # 先归约栈顶优先级不低于它的运算符 (左结合)，再把它压栈
+            while operators and BINARY_PRECEDENCE[operators[-1].kind] >= precedence:
+                self._reduce_operator(operands, operators)
+            if precedence == RELATIONAL_PRECEDENCE:
+                relational = True
+            operators.append(op_token)
             self.advance()
-            right_node = self.factor()
-            op_node = TreeNode("ExpK", value=f"Op {op_token.value}")
-            op_node.add_child(node)
-            op_node.add_child(right_node)
-            node = op_node 
-        return node
 
-    def factor(self):
-        token = self.current_token
-        if token.type == "INTC":
-            self.advance()
-            return TreeNode("ExpK", value=f"Const {token.value}") # token.value 已是整数
-        elif token.type == "ID":
-            return self.variable() 
-        elif token.type == "(":
-            self.match("(")
-            exp_node = self.exp() 
-            self.match(")")
-            return exp_node 
-        else:
-            raise Exception(f"Invalid factor: {token.type} ({token.value})")
+    def _reduce_operator(self, operands, operators):
+        """弹出栈顶运算符和两个操作数，换成它们组成的运算节点。"""
+        op_token = operators.pop()
+        right_node = operands.pop()
+        operands[-1] = self.build_op(op_token.value, operands[-1], right_node, start=op_token.start)
 
     def variable(self):
-        id_token = self.match("ID")
-        var_node = TreeNode("ExpK", value=f"IdV {id_token.value}") 
+        id_token = self.match_kind(K_ID)
+        var_node = self.build_id(id_token.value, start=id_token.start, sym=id_token.sym)
 
         # 检查数组访问
-        if self.current_token.type == "[": 
-            self.match("[")
+        if self.current_token.kind == K_LBRACKET: 
+            self.advance()
             index_exp = self.exp() # 数组下标是表达式
-            self.match("]")
+            self.match_kind(K_RBRACKET)
             
-            access_node = TreeNode("ExpK", value="ArrayAccess") 
-            access_node.add_child(var_node) # 数组基变量 (已经是 ExpK IdV ...)
-            access_node.add_child(index_exp) # 索引表达式
-            return access_node 
+            return self.build_array_access(var_node, index_exp, start=id_token.start) # 数组基变量和索引表达式
         
         # TODO: 可以在这里添加对记录域访问 . 的处理
         # elif self.current_token.type == ".":
@@ -395,11 +718,13 @@ class Parser: # 这个类名应该与你在 analyzer.py 中导入时使用的名
         执行语法分析并返回AST的根节点。
         如果发生错误，则抛出异常。
         """
+        if self.recover:
+            return self._parse_with_recovery()
         try:
             # program() 方法是你的起始产生式，它应该返回整个程序的AST根节点
             ast_root_node = self.program()
 
-            if self.current_token.type != "EOF":
+            if self.current_token.kind != K_EOF:
                 # 如果所有Token没有被完全消耗 (除了最后的EOF)
                 raise SyntaxError(f"语法错误: 输入未完全解析，在 '{self.current_token}' 处停止。")
             
@@ -408,10 +733,26 @@ class Parser: # 这个类名应该与你在 analyzer.py 中导入时使用的名
         except SyntaxError as se: # 捕获在match或其他地方抛出的SyntaxError
             # print(f"语法分析失败: {se}") # GUI会处理错误的显示，这里可以不用打印
             raise # 将异常重新抛出，以便上层(GUI)捕获和处理
+        except LexicalError: # 词法错误原样传给上层，与先完成词法分析再解析时相同
+            raise
         except Exception as e: # 捕获其他可能的意外错误
             # print(f"语法分析过程中发生意外错误: {e}")
             # print(f"错误发生在词法单元索引 {self.pos} 附近, 当前词法单元: {self.current_token}")
-            raise SyntaxError(f"语法分析意外中断: {e} (在词法单元索引 {self.pos} 附近, 当前词法单元: {self.current_token})") # 包装成SyntaxError
+            raise SyntaxError(f"语法分析意外中断: {e} {self._error_context()}") # 包装成SyntaxError
+
+    def _parse_with_recovery(self):
+        """恢复模式的 parse()：返回 (可能不完整的) AST 根节点，所有错误 (包括词法错误) 记录在 self.errors 中。"""
+        try:
+            self.program()
+            if self.current_token.kind != K_EOF:
+                self._record_error(f"输入未完全解析，在 '{self.current_token}' 处停止。")
+        except _TooManySyntaxErrors:
+            pass
+        except LexicalError as e: # 词法错误之后无法再取 Token
+            self.errors.append(str(e))
+        except Exception as e: # 没有被任何结构恢复的错误
+            self.errors.append(f"语法分析意外中断: {e} {self._error_context()}")
+        return self.root
 
 # --- 主函数部分（用于测试，如果需要） ---
 def read_input_for_parser(): # 与 analyzer.py 中的 read_snl_input 区分
@@ -437,40 +778,118 @@ def read_input_for_parser(): # 与 analyzer.py 中的 read_snl_input 区分
 
 
 # --- 用于GUI调用的顶层函数 ---
-def generate_ast_from_source(source_code_string):
+def generate_ast_from_source(source_code_string, interner=None):
     """
     接收源代码字符串，执行词法分析和语法分析，返回AST根节点。
+    也可以传入文本文件对象 (文件、sys.stdin 等)：此时词法分析按块流式读取，源码不会整体读入内存。
+    interner 是本次编译的 SymbolInterner，语义分析要使用同一个，AST 节点中的符号 id 才有意义。
     如果发生错误，此函数会从 Lexer 或 Parser 传播异常。
     """
     # 1. 词法分析
-    lexer = Lexer(source_code_string) # Lexer的构造函数应接收源代码字符串
-    tokens = lexer.tokenize()         # tokenize() 应返回Token列表或抛出词法错误
+    if isinstance(source_code_string, str):
+        lexer = Lexer(source_code_string, interner=interner) # Lexer的构造函数应接收源代码字符串
+    else:
+        lexer = Lexer.from_stream(source_code_string, interner=interner)
+    # iter_tokens() 逐个产生Token或抛出词法错误；Parser 边解析边取 Token (词法和语法分析交替进行)，
+    # 已经解析过的 Token 随即可以回收，不再保存整个 Token 列表
 
     # 2. 语法分析
-    # (可选) 检查tokens是否为空或只有EOF，避免不必要的解析器实例化
-    if not tokens or (len(tokens) == 1 and tokens[0].type == "EOF"):
-        # 可以返回一个表示空程序的特殊节点，或抛出错误，或让Parser处理
-        # return TreeNode("EmptyProgramK") # 例如
-        pass # Parser的 __init__ 应该能处理空token列表的情况（通过检查长度）
-
-    parser_instance = Parser(tokens)    # Parser的构造函数应接收Token列表
+    parser_instance = Parser(lexer.iter_tokens(), line_index=lexer.line_index)
     ast_root = parser_instance.parse()  # parse() 应返回AST根节点或抛出语法错误
     
     return ast_root
 
+def parse_with_recovery(source_code_string, interner=None, max_errors=DEFAULT_MAX_SYNTAX_ERRORS):
+    """
+    与 generate_ast_from_source 相同，但使用错误恢复模式，一次报告所有语法错误而不是在第一个错误处停止。
+    返回 (AST 根节点, 错误信息列表)；有错误时 AST 只包含成功解析的部分 (源码开头就出错时可能为 None)。
+    """
+    if isinstance(source_code_string, str):
+        lexer = Lexer(source_code_string, interner=interner)
+    else:
+        lexer = Lexer.from_stream(source_code_string, interner=interner)
+    try:
+        parser_instance = Parser(lexer.iter_tokens(), line_index=lexer.line_index, recover=True, max_errors=max_errors)
+    except LexicalError as e: # 第一个 Token 就有词法错误
+        return None, [str(e)]
+    ast_root = parser_instance.parse()
+    return ast_root, parser_instance.errors
+
 # --- AST 格式化函数 (从 TreeNode 的 __str__ 方法独立出来，更灵活) ---
-def format_ast_to_display_string(ast_node_root):
+# write_ast 每攒够这么多行就写一次 sink，减少对文件或 GUI 控件的调用次数
+AST_WRITE_BATCH_LINES = 1024
+
+def write_ast(root, sink, max_depth=None, max_nodes=None):
+    """
+    用显式栈先序遍历 AST，边遍历边把文本写入 sink (任何有 write(str) 方法的对象：文件、io.StringIO、GUI 控件适配器等)。
+    每个节点一行，两个空格一级缩进，行与行之间用换行分隔 (末尾没有换行)，与原来的 TreeNode.__str__ 相同。
+    max_depth: 只显示到这一层 (根为第 0 层)，更深的子节点用一行 "..." 说明省略了多少个。
+    max_nodes: 最多显示这么多个节点，之后用一行 "..." 说明输出被截断。
+    不受递归深度限制；返回显示的节点数。
+    """
+    pieces = []
+    stack = [(root, 0)]
+    written = 0
+    while stack:
+        node, depth = stack.pop()
+        if max_nodes is not None and written >= max_nodes:
+            pieces.append(f"\n... (只显示前 {max_nodes} 个节点)")
+            break
+        indent = "  " * depth
+        value = node.value
+        pieces.append(f"{indent}{node.node_type}" if value is None else f"{indent}{node.node_type} {value}")
+        if written:
+            pieces[-1] = "\n" + pieces[-1]
+        written += 1
+        children = node.children
+        if children:
+            if max_depth is not None and depth >= max_depth:
+                pieces.append(f"\n{indent}  ... ({len(children)} 个子节点未显示)")
+            else:
+                stack.extend((child, depth + 1) for child in reversed(children))
+        if len(pieces) >= AST_WRITE_BATCH_LINES:
+            sink.write("".join(pieces))
+            pieces.clear()
+    if pieces:
+        sink.write("".join(pieces))
+    return written
+
+def format_ast_to_display_string(ast_node_root, max_depth=None, max_nodes=None):
     """
     将AST根节点转换为格式化的字符串，用于GUI显示。
-    实际上是调用 TreeNode 的 __str__ 方法。
+    由 write_ast 写入 io.StringIO 完成；max_depth / max_nodes 可以限制显示的层数和节点数。
     """
     if ast_node_root is None:
         return "AST未能生成 (根节点为 None)。"
-    return str(ast_node_root) # TreeNode.__str__ 会完成实际的格式化工作
+    sink = io.StringIO()
+    write_ast(ast_node_root, sink, max_depth, max_nodes)
+    return sink.getvalue()
 
 # --- 主函数部分（用于单独测试 ASTParser.py） ---
 # read_input_for_parser() 保持不变
 
+def check_files(paths, max_errors=DEFAULT_MAX_SYNTAX_ERRORS):
+    """批量检查源文件：每个文件用错误恢复模式解析一次，列出它的全部语法错误。返回有错误的文件数。"""
+    failed = 0
+    for path in paths:
+        try:
+            with open(path, encoding="utf-8") as f:
+                _, errors = parse_with_recovery(f, max_errors=max_errors)
+        except OSError as e:
+            errors = [f"无法读取文件: {e}"]
+        if errors:
+            failed += 1
+            print(f"{path}: {len(errors)} 个错误")
+            for message in errors:
+                print(f"  {message}")
+        else:
+            print(f"{path}: 通过")
+    return failed
+
+if __name__ == "__main__" and len(sys.argv) > 1:
+    # python ASTparser.py 文件1 文件2 ...   批量检查语法错误
+    sys.exit(1 if check_files(sys.argv[1:]) else 0)
+
 if __name__ == "__main__":
     try:
         source_code = read_input_for_parser() # 使用你原来的输入函数
@@ -492,9 +911,9 @@ if __name__ == "__main__":
                 if ast_tree_root:
                     print("语法分析成功！")
                     print("抽象语法树 (AST)：")
-                    # 使用独立的格式化函数来获取字符串
-                    formatted_ast_string = format_ast_to_display_string(ast_tree_root)
-                    print(formatted_ast_string)
+                    # 边遍历边写到标准输出，不先拼出整个字符串
+                    write_ast(ast_tree_root, sys.stdout)
+                    print()
                 else:
                     # generate_ast_from_source 在错误时应该抛出异常，所以这里理论上不会执行
                     print("AST 解析返回 None (可能在 generate_ast_from_source 中被捕获并返回了 None，应改为抛出异常)")
@@ -1,137 +1,524 @@
+import importlib
 import re
+import sys
+from array import array
+from bisect import bisect_right
 
 class Token:
-    def __init__(self, type_, value):
+    def __init__(self, type_, value, start=None, end=None, sym=None, kind=None):
         self.type = type_
         self.value = value
+        # Token 在源码中的字符偏移区间 [start, end)，由词法分析器从匹配结果中直接得到
+        self.start = start
+        self.end = end
+        # 标识符和关键字在 SymbolInterner 中的整数 id，其他 Token 为 None
+        self.sym = sym
+        # 整数种类 (见 TOKEN_KINDS)：每个关键字、每个分界符各占一个，语法分析只比较和查表这个整数。
+        # 扫描器直接给出；没有给出时按类型和值计算
+        self.kind = kind if kind is not None else token_kind(type_, value)
     
     def __str__(self):
         return f"({self.type}, {self.value})"
 
+class LineIndex:
+    """
+    行首偏移表：记录每一行第一个字符的偏移，用二分查找把字符偏移换算成 (行, 列)。
+    构造时传入完整源码则在第一次查询时才建表；流式读取时由 feed() 逐块追加。
+    行号和列号都从 1 开始。
+    """
+    def __init__(self, source=None):
+        self.line_starts = array("Q", [0])
+        self._length = 0 # 已登记的字符数
+        self._pending_source = source
+
+    def feed(self, text):
+        """登记紧接在已登记内容之后的一段文本中的换行位置。"""
+        base = self._length
+        append = self.line_starts.append
+        find = text.find
+        newline = find("\n")
+        while newline >= 0:
+            append(base + newline + 1)
+            newline = find("\n", newline + 1)
+        self._length += len(text)
+
+    def line_col(self, offset):
+        if self._pending_source is not None:
+            source, self._pending_source = self._pending_source, None
+            self.feed(source)
+        line = bisect_right(self.line_starts, offset)
+        return line, offset - self.line_starts[line - 1] + 1
+
+    def describe(self, offset):
+        line, column = self.line_col(offset)
+        return f"行:列 {line}:{column}"
+
+
+# 保留字列表，顺序即保留字的符号 id (0 .. len-1)，每次编译的 SymbolInterner 都预先登记它们
+KEYWORD_LIST = (
+    "program", "type", "var", "procedure", "begin", "end",
+    "if", "while", "read", "write", "then", "else", "fi",
+    "endwh", "integer", "char", "array", "record", "of"
+)
+KEYWORDS = frozenset(KEYWORD_LIST)
+KEYWORD_IDS = {name: sym for sym, name in enumerate(KEYWORD_LIST)}
+
+
+class SymbolInterner:
+    """
+    一次编译共用的标识符驻留表：每个不同的标识符 (或关键字) 对应一个小整数 id，只保存一份规范字符串。
+    关键字在构造时按 KEYWORD_LIST 的顺序预先登记，所以 id < keyword_count 就是关键字，
+    语法分析和符号表都可以用整数比较代替字符串比较。
+    """
+    def __init__(self):
+        self.names = list(KEYWORD_LIST) # id -> 规范字符串
+        self.ids = dict(KEYWORD_IDS)    # 字符串 -> id
+        self.keyword_count = len(KEYWORD_LIST)
+
+    def intern(self, name):
+        sym = self.ids.get(name)
+        if sym is None:
+            sym = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return sym
+
+    def get(self, name):
+        """name 的 id；没有登记过时返回 None (不登记，只用于查找)。"""
+        return self.ids.get(name)
+
+    def name(self, sym):
+        return self.names[sym]
+
+    def is_keyword(self, sym):
+        return sym < self.keyword_count
+
+    def __len__(self):
+        return len(self.names)
+
+# 定义词法单元的正则表达式规则
+# (Token类型/字面量, 正则表达式字符串, [可选] 值提取函数(matched_text) -> token_value)
+# 如果值提取函数为 None，则整个匹配文本用作值。
+# Token类型/字面量将用作 Token.type，除非被覆盖（例如关键字）。
+# 规则顺序就是匹配优先级：合并后的正则按从左到右的顺序尝试各个分支。
+TOKEN_SPECIFICATIONS = [
+    # 字符常量: e.g., 'a'
+    #点号 . 是正则表达式中的一个元字符 (metacharacter)，具有特殊含义。
+    #含义：它通常匹配除换行符 \n 之外的任意单个字符。 . 是一个通配符
+    ('CHARC',       r"\'(.)\'", lambda text: text[1]), #用于匹配一个被单引号包围的单个字符,看到 \ 后面跟着一个通常有特殊意义的字符时，一般表示“匹配这个字符本身”。
+    # 双字符分界符
+    (':=' ,         r':='),
+    ('..',          r'\.\.'),
+    # 标识符 (后续会检查是否为关键字)
+    ('ID',          r'[a-zA-Z][a-zA-Z0-9]*'),
+    # 无符号整数
+    ('INTC',       r'(0|[1-9][0-9]*)'),
+    # 单字符分界符 - Token类型和值都是该字符本身
+    ('+',           r'\+'),
+    ('-',           r'-'),
+    ('*',           r'\*'),
+    ('/',           r'/'),
+    ('<',           r'<'),
+    ('=',           r'='),
+    ('(',           r'\('),
+    (')',           r'\)'),
+    ('[',           r'\['),
+    (']',           r'\]'),
+    ('.',           r'\.'), # '.' 必须在 '..' 之后（通过规则顺序保证）
+    (';',           r';'),
+    (',',           r','),
+]
+
+# 不产生 Token 的分支：空白和 {...} 注释，排在所有规则之前。
+# \s 在 str 模式下与 str.isspace() 的判定一致。
+SKIP_SPECIFICATIONS = [
+    ("WS",      r"\s+"),
+    ("COMMENT", r"\{[^}]*\}"),
+]
+SKIP_GROUPS = tuple(name for name, _ in SKIP_SPECIFICATIONS)
+
+# 判定“确实无法匹配”所需的最多字符数（字符常量 'c' 需要 3 个字符）。
+# 流式扫描时，块末尾不足这么多字符的匹配失败可能只是被截断，需要等待下一块。
+MAX_LOOKAHEAD = 3
+
+# 流式读取时每次从文件对象读入的字符数
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+def build_master_regex(token_specifications):
+    """
+    把全部规则合并成一个命名分组的择一式正则 (master regex)。
+    返回 (编译后的正则, {分组名: (Token类型/字面量, 值提取函数)})。
+    空白和注释分支排在最前面，与原来“先跳空白、再处理注释、再匹配规则”的顺序一致。
+    """
+    parts = [f"(?P<{name}>{pattern_str})" for name, pattern_str in SKIP_SPECIFICATIONS]
+    group_actions = {}
+    for index, (cat_or_lit, pattern_str, *rest_ext) in enumerate(token_specifications):
+        group_name = f"T{index}"
+        parts.append(f"(?P<{group_name}>{pattern_str})")
+        group_actions[group_name] = (cat_or_lit, rest_ext[0] if rest_ext else None)
+    return re.compile("|".join(parts)), group_actions
+
+
+MASTER_REGEX, GROUP_ACTIONS = build_master_regex(TOKEN_SPECIFICATIONS)
+
+# 可选的扫描引擎：名称 -> (模块名, 扫描函数名)。"regex" 是 Lexer 自带的 master regex 扫描，
+# 其他引擎在第一次使用时才导入，扫描函数与 Lexer._scan 的参数和返回值约定相同。
+# "legacy" 是本文件中原来的逐字符手写扫描器 (见 legacy_scan)。
+SCAN_ENGINES = {
+    "regex": None,
+    "dfa": ("dfa_lexer", "dfa_scan"),
+    "legacy": (__name__, "legacy_scan"),
+}
+
+
+# --- 紧凑 Token 缓冲区 (struct-of-arrays) ---
+# Token 类型的小整数编码。分界符的值就是类型本身，不需要再从源码中切片。
+TOKEN_TYPES = ("EOF", "KEYWORD", "ID", "INTC", "CHARC") + tuple(
+    cat_or_lit for cat_or_lit, *_ in TOKEN_SPECIFICATIONS if cat_or_lit not in ("ID", "INTC", "CHARC"))
+TOKEN_TYPE_CODES = {token_type: code for code, token_type in enumerate(TOKEN_TYPES)}
+CODE_EOF, CODE_KEYWORD, CODE_ID, CODE_INTC, CODE_CHARC = range(5)
+# 每个正则分组对应的类型编码 (ID 分组在扫描时再区分关键字)
+GROUP_TYPE_CODES = {group_name: TOKEN_TYPE_CODES[cat_or_lit] for group_name, (cat_or_lit, _) in GROUP_ACTIONS.items()}
+
+
+# --- Token 种类 ---
+# Token.kind 的取值：关键字的种类就是它的符号 id (0 .. len(KEYWORD_LIST)-1)，
+# 其后依次是 EOF、ID、INTC、CHARC 和各个分界符 (与 TOKEN_TYPES 中除 KEYWORD 以外的顺序相同)。
+# KIND_NAMES[kind] 是关键字本身或 Token 类型，用于错误信息。
+KIND_NAMES = KEYWORD_LIST + tuple(token_type for token_type in TOKEN_TYPES if token_type != "KEYWORD")
+TOKEN_KINDS = {token_type: kind for kind, token_type in enumerate(KIND_NAMES) if kind >= len(KEYWORD_LIST)}
+KIND_EOF, KIND_ID, KIND_INTC, KIND_CHARC = (TOKEN_KINDS[token_type] for token_type in ("EOF", "ID", "INTC", "CHARC"))
+# TokenBuffer 的类型编码 -> 种类 (关键字的种类另按符号 id 得到，这里为 -1)
+CODE_KINDS = tuple(TOKEN_KINDS.get(token_type, -1) for token_type in TOKEN_TYPES)
+
+
+def token_kind(token_type, value):
+    """类型为 token_type、值为 value 的 Token 的种类。"""
+    if token_type == "KEYWORD":
+        return KEYWORD_IDS[value]
+    return TOKEN_KINDS[token_type]
+
+
+class TokenBuffer:
+    """
+    以并列数组 (array 模块) 保存 Token 序列：类型编码、起止偏移各一个数组。
+    Token 的值字符串和 Token 对象只在访问时才从源码中生成，
+    同时提供 len() / 下标 / 迭代等序列接口，可以直接交给 Parser 使用。
+    """
+    def __init__(self, source, interner=None):
+        self.source = source
+        # 标识符的符号 id 在生成 Token 对象时才查表
+        self.interner = interner if interner is not None else SymbolInterner()
+        # 偏移量数组的元素宽度按源码长度选择：4 GiB 以内用 4 字节
+        offset_typecode = "I" if len(source) < 2 ** 32 else "Q"
+        self.kinds = array("B")
+        self.starts = array(offset_typecode)
+        self.ends = array(offset_typecode)
+
+    def append(self, kind, start, end):
+        self.kinds.append(kind); self.starts.append(start); self.ends.append(end)
+
+    def type_at(self, index):
+        return TOKEN_TYPES[self.kinds[index]]
+
+    def value_at(self, index):
+        kind = self.kinds[index]
+        if kind in (CODE_KEYWORD, CODE_ID, CODE_INTC):
+            return self.source[self.starts[index]:self.ends[index]]
+        if kind == CODE_CHARC:
+            return self.source[self.starts[index] + 1:self.ends[index] - 1] # 去掉两侧的单引号
+        return TOKEN_TYPES[kind] # 分界符和 EOF 的值就是类型本身
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self.kinds)))]
+        if index < 0:
+            index += len(self.kinds)
+        kind = self.kinds[index]
+        value = self.value_at(index)
+        sym = None
+        if kind == CODE_ID or kind == CODE_KEYWORD:
+            sym = self.interner.intern(value)
+            value = self.interner.names[sym]
+        return Token(TOKEN_TYPES[kind], value, self.starts[index], self.ends[index], sym,
+                     sym if kind == CODE_KEYWORD else CODE_KINDS[kind])
+
+    def __iter__(self):
+        for index in range(len(self.kinds)):
+            yield self[index]
+
+
 class Lexer:
-    def __init__(self, source_code):
+    def __init__(self, source_code, engine="regex", interner=None):
         self.source = source_code # 不再添加末尾空格，正则表达式和边界检查会处理
         self.pos = 0
         self.tokens = []
-        # 保留字列表
-        self.keywords = {
-            "program", "type", "var", "procedure", "begin", "end",
-            "if", "while", "read", "write", "then", "else", "fi",
-            "endwh", "integer", "char", "array", "record", "of"
-        }
-
-        # 定义词法单元的正则表达式规则
-        # (Token类型/字面量, 正则表达式字符串, [可选] 值提取函数(match_obj) -> token_value)
-        # 如果值提取函数为 None，则 match.group(0) (整个匹配) 用作值。
-        # Token类型/字面量将用作 Token.type，除非被覆盖（例如关键字）。
-        token_specifications = [
-            # 字符常量: e.g., 'a'
-            #点号 . 是正则表达式中的一个元字符 (metacharacter)，具有特殊含义。
-            #含义：它通常匹配除换行符 \n 之外的任意单个字符。 . 是一个通配符
-            ('CHARC',       r"\'(.)\'", lambda m: m.group(1)), #用于匹配一个被单引号包围的单个字符,看到 \ 后面跟着一个通常有特殊意义的字符时，一般表示“匹配这个字符本身”。
-            # 双字符分界符
-            (':=' ,         r':='),        
-            ('..',          r'\.\.'),      
-            # 标识符 (后续会检查是否为关键字)
-            ('ID',          r'[a-zA-Z][a-zA-Z0-9]*'), 
-            # 无符号整数
-            ('INTC',       r'(0|[1-9][0-9]*)'),    
-            # 单字符分界符 - Token类型和值都是该字符本身
-            ('+',           r'\+'),
-            ('-',           r'-'),
-            ('*',           r'\*'),
-            ('/',           r'/'),
-            ('<',           r'<'),
-            ('=',           r'='),
-            ('(',           r'\('),
-            (')',           r'\)'),
-            ('[',           r'\['),
-            (']',           r'\]'),
-            ('.',           r'\.'), # '.' 必须在 '..' 之后（通过规则顺序保证）
-            (';',           r';'),
-            (',',           r','),
-        ]
-        
-        # 提取出词法单元类别、正则表达式字符串和可选的值提取函数。
-        # 将字符串形式的正则表达式编译成一个更高效的正则表达式对象。
-        # 将词法单元类别、编译后的正则表达式对象以及值提取函数重新组合成一个新的元组。
-        # 将这个新的元组存入 self.compiled_regex_rules 列表中。
-        
-        self.compiled_regex_rules = []
-        for cat_or_lit, pattern_str, *rest_ext in token_specifications:
-            extractor_fn = rest_ext[0] if rest_ext else None
-            # re.compile 编译正则表达式以提高效率
-            # match() 方法将从字符串开头匹配，这正是我们所需要的
-            self.compiled_regex_rules.append(
-                (cat_or_lit, re.compile(pattern_str), extractor_fn)
-            )
+        self.keywords = KEYWORDS
+        # 标识符驻留表：同一次编译的各阶段共用一个 (见 SymbolInterner)
+        self.interner = interner if interner is not None else SymbolInterner()
+        # 所有规则合并后的正则，模块导入时只编译一次
+        self.master_regex = MASTER_REGEX
+        # 偏移 -> (行, 列) 的换算表，只在需要报告位置时才建表
+        self.line_index = LineIndex(source_code)
+        # 流式模式下的输入文件对象 (见 from_stream)
+        self.stream = None
+        self.chunk_size = DEFAULT_CHUNK_SIZE
+        # 扫描引擎 (见 SCAN_ENGINES)，各引擎产生完全相同的 Token 序列
+        if engine not in SCAN_ENGINES:
+            raise Exception(f"未知的词法分析引擎: {engine} (可选: {', '.join(SCAN_ENGINES)})")
+        self.engine = engine
+        self._engine_scan = None
+        if SCAN_ENGINES[engine] is not None:
+            module_name, function_name = SCAN_ENGINES[engine]
+            self._engine_scan = getattr(importlib.import_module(module_name), function_name)
 
-    def tokenize(self):
-        while self.pos < len(self.source):
-            current_char = self.source[self.pos]
+    @classmethod
+    def from_stream(cls, stream, chunk_size=DEFAULT_CHUNK_SIZE, engine="regex", interner=None):
+        """
+        创建从文本文件对象 (文件、sys.stdin 等) 按块读取源码的词法分析器。
+        源码不会被整体读入内存，配合 iter_tokens() 使用。
+        """
+        lexer = cls(None, engine, interner)
+        lexer.stream = stream
+        lexer.line_index = LineIndex() # 随读入的块逐步登记
+        lexer.chunk_size = chunk_size
+        return lexer
 
-            # 1. 跳过空白字符 (手动处理)
-            if current_char.isspace():
-                self.pos += 1
+    def _raise_no_match(self, char, offset):
+        """在 offset 处没有任何规则能匹配：报告未闭合的注释或未知字符。"""
+        self.pos = offset
+        if char == "{":
+            raise Exception(f"词法错误: 未闭合的注释 从位置 {offset} 开始 ({self.line_index.describe(offset)})")
+        # 如果跳过了空白和注释后，没有任何规则匹配成功
+        raise Exception(f"词法错误: 未知字符 {char} 在位置 {offset} ({self.line_index.describe(offset)})")
+
+    def _scan(self, buffer, pos, end, base=0, final=True):
+        """
+        从 buffer[pos] 开始扫描到 end，逐个产生 Token，返回扫描停止的位置。
+        使用 master_regex.match(buffer, pos) 原地匹配，不再为每个 Token 复制剩余源码。
+        base 是 buffer[0] 在整个输入中的偏移，用于错误信息。
+        final 为 False 时 buffer 之后还有输入：碰到块末尾的 Token 或无法判定的匹配失败时提前停止，
+        由调用者补充下一块后从返回的位置继续。
+        """
+        if self._engine_scan is not None:
+            return (yield from self._engine_scan(self, buffer, pos, end, base, final))
+        match = self.master_regex.match
+        interner = self.interner
+        symbol_ids, symbol_names, keyword_count = interner.ids, interner.names, interner.keyword_count
+        while pos < end:
+            m = match(buffer, pos, end)
+            if m is None:
+                if not final and (buffer[pos] == "{" or end - pos < MAX_LOOKAHEAD):
+                    return pos # 可能只是被块边界截断（未闭合的注释、'c' 或 :=），等待更多输入
+                self._raise_no_match(buffer[pos], base + pos)
+
+            group_name = m.lastgroup
+            token_end = m.end()
+            if group_name in SKIP_GROUPS:
+                pos = token_end
                 continue
-            
-            # 2. 注释处理 (手动处理，以正确处理未闭合注释)
-            if current_char == "{":
-                start_comment_pos = self.pos
-                self.pos += 1 # 跳过 '{'
-                comment_closed = False
-                while self.pos < len(self.source):
-                    if self.source[self.pos] == "}":
-                        self.pos += 1 # 跳过 '}'
-                        comment_closed = True
+            if token_end == end and not final:
+                return pos # 标识符、整数或 '.' 可能在下一块中继续延伸
+
+            token_type, value_extractor_fn = GROUP_ACTIONS[group_name]
+            matched_text = m.group()
+            if token_type == "ID":
+                # 驻留标识符：关键字的 id 是预留的，一次字典查找同时完成关键字判断
+                sym = symbol_ids.get(matched_text)
+                kind = KIND_ID
+                if sym is None:
+                    sym = interner.intern(matched_text)
+                elif sym < keyword_count:
+                    token_type = "KEYWORD" # 如果是关键字，覆盖类型
+                    kind = sym # 关键字的种类就是它的符号 id
+                yield Token(token_type, symbol_names[sym], base + pos, base + token_end, sym, kind)
+            else:
+                # 对于分界符，规则的字面量本身就是类型，匹配文本也是值，例如：Token("+", "+")
+                # 对于 CHARC，值提取函数取出引号中的字符
+                yield Token(token_type, value_extractor_fn(matched_text) if value_extractor_fn else matched_text,
+                            base + pos, base + token_end, None, TOKEN_KINDS[token_type])
+            pos = token_end
+        self.pos = base + pos
+        return pos
+
+    def _iter_stream_tokens(self):
+        """按 chunk_size 分块读取 self.stream 并产生 Token，内存占用与块大小成正比。"""
+        read = self.stream.read
+        buffer, base, pos, final = "", self.pos, 0, False
+        while not final:
+            chunk = read(self.chunk_size)
+            final = not chunk
+            self.line_index.feed(chunk)
+            # 只保留上一块中尚未扫描的尾部（被截断的 Token），与新块拼接
+            buffer, base, pos = buffer[pos:] + chunk, base + pos, 0
+            pos = yield from self._scan(buffer, pos, len(buffer), base, final)
+
+            if not final and pos < len(buffer) and buffer[pos] == "{":
+                # 跨块的注释：只在后续块中查找 '}'，不累积注释内容
+                comment_start = base + pos
+                consumed = base + len(buffer)
+                while True:
+                    chunk = read(self.chunk_size)
+                    if not chunk:
+                        self._raise_no_match("{", comment_start)
+                    self.line_index.feed(chunk)
+                    close = chunk.find("}")
+                    if close >= 0:
+                        buffer, base, pos = chunk, consumed, close + 1
                         break
-                    self.pos += 1
-                
-                if not comment_closed:
-                    raise Exception(f"词法错误: 未闭合的注释 从位置 {start_comment_pos} 开始")
-                continue # 注释处理完毕，继续下一轮循环
-
-            # 3. 应用正则表达式规则匹配其他词法单元
-            match_found_for_current_pos = False
-            substring_to_match = self.source[self.pos:]
-
-            for token_category, regex_obj, value_extractor_fn in self.compiled_regex_rules:
-                match = regex_obj.match(substring_to_match) # match() 从子字符串的开头尝试匹配
-                
-                if match:
-                    matched_text = match.group(0) # 完整匹配的文本
-                    token_value = matched_text # 默认为完整匹配文本
-                    
-                    if value_extractor_fn:
-                        token_value = value_extractor_fn(match) # 例如，对CHARC提取group(1)
-
-                    token_type = token_category
-
-                    if token_category == 'ID':
-                        if matched_text in self.keywords:
-                            token_type = "KEYWORD" # 如果是关键字，覆盖类型
-                        # token_value 保持为标识符字符串，如 "program" 或 "myVar"
-                    elif token_category in ['+', '-', '*', '/', '<', '=', '(', ')', '[', ']', '.', ';', ',', ':=', '..']:
-                        # 对于这些操作符/分界符，token_category 本身就是类型，
-                        # matched_text (即 token_category) 也是值
-                        token_type = matched_text 
-                        token_value = matched_text # 例如：Token("+", "+")
-                    
-                    # 对于 'CHARC', 'INTC'，token_type 就是 'CHARC' 或 'INTC'
-                    # token_value 已经是处理后的值 (字符或数字字符串)
-
-                    self.tokens.append(Token(token_type, token_value))
-                    self.pos += len(matched_text) # 更新位置，跳过已匹配的文本
-                    match_found_for_current_pos = True
-                    break # 找到了一个匹配，跳出规则循环，处理下一个字符位置
-            
-            if not match_found_for_current_pos:
-                # 如果跳过了空白和注释后，没有正则表达式规则匹配成功
-                raise Exception(f"词法错误: 未知字符 {self.source[self.pos]} 在位置 {self.pos}")
-        
-        self.tokens.append(Token("EOF", "EOF"))
+                    consumed += len(chunk)
+
+    def iter_tokens(self):
+        """
+        以生成器方式逐个产生 Token（最后是 EOF），不构建 self.tokens 列表。
+        由 from_stream 创建时从文件对象分块读取，否则扫描内存中的 self.source。
+        """
+        if self.stream is not None:
+            yield from self._iter_stream_tokens()
+        else:
+            yield from self._scan(self.source, self.pos, len(self.source))
+        yield Token("EOF", "EOF", self.pos, self.pos, None, KIND_EOF)
+
+    def tokenize(self):
+        self.tokens.extend(self.iter_tokens())
         return self.tokens
 
+    def tokenize_to_buffer(self):
+        """
+        与 tokenize() 产生相同的 Token 序列，但存入紧凑的 TokenBuffer，
+        只记录类型编码和起止偏移，不为每个 Token 创建对象和值字符串。
+        """
+        source = self.source
+        buffer = TokenBuffer(source, self.interner)
+        if self._engine_scan is not None:
+            for token in self.iter_tokens():
+                buffer.append(TOKEN_TYPE_CODES[token.type], token.start, token.end)
+            return buffer
+        kinds, starts, ends = buffer.kinds.append, buffer.starts.append, buffer.ends.append
+        match = self.master_regex.match
+        intern = self.interner.intern
+        keyword_count = self.interner.keyword_count
+        pos, end = self.pos, len(source)
+        while pos < end:
+            m = match(source, pos, end)
+            if m is None:
+                self._raise_no_match(source[pos], pos)
+            group_name = m.lastgroup
+            token_end = m.end()
+            if group_name not in SKIP_GROUPS:
+                kind = GROUP_TYPE_CODES[group_name]
+                if kind == CODE_ID and intern(m.group()) < keyword_count:
+                    kind = CODE_KEYWORD
+                kinds(kind); starts(pos); ends(token_end)
+            pos = token_end
+        self.pos = pos
+        buffer.append(CODE_EOF, end, end)
+        return buffer
+
+# --- 原来的手写扫描器 ("legacy" 引擎) ---
+def legacy_scan(lexer, buffer, pos, end, base=0, final=True):
+    """
+    原来逐字符判断的手写扫描器，保留为 "legacy" 引擎用于性能对比 (benchmark.py lexer_engines)。
+    参数和返回值约定与 Lexer._scan 相同。为了与正则引擎的输出完全一致，相对原来的实现做了几处修正：
+    '..' 在 '.' 之前判断；标识符和整数只接受 ASCII 字母和数字，整数按 INTC 规则不以 0 开头；
+    字符常量中间不能是换行符；修正 char_value 可能未赋值的错误；错误信息与正则引擎相同。
+    """
+    interner = lexer.interner
+    while pos < end:
+        char = buffer[pos]
+
+        # 跳过空白字符
+        if char.isspace():
+            pos += 1
+            continue
+
+        # 单字符分界符 ('.' 可能是 '..' 的开头，在后面单独处理)
+        if char in "+-*/<=()[];,":
+            yield Token(char, char, base + pos, base + pos + 1)
+            pos += 1
+            continue
+
+        # 双字符分界符 :=
+        if char == ":":
+            if pos + 1 < end and buffer[pos + 1] == "=":
+                yield Token(":=", ":=", base + pos, base + pos + 2)
+                pos += 2
+                continue
+            if pos + 1 >= end and not final:
+                return pos # '=' 可能在下一块中
+
+        # 注释处理
+        if char == "{":
+            comment_end = pos + 1
+            while comment_end < end and buffer[comment_end] != "}":
+                comment_end += 1
+            if comment_end < end:
+                pos = comment_end + 1 # 跳过 }
+                continue
+            if not final:
+                return pos
+            lexer._raise_no_match(char, base + pos)
+
+        # 数组下标界限符 .. 和单字符分界符 .
+        if char == ".":
+            if pos + 1 < end and buffer[pos + 1] == ".":
+                yield Token("..", "..", base + pos, base + pos + 2)
+                pos += 2
+                continue
+            if pos + 1 >= end and not final:
+                return pos
+            yield Token(".", ".", base + pos, base + pos + 1)
+            pos += 1
+            continue
+
+        # 字符起始和结束符 '
+        if char == "'":
+            if pos + 2 < end and buffer[pos + 2] == "'" and buffer[pos + 1] != "\n":
+                char_value = buffer[pos + 1] # Allow any single character
+                yield Token("CHARC", char_value, base + pos, base + pos + 3)
+                pos += 3
+                continue
+            if end - pos < 3 and not final:
+                return pos
+
+        # 标识符或保留字
+        if char.isascii() and char.isalpha():
+            identifier = char
+            identifier_end = pos + 1
+            while identifier_end < end and buffer[identifier_end].isascii() and buffer[identifier_end].isalnum():
+                identifier += buffer[identifier_end]
+                identifier_end += 1
+            if identifier_end == end and not final:
+                return pos # 标识符可能在下一块中继续
+            sym = interner.intern(identifier)
+            token_type = "KEYWORD" if sym < interner.keyword_count else "ID"
+            yield Token(token_type, interner.names[sym], base + pos, base + identifier_end, sym)
+            pos = identifier_end
+            continue
+
+        # 无符号整数
+        if char.isascii() and char.isdigit():
+            number = char
+            number_end = pos + 1
+            if char != "0": # 0 单独构成一个整数
+                while number_end < end and buffer[number_end].isascii() and buffer[number_end].isdigit():
+                    number += buffer[number_end]
+                    number_end += 1
+            if number_end == end and not final:
+                return pos
+            yield Token("INTC", number, base + pos, base + number_end)
+            pos = number_end
+            continue
+
+        # 错误处理
+        lexer._raise_no_match(char, base + pos)
+    lexer.pos = base + pos
+    return pos
+
+
 def read_input():
     print("请输入 SNL 源程序（以空行结束输入）：")
     lines = []
@@ -144,6 +531,29 @@ def read_input():
 
 def main():
     try:
+        if len(sys.argv) > 2 and sys.argv[1] == "--mmap":
+            # 映射文件后按字节扫描，不把源码读成 str (见 mmap_lexer.py)
+            from mmap_lexer import tokenize_file
+            buffer = tokenize_file(sys.argv[2])
+            try:
+                for index in range(len(buffer)):
+                    print(buffer[index])
+            finally:
+                buffer.close()
+            return
+
+        if len(sys.argv) > 1:
+            # 从文件 (或 "-" 表示标准输入) 流式读取，边扫描边输出 Token
+            path = sys.argv[1]
+            stream = sys.stdin if path == "-" else open(path, encoding="utf-8")
+            try:
+                for token in Lexer.from_stream(stream).iter_tokens():
+                    print(token)
+            finally:
+                if stream is not sys.stdin:
+                    stream.close()
+            return
+
         # 从键盘读取输入
         source_code = read_input()
         if not source_code.strip():
@@ -164,135 +574,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
-
-
-# import re
-
-# class Token:
-#     def __init__(self, type_, value):
-#         self.type = type_
-#         self.value = value
-    
-#     def __str__(self):
-#         return f"({self.type}, {self.value})"
-
-# class Lexer:
-#     def __init__(self, source_code):
-#         self.source = source_code + " "  # 添加末尾空格避免越界
-#         self.pos = 0
-#         self.tokens = []
-#         # 保留字列表
-#         self.keywords = {
-#             "program", "type", "var", "procedure", "begin", "end",
-#             "if", "while", "read", "write", "then", "else", "fi",
-#             "endwh", "integer", "char", "array", "record", "of"
-#         }
-
-#     def tokenize(self):
-#         while self.pos < len(self.source):
-#             char = self.source[self.pos]
-            
-#             # 跳过空白字符
-#             if char.isspace():
-#                 self.pos += 1
-#                 continue
-            
-#             # 单字符分界符
-#             if char in "+-*/<=()[].;,":
-#                 self.tokens.append(Token(char, char))
-#                 self.pos += 1
-#                 continue
-            
-#             # 双字符分界符 :=
-#             if char == ":" and self.pos + 1 < len(self.source) and self.source[self.pos + 1] == "=":
-#                 self.tokens.append(Token(":=", ":="))
-#                 self.pos += 2
-#                 continue
-            
-#             # 注释处理
-#             if char == "{":
-#                 self.pos += 1
-#                 while self.pos < len(self.source) and self.source[self.pos] != "}":
-#                     self.pos += 1
-#                 if self.pos < len(self.source):
-#                     self.pos += 1  # 跳过 }
-#                 else:
-#                     raise Exception("词法错误: 未闭合的注释")
-#                 continue
-            
-#             # 数组下标界限符 ..
-#             if char == "." and self.pos + 1 < len(self.source) and self.source[self.pos + 1] == ".":
-#                 self.tokens.append(Token("..", ".."))
-#                 self.pos += 2
-#                 continue
-            
-#             # 字符起始和结束符 '
-#             if char == "'":
-#                 if self.pos + 2 < len(self.source) and self.source[self.pos + 2] == "'":
-#                     char_value = self.source[self.pos + 1]
-#                 if len(char_value) == 1:  # Allow any single character
-#                 # if len(char_value) == 1 and char_value.isalnum():
-#                     self.tokens.append(Token("CHARC", char_value))
-#                     self.pos += 3
-#                     continue
-#                 raise Exception(f"词法错误: 无效的字符常量 在位置 {self.pos}")
-#             # 标识符或保留字
-#             if char.isalpha():
-#                 identifier = char
-#                 self.pos += 1
-#                 while self.pos < len(self.source) and (self.source[self.pos].isalnum()):
-#                     identifier += self.source[self.pos]
-#                     self.pos += 1
-#                 token_type = "KEYWORD" if identifier in self.keywords else "ID"
-#                 self.tokens.append(Token(token_type, identifier))
-#                 continue
-            
-#             # 无符号整数
-#             if char.isdigit():
-#                 number = char
-#                 self.pos += 1
-#                 while self.pos < len(self.source) and self.source[self.pos].isdigit():
-#                     number += self.source[self.pos]
-#                     self.pos += 1
-#                 self.tokens.append(Token("INTC", number))
-#                 continue
-            
-#             # 错误处理
-#             raise Exception(f"词法错误: 未知字符 {char} 在位置 {self.pos}")
-        
-#         self.tokens.append(Token("EOF", "EOF"))
-#         return self.tokens
-
-# def read_input():
-#     print("请输入 SNL 源程序（以空行结束输入）：")
-#     lines = []
-#     while True:
-#         line = input()
-#         if line.strip() == "":
-#             break
-#         lines.append(line)
-#     return "\n".join(lines)
-
-# def main():
-#     try:
-#         # 从键盘读取输入
-#         source_code = read_input()
-#         if not source_code.strip():
-#             print("错误: 输入为空")
-#             return
-        
-#         # 创建词法分析器并生成 Token 序列
-#         lexer = Lexer(source_code)
-#         tokens = lexer.tokenize()
-        
-#         # 输出 Token 序列
-#         print("\n生成的 Token 序列：")
-#         for token in tokens:
-#             print(token)
-            
-#     except Exception as e:
-#         print(f"错误: {e}")
-
-# if __name__ == "__main__":
-#     main()
\ No newline at end of file
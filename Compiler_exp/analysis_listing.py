@@ -0,0 +1,124 @@
+# analysis_listing.py
+# 语义分析日志 (listing.txt 和 GUI 中显示的内容)。
+# 分析时只记录紧凑的结构化事件：说明文字、声明 (符号表条目的引用)、进入/退出过程作用域、符号表快照和错误；
+# 快照只引用各层作用域的条目列表并记下当时的条目数 (列表只会追加)，不复制、不格式化任何条目。
+# 文本在真正需要时 (写 listing.txt、GUI 显示) 才逐行生成，内容与原来的 listing_for_file 字符串列表完全相同。
+# 详细程度 level 决定记录哪些事件：LISTING_NORMAL 不记录符号表快照，LISTING_ERRORS 只记录错误。
+
+from itertools import islice
+
+# 详细程度
+LISTING_ERRORS, LISTING_NORMAL, LISTING_FULL = range(3)
+# 事件种类
+NOTE, DECLARATION, SCOPE, SNAPSHOT, ERROR = range(5)
+# 各种事件在哪个详细程度及以上才记录 (下标为事件种类)
+EVENT_LEVELS = (LISTING_NORMAL, LISTING_NORMAL, LISTING_NORMAL, LISTING_FULL, LISTING_ERRORS)
+
+
+class AnalysisListing:
+    """
+    按发生顺序保存的事件，每个事件是一个元组，第一项是种类：
+      (NOTE, 文本)
+      (DECLARATION, 前缀, 符号表条目)               渲染为 前缀 + str(条目)
+      (SCOPE, 过程名, 层次, 下一偏移量或 None)       进入 (有偏移量) 或退出 (None) 过程作用域
+      (SNAPSHOT, 标题, ((该层的条目列表, 条目数), ...), 各层的下一可用偏移)
+      (ERROR, 错误信息, 前缀)                        渲染为 前缀 + 错误信息
+    迭代时逐行产生渲染后的文本，所以可以像字符串列表一样使用 (for 循环、"\\n".join、len)；write() 直接写入文件。
+    """
+    def __init__(self, level=LISTING_FULL):
+        self.level = level
+        self.events = []
+
+    def wants(self, kind):
+        """这个详细程度是否记录种类为 kind 的事件。"""
+        return EVENT_LEVELS[kind] <= self.level
+
+    def append(self, text):
+        """记录一行说明文字 (与原来 listing_for_file.append 的用法相同)。"""
+        if self.level >= LISTING_NORMAL:
+            self.events.append((NOTE, text))
+
+    def declaration(self, prefix, entry):
+        if self.level >= LISTING_NORMAL:
+            self.events.append((DECLARATION, prefix, entry))
+
+    def enter_scope(self, proc_name, level, next_offset):
+        if self.level >= LISTING_NORMAL:
+            self.events.append((SCOPE, proc_name, level, next_offset))
+
+    def exit_scope(self, proc_name, level):
+        if self.level >= LISTING_NORMAL:
+            self.events.append((SCOPE, proc_name, level, None))
+
+    def snapshot(self, title, symbol_table, scope_offsets):
+        """记录符号表当前状态的快照：只保存各层作用域的引用和条目数，以及偏移量栈的副本。"""
+        if self.level >= LISTING_FULL:
+            self.events.append((SNAPSHOT, title, symbol_table.snapshot(), tuple(scope_offsets)))
+
+    def error(self, message, prefix="错误: "):
+        """记录一个错误 (每个详细程度都记录)；prefix 是渲染时加在前面的文字，信息本身已经说明了错误种类时可以为空。"""
+        self.events.append((ERROR, message, prefix))
+
+    def extend(self, other):
+        """追加另一份日志的全部事件 (不渲染)；other 也可以是字符串序列，每个字符串作为一行说明文字。"""
+        if isinstance(other, AnalysisListing):
+            self.events.extend(other.events)
+        else:
+            for text in other:
+                self.append(text)
+
+    @staticmethod
+    def _render(event):
+        """一个事件渲染出的各行。"""
+        kind = event[0]
+        if kind == NOTE:
+            yield event[1]
+        elif kind == DECLARATION:
+            yield f"{event[1]}{event[2]}"
+        elif kind == SCOPE:
+            _, proc_name, level, next_offset = event
+            if next_offset is None:
+                yield f"  退出过程 '{proc_name}' 作用域 (返回到层次 {level})"
+            else:
+                yield f"  进入过程 '{proc_name}' 作用域 (层次 {level}, 下一偏移量 {next_offset})"
+        elif kind == SNAPSHOT:
+            _, title, scopes, scope_offsets = event
+            yield f"\n--- {title} ---"
+            for level, (scope, count) in enumerate(scopes):
+                next_offset_info = str(scope_offsets[level]) if level < len(scope_offsets) else "N/A"
+                yield f"作用域层次: {level} (下一可用偏移: {next_offset_info})"
+                if not count: yield "  <空>"; continue
+                for entry in islice(scope, count): yield f"  {entry}"
+            yield f"--- 快照结束 ({title}) ---\n"
+        else: # ERROR
+            yield f"{event[2]}{event[1]}"
+
+    def __iter__(self):
+        render = self._render
+        for event in self.events:
+            yield from render(event)
+
+    def __len__(self):
+        """渲染后的行数 (不需要渲染就能算出)。"""
+        lines = 0
+        for event in self.events:
+            if event[0] == SNAPSHOT:
+                lines += 2 + sum(1 + max(count, 1) for _, count in event[2])
+            else:
+                lines += 1
+        return lines
+
+    def __bool__(self):
+        return bool(self.events)
+
+    def render(self):
+        """整份日志的文本 (各行以换行符连接)。"""
+        return "\n".join(self)
+
+    def write(self, f):
+        """把日志逐行写入文本文件 f (每行后加换行符)，不在内存中拼出整份文本。"""
+        f.writelines(f"{line}\n" for line in self)
+
+    def errors(self):
+        """日志中的错误信息 (按发生顺序)。"""
+        return [event[1] for event in self.events if event[0] == ERROR]
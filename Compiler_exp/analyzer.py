@@ -1,8 +1,11 @@
 # analyzer.py
 
+import traceback
 from enum import Enum
-from Lexer import Lexer, Token 
-from ASTparser import Parser as ASTParser, TreeNode, generate_ast_from_source, format_ast_to_display_string
+from Lexer import Lexer, Token, LineIndex, SymbolInterner
+from ASTparser import (Parser as ASTParser, TreeNode, OpExp, IdExp, ConstExp, ArrayAccessExp, generate_ast_from_source,
+                       format_ast_to_display_string, NODE_TYPES)
+from analysis_listing import LISTING_FULL, AnalysisListing
 
 # --- 1. Enums ---
 class TypeKind(Enum):
@@ -19,16 +22,21 @@ class AccessKind(Enum):
     VALUE = "access_value"; ADDRESS = "access_address"
 
 # --- 2. TypeIR and subclasses ---
+# 每个类型创建时就算好结构哈希 _hash (与 __eq__ 的结构相等一致：别名与它的基础类型哈希相同)，
+# 并记下基础类型 base_type (别名链在声明时解析一次)。结构类型由 TypeFactory 唯一化，见下。
 class TypeIR:
     def __init__(self, kind: TypeKind, initial_size: int = 0):
         self.kind = kind; self._size = initial_size
+        self.base_type: TypeIR = self; self._hash = hash(kind)
     @property
     def size(self) -> int: return self._size
-    def get_base_type(self) -> 'TypeIR': return self
+    def get_base_type(self) -> 'TypeIR': return self.base_type
     def __str__(self): return f"Type(kind={self.kind.value}, size={self.size})"
+    def __hash__(self): return self._hash
     def __eq__(self, other):
+        if self is other: return True
         if not isinstance(other, TypeIR): return NotImplemented
-        return self.get_base_type().kind == other.get_base_type().kind
+        return self.base_type.kind == other.base_type.kind
 
 class IntegerIR(TypeIR):
     def __init__(self): super().__init__(TypeKind.INTEGER, 1)#构造函数指出类型和大小
@@ -42,13 +50,15 @@ class AliasIR(TypeIR):
         super().__init__(TypeKind.ALIAS)
         self.alias_name = alias_name
         self.actual_type = actual_type if actual_type is not None else TypeIR(TypeKind.UNKNOWN)
-    @property
-    def size(self) -> int: return self.actual_type.size
-    def get_base_type(self) -> TypeIR: return self.actual_type.get_base_type()
+        # 被别名的类型已经建好，大小和基础类型不会再变，这里解析一次，不必每次访问都沿别名链查找
+        self._size = self.actual_type.size; self.base_type = self.actual_type.get_base_type()
+        self._hash = self.base_type._hash
     def __str__(self): return f"Alias(name={self.alias_name} -> {str(self.actual_type)}) (size: {self.size})"
+    __hash__ = TypeIR.__hash__
     def __eq__(self, other):
+        if self is other: return True
         if not isinstance(other, TypeIR): return NotImplemented
-        return self.get_base_type().__eq__(other.get_base_type())
+        return self.base_type.__eq__(other.base_type)
 
 class ArrayIR(TypeIR):
     def __init__(self, index_low: int, index_high: int, element_type: TypeIR):
@@ -58,10 +68,14 @@ class ArrayIR(TypeIR):
             self._size = 0
         else:
             self._size = ((index_high - index_low) + 1) * self.element_type.size
+        self._hash = hash((TypeKind.ARRAY, index_low, index_high, element_type._hash if element_type is not None else None))
     def __str__(self): return f"Array[{self.index_low}..{self.index_high}] of {str(self.element_type) if self.element_type else 'None'}"
+    __hash__ = TypeIR.__hash__
     def __eq__(self, other):
+        if self is other: return True
         if not isinstance(other, TypeIR): return NotImplemented
-        base_self = self.get_base_type(); base_other = other.get_base_type()
+        base_self = self.base_type; base_other = other.base_type
+        if base_self is base_other: return True
         if not isinstance(base_self, ArrayIR) or not isinstance(base_other, ArrayIR): return base_self.kind == base_other.kind
         return base_self.index_low == base_other.index_low and \
                base_self.index_high == base_other.index_high and \
@@ -74,7 +88,8 @@ class RecordIR(TypeIR):
     def add_field(self, name: str, field_type: TypeIR) -> bool:
         if name in self.fields or field_type is None or field_type.kind == TypeKind.UNKNOWN: return False
         self.fields[name] = {'type': field_type, 'offset': self._current_field_offset}
-        self._current_field_offset += field_type.size; self._size = self._current_field_offset; return True
+        self._current_field_offset += field_type.size; self._size = self._current_field_offset
+        self._hash = hash((self._hash, name, field_type._hash)); return True
     def get_field_type(self, name: str) -> TypeIR | None:
         field_data = self.fields.get(name); return field_data['type'] if field_data else None # type: ignore
     def get_field_offset(self, name: str) -> int | None:
@@ -83,9 +98,12 @@ class RecordIR(TypeIR):
     def __str__(self):
         field_strs = [f"{name}: {data['type']}@off:{data['offset']}" for name, data in self.fields.items()] # 显示字段偏移
         return f"Record({', '.join(field_strs)}) (size: {self.size})"
+    __hash__ = TypeIR.__hash__
     def __eq__(self, other):#重写了父类的 __eq__ 方法。当比较一个 AliasIR 对象与其他类型是否相等时，它会比较两者解析到底层后的基本类型是否相等
+        if self is other: return True
         if not isinstance(other, TypeIR): return NotImplemented
-        base_self = self.get_base_type(); base_other = other.get_base_type()
+        base_self = self.base_type; base_other = other.base_type
+        if base_self is base_other: return True
         if not isinstance(base_self, RecordIR) or not isinstance(base_other, RecordIR): return base_self.kind == base_other.kind
         if len(base_self.fields) != len(base_other.fields): return False
         for name, data in base_self.fields.items():
@@ -95,6 +113,49 @@ class RecordIR(TypeIR):
                  return False
         return True
 
+class TypeFactory:
+    """
+    结构类型的唯一化 (hash-consing)：每种结构 (基本类型、数组的界和元素类型、按顺序排列的记录域) 只有一个规范实例，
+    规范实例的成员类型也都是规范实例，类型的 get_base_type() 就是它的规范实例。
+    于是两个类型相容当且仅当 a.get_base_type() is b.get_base_type()，不再逐层比较结构。
+    成员类型写成别名的数组/记录另建一个保留原写法的实例 (日志中照原样显示)，它的 base_type 指向规范实例。
+    """
+    def __init__(self):
+        self.integer = IntegerIR(); self.char = CharIR()
+        self.boolean = BooleanIR(); self.unknown = TypeIR(TypeKind.UNKNOWN)
+        # 结构键 -> 规范实例；键中的成员类型都是规范实例，按预先算好的哈希查找
+        self._types: dict[tuple, TypeIR] = {}
+
+    def alias(self, alias_name: str, actual_type: TypeIR) -> AliasIR:
+        # 别名不唯一化 (名字要显示在日志中)，它的基础类型就是被别名类型的规范实例
+        return AliasIR(alias_name, actual_type)
+
+    def array(self, index_low: int, index_high: int, element_type: TypeIR) -> ArrayIR:
+        base_element = element_type.base_type
+        key = (TypeKind.ARRAY, index_low, index_high, base_element)
+        canonical = self._types.get(key)
+        if canonical is None:
+            canonical = self._types[key] = ArrayIR(index_low, index_high, base_element)
+        if base_element is element_type: return canonical
+        array_ir = ArrayIR(index_low, index_high, element_type); array_ir.base_type = canonical
+        return array_ir
+
+    def record(self, record_ir: RecordIR) -> RecordIR:
+        """已经按声明顺序 add_field 建好的记录类型：域类型都是规范实例时返回规范实例，否则把 record_ir 的 base_type 指向规范实例。"""
+        fields = tuple((name, data['type'].base_type) for name, data in record_ir.fields.items()) # type: ignore
+        key = (TypeKind.RECORD, fields)
+        canonical = self._types.get(key)
+        plain = all(base is data['type'] for (_, base), data in zip(fields, record_ir.fields.values()))
+        if canonical is None:
+            if plain: canonical = record_ir
+            else:
+                canonical = RecordIR()
+                for name, base in fields: canonical.add_field(name, base)
+            self._types[key] = canonical
+        if plain: return canonical
+        record_ir.base_type = canonical
+        return record_ir
+
 class ParamIR:
     def __init__(self, name: str, type_ir: TypeIR, is_var_param: bool):
         self.name = name; self.type_ir = type_ir; self.is_var_param = is_var_param
@@ -107,9 +168,13 @@ class ProcIR(TypeIR):
 
 # --- 3. SymbolTableEntry and SymbolTable ---
 class SymbTableEntry:
+    # 条目数与程序中的声明数相同，用 __slots__ 省去每个条目的 __dict__
+    __slots__ = ("name", "kind", "type_ir", "level", "offset", "proc_params_ir", "sym", "shadowed")
     def __init__(self, name: str, kind: SymbKind, type_ir: TypeIR | None, level: int, offset: int = 0):
         self.name = name; self.kind = kind; self.type_ir = type_ir; self.level = level; self.offset = offset
         self.proc_params_ir: ProcIR | None = None
+        # 符号表中的键 (符号 id 或名字)，以及被这个条目遮蔽的外层同名条目 (同名条目的作用域链，见 SymbolTable)
+        self.sym: int | str | None = None; self.shadowed: SymbTableEntry | None = None
     def __str__(self):
         type_str = str(self.type_ir) if self.type_ir else "None"
         param_info = ""
@@ -120,43 +185,100 @@ class SymbTableEntry:
         return f"{self.name:<15} | {self.kind.value:<15} | {type_str:<60} | L{self.level:<3} | Offs {self.offset:<5}{param_info}"
 
 class SymbolTable:
-    def __init__(self):
-        self.scopes: list[dict[str, SymbTableEntry]] = [{}]
+    """
+    散列表 + 作用域链：table 把每个标识符映射到它当前可见的 (最内层的) 条目，条目的 shadowed 指向被它遮蔽的外层同名条目，
+    所以 find 只需一次散列查找，与嵌套层数无关。scopes[level] 按声明顺序记录该层声明的条目，
+    退出作用域时只把这一层声明的标识符恢复为各自被遮蔽的条目。
+    这相当于 "标识符 -> 作用域栈" 的映射 (栈顶在 table 中，其余是 shadowed 链)，但键通常不是名字字符串：
+    给出 interner (生成 AST 时所用的 SymbolInterner) 时键是标识符的整数符号 id (节点上的 sym)，只有不给出时才按名字。
+    按名字查找 (不带 sym) 用 SymbolInterner.get 取 id，不会把没有声明过的名字登记到驻留表中。
+    """
+    def __init__(self, interner: SymbolInterner | None = None):
+        # 不同驻留表给同一个名字的 id 互不相干，所以只有给出生成 AST 的驻留表时才能信任节点上的 sym；
+        # 没有给出时 (如 SemanticAnalyzer() 分析 generate_ast_from_source(src) 的结果) 按名字登记和查找
+        self.interner = interner
+        self.table: dict[int | str, SymbTableEntry] = {}
+        self.scopes: list[list[SymbTableEntry]] = [[]]
         #一个整数，用于跟踪当前最内层（或最深）的词法作用域级别。初始值为0，代表全局作用域
         self.current_level = 0 
-    def enter_scope(self): self.scopes.append({}); self.current_level += 1
+    def enter_scope(self): self.scopes.append([]); self.current_level += 1
     def exit_scope(self):
-        if self.current_level > 0: self.scopes.pop(); self.current_level -= 1
-    def insert(self, name: str, kind: SymbKind, type_ir: TypeIR | None, offset: int = 0) -> SymbTableEntry | None:
-        current_scope = self.scopes[-1]
-        if name in current_scope: return None
-        entry = SymbTableEntry(name, kind, type_ir, self.current_level, offset); current_scope[name] = entry
+        if self.current_level == 0: return
+        table = self.table
+        for entry in self.scopes.pop():
+            if entry.shadowed is None: del table[entry.sym]
+            else: table[entry.sym] = entry.shadowed
+        self.current_level -= 1
+    def _key(self, name: str, sym: int | None) -> int | str:
+        # 登记用的键：AST 节点带有词法分析时得到的 sym；没有时 (如手工构造的 AST) 把名字登记到驻留表
+        interner = self.interner
+        if interner is None: return name
+        return sym if sym is not None else interner.intern(name)
+    def _lookup_key(self, name: str, sym: int | None) -> int | str | None:
+        # 查找用的键：不登记新名字 (没有登记过的名字不可能在表中，返回 None)，查找不改变驻留表
+        interner = self.interner
+        if interner is None: return name
+        return sym if sym is not None else interner.get(name)
+    def insert(self, name: str, kind: SymbKind, type_ir: TypeIR | None, offset: int = 0, sym: int | None = None) -> SymbTableEntry | None:
+        key = self._key(name, sym)
+        visible = self.table.get(key)
+        if visible is not None and visible.level == self.current_level: return None
+        entry = SymbTableEntry(name, kind, type_ir, self.current_level, offset)
+        entry.sym = key; entry.shadowed = visible
+        self.table[key] = entry; self.scopes[-1].append(entry)
         return entry
-    def find(self, name: str) -> SymbTableEntry | None:
-        for level in range(self.current_level, -1, -1):
-            if name in self.scopes[level]: return self.scopes[level][name]
-        return None
-    def find_in_current_scope(self, name: str) -> SymbTableEntry | None: return self.scopes[-1].get(name)
+    def find(self, name: str, sym: int | None = None) -> SymbTableEntry | None:
+        return self.table.get(self._lookup_key(name, sym))
+    def find_in_current_scope(self, name: str, sym: int | None = None) -> SymbTableEntry | None:
+        entry = self.table.get(self._lookup_key(name, sym))
+        return entry if entry is not None and entry.level == self.current_level else None
+    def snapshot(self) -> tuple[tuple[list[SymbTableEntry], int], ...]:
+        """各层作用域的轻量快照：(该层的条目列表, 当时的条目数)。列表只会追加条目，取前 条目数 个就是当时的内容。"""
+        return tuple((scope, len(scope)) for scope in self.scopes)
     def get_all_entries(self) -> list[SymbTableEntry]:
         all_entries = []
-        for scope_dict in self.scopes:
-            for entry in scope_dict.values(): all_entries.append(entry)
+        for scope in self.scopes: all_entries.extend(scope)
         return all_entries
 
 # --- 4. SemanticAnalyzer ---
+# StmtK 节点的值 (语句种类) -> 检查方法名
+STATEMENT_CHECKS = {"Assign": "_assign_statement", "If": "_if_statement", "Read": "_read_statement",
+                    "Write": "_write_statement", "Call": "_call_statement"}
+# _expr 显式栈中的动作：求一个子表达式的类型；子表达式的类型求出后组合出运算 (_OP_LEAF: 右操作数是标识符或常数，此时才求)、
+# 数组基址、数组下标的结果
+_EVAL, _OP, _OP_LEAF, _ARRAY_BASE, _ARRAY_INDEX = range(5)
+ARITHMETIC_OPERATORS = frozenset(('+', '-', '*', '/'))
+COMPARISON_OPERATORS = frozenset(('<', '='))
+COMPARABLE_KINDS = frozenset((TypeKind.INTEGER, TypeKind.CHAR))
+# 可以出现在表达式中的标识符种类
+VARIABLE_KINDS = frozenset((SymbKind.VARIABLE, SymbKind.PARAMETER_VALUE, SymbKind.PARAMETER_VAR, SymbKind.FIELD))
+
 class SemanticAnalyzer:
-    def __init__(self, trace_to_console=False):
-        self.symbol_table = SymbolTable()
+    type_factory_class = TypeFactory # 建立类型的工厂 (子类可以换成别的实现)
+
+    def __init__(self, trace_to_console=False, line_index: LineIndex | None = None, interner: SymbolInterner | None = None,
+                 listing_level: int = LISTING_FULL):
+        # interner 应与生成 AST 的 Lexer 相同 (见 generate_ast_from_source)，节点上的 sym 才能直接用作符号表的键；
+        # 不给出时符号表按名字登记和查找
+        self.symbol_table = SymbolTable(interner)
         self.trace_to_console = trace_to_console
+        # 源码的行首偏移表，用于把 AST 节点的 start 偏移报告为行:列
+        self.line_index = line_index
         self.errors: list[str] = []
-        self.listing_for_file: list[str] = []
+        # 分析日志：结构化事件，需要时才渲染成文本；listing_level 决定记录哪些事件 (见 analysis_listing.py)
+        self.listing_level = listing_level
+        self.listing_for_file = AnalysisListing(listing_level)
 
         # 用于跟踪当前作用域的下一个可用偏移量。栈结构，对应符号表的作用域。
         self.scope_offsets_stack: list[int] = [0] # 全局作用域 (level 0) 的偏移量从0开始
 
         self.current_procedure_entry: SymbTableEntry | None = None
-        self.TYPE_INTEGER = IntegerIR(); self.TYPE_CHAR = CharIR()
-        self.TYPE_BOOLEAN = BooleanIR(); self.TYPE_UNKNOWN = TypeIR(TypeKind.UNKNOWN)
+        self._aborted = False
+        self._node_handlers, self._statement_checks = self._dispatch_tables()
+        # 结构类型都经过 types 唯一化，类型相容检查只比较规范实例是否相同
+        self.types = self.type_factory_class()
+        self.TYPE_INTEGER = self.types.integer; self.TYPE_CHAR = self.types.char
+        self.TYPE_BOOLEAN = self.types.boolean; self.TYPE_UNKNOWN = self.types.unknown
         self._initialize_predefined_types()
 
     def _get_current_offset_and_advance(self, item_size: int) -> int:
@@ -177,11 +299,21 @@ class SemanticAnalyzer:
         if node and hasattr(node, 'node_type'):
             node_info = f" (AST节点: {node.node_type}{f' value: {node.value}' if node.value else ''})"
             full_message += node_info
+            if self.line_index is not None and getattr(node, 'start', None) is not None:
+                full_message += f" ({self.line_index.describe(node.start)})"
         self.errors.append(full_message)
-        self.listing_for_file.append(f"错误: {full_message}")
+        self.listing_for_file.error(full_message)
 
     def analyze(self, root_node: TreeNode | None) -> tuple[list[SymbTableEntry], list[str], list[str]]:
-        self.errors = []; self.listing_for_file = ["--- 开始语义分析 ---"]
+        self.begin_analysis(root_node)
+        return self.finish_analysis()
+
+    # analyze() 分成下面三步：流式检查 (stream_check.py) 在 ProK 只含声明部分时调用 begin_analysis，
+    # 主程序体的语句每解析出一条就交给 analyze_statement，最后 finish_analysis。两种方式的错误和日志完全相同。
+    def begin_analysis(self, root_node: TreeNode | None):
+        """开始一次分析：重置错误和日志，登记程序名，然后检查 root_node 目前已有的全部子树。"""
+        self.errors = []; self.listing_for_file = AnalysisListing(self.listing_level)
+        self.listing_for_file.append("--- 开始语义分析 ---")
         # 每次新的分析开始时，重置偏移量栈，只保留全局作用域的初始偏移量 (通常是0)
         # 如果之前分析过，self.scope_offsets_stack[0] 可能不是0，这里确保从0开始新的全局偏移计算
         self.scope_offsets_stack = [0]
@@ -190,20 +322,31 @@ class SemanticAnalyzer:
         if not isinstance(root_node, TreeNode) or root_node.node_type != "ProK":
             self._log_error("根节点不是有效的 ProK TreeNode 或为 None。", root_node)
             self.listing_for_file.append("语义分析因无效根节点而中止。")
-            return self.symbol_table.get_all_entries(), self.errors, self.listing_for_file
+            self._aborted = True
+            return
+        self._aborted = False
 
         if root_node.children and isinstance(root_node.children[0], TreeNode) and root_node.children[0].node_type == "PheadK":
             program_head_node = root_node.children[0]
             program_name = getattr(program_head_node, 'value', None)
             if program_name and isinstance(program_name, str):
                 # 程序名本身不占用由 scope_offsets_stack[0] 管理的数据区偏移量
-                entry = self.symbol_table.insert(program_name, SymbKind.PROGRAM, TypeIR(TypeKind.PROGRAM), offset=0)
-                if entry: self.listing_for_file.append(f"程序名 '{program_name}' 已处理: {str(entry)}")
+                entry = self.symbol_table.insert(program_name, SymbKind.PROGRAM, TypeIR(TypeKind.PROGRAM), offset=0, sym=getattr(program_head_node, 'sym', None))
+                if entry: self.listing_for_file.declaration(f"程序名 '{program_name}' 已处理: ", entry)
             else: self._log_error("PheadK 节点缺少有效的程序名 (value)。", program_head_node)
         else: self._log_error("ProK 节点缺少有效的 PheadK 子节点。", root_node)
 
         self._traverse_node(root_node)
 
+    def analyze_statement(self, stmt_node: TreeNode):
+        """检查主程序体中的一条语句 (与遍历 StmLK 时对每个子节点所做的相同)。"""
+        self._traverse_node(stmt_node)
+
+    def finish_analysis(self) -> tuple[list[SymbTableEntry], list[str], list[str]]:
+        """结束分析，返回 (符号表条目, 错误列表, 分析日志)。"""
+        if self._aborted: # 根节点无效时不输出符号表快照和总结
+            return self.symbol_table.get_all_entries(), self.errors, self.listing_for_file
+
         if self.trace_to_console: self._print_symbol_table_to_console("最终符号表状态 (控制台)")
         self._add_symbol_table_snapshot_to_listing("最终符号表状态 (文件日志)")
 
@@ -217,33 +360,66 @@ class SemanticAnalyzer:
 
         return self.symbol_table.get_all_entries(), self.errors, self.listing_for_file
 
+    @classmethod
+    def _dispatch_tables(cls):
+        """
+        (节点类型 -> 处理函数, 语句种类 -> 检查函数) 两张分派表，每个类第一次使用时建立一次 (子类重写的方法也会用上)。
+        节点类型 X 的处理函数就是 _handle_x (小写)，没有时为 _handle_unknown_node；表中是未绑定的函数，调用时传入 self。
+        """
+        tables = cls.__dict__.get("_DISPATCH_TABLES")
+        if tables is None:
+            node_handlers = {node_type: cls._lookup_handler(node_type) for node_type in NODE_TYPES}
+            statement_checks = {stmt_kind: getattr(cls, name) for stmt_kind, name in STATEMENT_CHECKS.items()}
+            tables = cls._DISPATCH_TABLES = (node_handlers, statement_checks)
+        return tables
+
+    @classmethod
+    def _lookup_handler(cls, node_type: str):
+        return getattr(cls, f"_handle_{node_type.lower()}", cls._handle_unknown_node)
+
     def _traverse_node(self, node: TreeNode | None):
-        if node is None: return
-        if not isinstance(node, TreeNode) or not hasattr(node, 'node_type'):
-            self._log_error(f"遍历时遇到无效节点: {node}"); return
-        handler_name = f"_handle_{node.node_type.lower()}"
-        handler = getattr(self, handler_name, self._handle_unknown_node)
-        try: handler(node)
-        except Exception as e:
-            self._log_error(f"处理节点 {node.node_type} 时发生内部错误: {e}", node)
-            import traceback
-            self.listing_for_file.append(f"处理节点 {node.node_type} 时内部错误: {traceback.format_exc()}")
+        """
+        用显式栈先序遍历以 node 为根的子树，不受递归深度限制。对每个节点按分派表调用处理函数 (先序钩子)；
+        处理函数返回接下来要依次处理的项 (或 None)：TreeNode 是要遍历的子节点，(函数, 节点) 是后序钩子，
+        在它前面的项都处理完后调用 函数(节点)。处理函数或钩子出错时记录内部错误，跳过该节点余下的部分，继续处理栈中的其他项。
+        """
+        handlers = self._node_handlers
+        stack = [node]
+        pop, extend = stack.pop, stack.extend
+        while stack:
+            item = pop()
+            if item is None: continue
+            try:
+                if type(item) is tuple: # 后序钩子
+                    hook, item = item
+                    hook(item)
+                    continue
+                if not isinstance(item, TreeNode):
+                    self._log_error(f"遍历时遇到无效节点: {item}"); continue
+                handler = handlers.get(item.node_type)
+                if handler is None:
+                    handler = handlers[item.node_type] = self._lookup_handler(item.node_type)
+                items = handler(self, item)
+                if items: extend(reversed(items))
+            except Exception as e:
+                self._log_error(f"处理节点 {item.node_type} 时发生内部错误: {e}", item)
+                self.listing_for_file.append(f"处理节点 {item.node_type} 时内部错误: {traceback.format_exc()}")
 
     def _initialize_predefined_types(self):
         # 预定义类型不消耗数据区偏移量，它们的偏移量为0是合适的
         entry_int = self.symbol_table.insert("integer", SymbKind.TYPE, self.TYPE_INTEGER, offset=0)
         entry_char = self.symbol_table.insert("char", SymbKind.TYPE, self.TYPE_CHAR, offset=0)
         entry_bool = self.symbol_table.insert("boolean", SymbKind.TYPE, self.TYPE_BOOLEAN, offset=0)
-        if entry_int: self.listing_for_file.append(f"预定义类型: {str(entry_int)}")
-        if entry_char: self.listing_for_file.append(f"预定义类型: {str(entry_char)}")
-        if entry_bool: self.listing_for_file.append(f"预定义类型: {str(entry_bool)}")
+        if entry_int: self.listing_for_file.declaration("预定义类型: ", entry_int)
+        if entry_char: self.listing_for_file.declaration("预定义类型: ", entry_char)
+        if entry_bool: self.listing_for_file.declaration("预定义类型: ", entry_bool)
 
+    # 各 _handle_xxx 返回接下来要遍历的子节点 (及后序钩子)，见 _traverse_node
     def _handle_unknown_node(self, node: TreeNode):
-        for child in node.children: self._traverse_node(child)
+        return node.children
 
     def _handle_prok(self, node: TreeNode):
-        for child in node.children:
-            if child.node_type != "PheadK": self._traverse_node(child)
+        return [child for child in node.children if child.node_type != "PheadK"]
 
     def _handle_typek(self, node: TreeNode):
         self.listing_for_file.append(f"分析类型声明 (TypeK)...")
@@ -252,17 +428,18 @@ class SemanticAnalyzer:
                 self._log_error(f"TypeK 中遇到非预期的子节点: {type_dec_node}", node); continue
             alias_name = type_dec_node.value
             if not isinstance(alias_name, str): self._log_error(f"类型声明 DecK value 不是字符串", type_dec_node); continue
-            if self.symbol_table.find_in_current_scope(alias_name):
+            alias_sym = getattr(type_dec_node, 'sym', None)
+            if self.symbol_table.find_in_current_scope(alias_name, alias_sym):
                 self._log_error(f"类型 '{alias_name}' 重复声明。", type_dec_node); continue
             if not type_dec_node.children or not isinstance(type_dec_node.children[0], TreeNode):
                 self._log_error(f"类型声明 '{alias_name}' 缺少类型结构或子节点无效。", type_dec_node); continue
             actual_type_ast_node = type_dec_node.children[0]
             type_ir = self._process_type_node(actual_type_ast_node)
             if type_ir and type_ir.kind != TypeKind.UNKNOWN:
-                aliased_type_ir = AliasIR(alias_name, type_ir)
+                aliased_type_ir = self.types.alias(alias_name, type_ir)
                 # 类型声明本身不消耗数据偏移量
-                entry = self.symbol_table.insert(alias_name, SymbKind.TYPE, aliased_type_ir, offset=0)
-                if entry: self.listing_for_file.append(f"  已声明类型别名: {str(entry)}")
+                entry = self.symbol_table.insert(alias_name, SymbKind.TYPE, aliased_type_ir, offset=0, sym=alias_sym)
+                if entry: self.listing_for_file.declaration("  已声明类型别名: ", entry)
             else: self._log_error(f"无法解析类型声明 '{alias_name}'。", actual_type_ast_node)
         if self.trace_to_console: self._print_symbol_table_to_console("类型声明之后 (控制台)")
         self._add_symbol_table_snapshot_to_listing("类型声明之后 (文件日志)")
@@ -281,7 +458,7 @@ class SemanticAnalyzer:
     def _name_type(self, id_node: TreeNode) -> TypeIR:
         type_name = id_node.value
         if not isinstance(type_name, str): self._log_error(f"IdK 类型节点 value 不是字符串", id_node); return self.TYPE_UNKNOWN
-        entry = self.symbol_table.find(type_name)
+        entry = self.symbol_table.find(type_name, getattr(id_node, 'sym', None))
         if not entry: self._log_error(f"类型 '{type_name}' 未声明。", id_node); return self.TYPE_UNKNOWN
         if entry.kind != SymbKind.TYPE: self._log_error(f"标识符 '{type_name}' 不是一个类型。", id_node); return self.TYPE_UNKNOWN
         if entry.type_ir is None: self._log_error(f"类型 '{type_name}' 的内部表示为 None。", id_node); return self.TYPE_UNKNOWN
@@ -310,7 +487,7 @@ class SemanticAnalyzer:
         element_type_ir = self._process_type_node(element_type_node)
         if element_type_ir is None or element_type_ir.kind == TypeKind.UNKNOWN:
             self._log_error(f"数组元素类型未知。", element_type_node); return self.TYPE_UNKNOWN
-        return ArrayIR(low_val, high_val, element_type_ir)
+        return self.types.array(low_val, high_val, element_type_ir)
 
     def _record_type(self, record_k_node: TreeNode) -> TypeIR:
         record_ir = RecordIR()
@@ -341,7 +518,7 @@ class SemanticAnalyzer:
                 if field_offset_in_record is None: # 如果 add_field 成功，这里不应为 None
                     self._log_error(f"内部错误: 无法获取记录域 '{field_name}' 的偏移量", field_dec_node); continue
 
-                if not self.symbol_table.insert(field_name, SymbKind.FIELD, field_type_ir, offset=field_offset_in_record):
+                if not self.symbol_table.insert(field_name, SymbKind.FIELD, field_type_ir, offset=field_offset_in_record, sym=getattr(field_dec_node, 'sym', None)):
                     self._log_error(f"记录域 '{field_name}' 在当前记录的临时作用域中重复。", field_dec_node)
                 else:
                     self.listing_for_file.append(f"    已定义记录域: {field_name}: {field_type_ir} (在记录内偏移: {field_offset_in_record})")
@@ -349,7 +526,7 @@ class SemanticAnalyzer:
         self.scope_offsets_stack.pop() # 退出记录字段的临时作用域
         self.symbol_table.exit_scope()
         self.listing_for_file.append(f"  退出记录定义作用域 (返回到层次 {self.symbol_table.current_level})")
-        return record_ir
+        return self.types.record(record_ir)
 
     def _handle_vark(self, node: TreeNode):
         self.listing_for_file.append(f"分析变量声明 (VarK)...")
@@ -377,12 +554,13 @@ class SemanticAnalyzer:
                 var_name = var_id_node.value
                 if not isinstance(var_name, str): self._log_error(f"变量 IdK value 不是字符串", var_id_node); continue
 
-                if self.symbol_table.find_in_current_scope(var_name):
+                var_sym = getattr(var_id_node, 'sym', None)
+                if self.symbol_table.find_in_current_scope(var_name, var_sym):
                     self._log_error(f"变量 '{var_name}' 重复声明。", var_id_node)
                 else:
                     var_offset = self._get_current_offset_and_advance(var_type_ir.size)
-                    entry = self.symbol_table.insert(var_name, SymbKind.VARIABLE, var_type_ir, offset=var_offset)
-                    if entry: self.listing_for_file.append(f"  已声明变量: {str(entry)}")
+                    entry = self.symbol_table.insert(var_name, SymbKind.VARIABLE, var_type_ir, offset=var_offset, sym=var_sym)
+                    if entry: self.listing_for_file.declaration("  已声明变量: ", entry)
 
         if self.trace_to_console: self._print_symbol_table_to_console("变量声明之后 (控制台)")
         self._add_symbol_table_snapshot_to_listing("变量声明之后 (文件日志)")
@@ -391,21 +569,23 @@ class SemanticAnalyzer:
         proc_name = node.value
         if not isinstance(proc_name, str): self._log_error(f"ProcDecK value (过程名) 不是字符串", node); return
         self.listing_for_file.append(f"分析过程声明: {proc_name}...")
-        if self.symbol_table.find_in_current_scope(proc_name):
+        proc_sym = getattr(node, 'sym', None)
+        if self.symbol_table.find_in_current_scope(proc_name, proc_sym):
             self._log_error(f"过程 '{proc_name}' 在当前作用域重复声明。", node); return
 
         proc_signature_ir = ProcIR()
         # 过程声明本身不占用其父作用域的数据区偏移量，偏移量为0
-        proc_entry = self.symbol_table.insert(proc_name, SymbKind.PROCEDURE, proc_signature_ir, offset=0)
+        proc_entry = self.symbol_table.insert(proc_name, SymbKind.PROCEDURE, proc_signature_ir, offset=0, sym=proc_sym)
         if not proc_entry: self._log_error(f"未能为过程 '{proc_name}' 创建符号表条目。", node); return
 
         proc_entry.proc_params_ir = proc_signature_ir
+        # 参数此后才加入签名，这一行要按此刻的条目内容 (还没有参数) 立即生成
         self.listing_for_file.append(f"  已声明过程: {str(proc_entry)}")
         self.current_procedure_entry = proc_entry
 
         self.symbol_table.enter_scope()
         self.scope_offsets_stack.append(0) # 为过程的参数和局部变量创建一个新的偏移量上下文，从0开始
-        self.listing_for_file.append(f"  进入过程 '{proc_name}' 作用域 (层次 {self.symbol_table.current_level}, 下一偏移量 {self.scope_offsets_stack[-1]})")
+        self.listing_for_file.enter_scope(proc_name, self.symbol_table.current_level, self.scope_offsets_stack[-1])
 
         param_list_k_node, local_type_k_node, local_var_k_node, body_stmlk_node = None, None, None, None
         for child in node.children:
@@ -425,15 +605,19 @@ class SemanticAnalyzer:
         # 处理局部变量声明 (会使用并推进当前作用域的偏移量)
         if local_var_k_node: self._handle_vark(local_var_k_node)
 
-        if body_stmlk_node: self._traverse_node(body_stmlk_node)
-        else: self._log_error(f"过程 '{proc_name}' 缺少过程体 (StmLK)。", node)
+        if body_stmlk_node: return [body_stmlk_node, (self._leave_procedure, node)]
+        self._log_error(f"过程 '{proc_name}' 缺少过程体 (StmLK)。", node)
+        return [(self._leave_procedure, node)]
 
+    def _leave_procedure(self, node: TreeNode):
+        """过程体检查完后 (后序钩子)：记录快照，退出过程作用域。"""
+        proc_name = node.value
         if self.trace_to_console: self._print_symbol_table_to_console(f"过程 {proc_name} 作用域结束前 (控制台)")
         self._add_symbol_table_snapshot_to_listing(f"过程 {proc_name} 作用域结束前 (文件日志)")
 
         self.scope_offsets_stack.pop() # 退出过程作用域，弹出其偏移量计数器
         self.symbol_table.exit_scope()
-        self.listing_for_file.append(f"  退出过程 '{proc_name}' 作用域 (返回到层次 {self.symbol_table.current_level})")
+        self.listing_for_file.exit_scope(proc_name, self.symbol_table.current_level)
         self.current_procedure_entry = None
 
     def _handle_paramlistk(self, node: TreeNode, proc_signature_ir: ProcIR):
@@ -475,104 +659,170 @@ class SemanticAnalyzer:
                 param_name = param_id_node.value
                 if not isinstance(param_name, str): self._log_error(f"参数 IdK value 不是字符串", param_id_node); continue
 
-                if self.symbol_table.find_in_current_scope(param_name):
+                param_sym = getattr(param_id_node, 'sym', None)
+                if self.symbol_table.find_in_current_scope(param_name, param_sym):
                     self._log_error(f"参数 '{param_name}' 重复声明。", param_id_node)
                 else:
                     param_offset = self._get_current_offset_and_advance(allocated_size)
-                    entry = self.symbol_table.insert(param_name, sym_kind, param_type_ir, offset=param_offset)
+                    entry = self.symbol_table.insert(param_name, sym_kind, param_type_ir, offset=param_offset, sym=param_sym)
                     if entry:
-                        self.listing_for_file.append(f"    已声明参数: {str(entry)}")
+                        self.listing_for_file.declaration("    已声明参数: ", entry)
                         proc_signature_ir.add_param(ParamIR(param_name, param_type_ir, is_var_param))
 
     def _handle_stmlk(self, node: TreeNode):
-        # (与之前代码相同)
         if not hasattr(node, 'children'):
             self.listing_for_file.append(f"警告: StmLK 节点 {node.value if node.value else ''} 没有 'children' 属性。")
-            return
-        for stmt_node_child in node.children:
+            return None
+        children = node.children
+        valid_children = children
+        for stmt_node_child in children:
             if not isinstance(stmt_node_child, TreeNode):
                 self._log_error(f"StmLK 的一个子元素不是 TreeNode 类型: {type(stmt_node_child)}。", node)
-                continue
-            self._traverse_node(stmt_node_child)
+                valid_children = None
+        if valid_children is None:
+            return [child for child in children if isinstance(child, TreeNode)]
+        return children
 
     def _handle_stmtk(self, node: TreeNode):
-        # (与之前代码相同)
+        # 按语句种类查 STATEMENT_CHECKS；只有 If 语句返回要继续遍历的分支
         stmt_kind = node.value
-        if not isinstance(stmt_kind, str): self._log_error(f"StmtK value (语句类型) 不是字符串", node); return
-        if stmt_kind == "Assign": self._assign_statement(node)
-        elif stmt_kind == "If": self._if_statement(node)
-        elif stmt_kind == "Read": self._read_statement(node)
-        elif stmt_kind == "Write": self._write_statement(node)
-        elif stmt_kind == "Call": self._call_statement(node)
-        else: self._log_error(f"未知语句类型: {stmt_kind}", node)
+        if not isinstance(stmt_kind, str): self._log_error(f"StmtK value (语句类型) 不是字符串", node); return None
+        check = self._statement_checks.get(stmt_kind)
+        if check is None: self._log_error(f"未知语句类型: {stmt_kind}", node); return None
+        return check(self, node)
 
     def _expr(self, exp_node: TreeNode | None, access_kind_needed: AccessKind = AccessKind.VALUE) -> TypeIR:
-        # (与之前代码相同, 但需要确保对 IdV 的处理能正确返回字段类型，如果支持 record.field 表达式)
+        """
+        表达式的类型 (同时报告其中的语义错误)。标识符和常数直接求出；其余用显式栈按后序求值，任意深的表达式也不受递归深度限制。
+        栈中每一项是 (动作, 节点, 参数)：_EVAL 求节点的类型 (参数是访问方式)，结果压入 types；
+        _OP / _ARRAY_BASE / _ARRAY_INDEX 在子表达式的类型求出后从 types 中取出它们，组合出节点的类型。
+        """
+        # 语法分析器生成的带类型表达式节点：直接读字段，不拆分 value 字符串
+        node_class = type(exp_node)
+        if node_class is IdExp: return self._var_expr(exp_node, exp_node.name, exp_node.sym, access_kind_needed)
+        if node_class is ConstExp: return self.TYPE_INTEGER
+        types: list[TypeIR] = []
+        stack = [(_EVAL, exp_node, access_kind_needed)]
+        pop, push = stack.pop, stack.append
+        while stack:
+            action, node, arg = pop()
+            if action == _EVAL:
+                node_class = type(node)
+                if node_class is IdExp: types.append(self._var_expr(node, node.name, node.sym, arg))
+                elif node_class is ConstExp: types.append(self.TYPE_INTEGER)
+                elif node_class is OpExp:
+                    # 左操作数先求值 (错误按从左到右的顺序报告)；标识符和常数操作数当场求出，不经过栈
+                    left, right = node.left, node.right
+                    left_class, right_class = type(left), type(right)
+                    if left_class is IdExp or left_class is ConstExp:
+                        left_type_ir = self.TYPE_INTEGER if left_class is ConstExp else self._var_expr(left, left.name, left.sym, AccessKind.VALUE)
+                        if right_class is IdExp or right_class is ConstExp:
+                            right_type_ir = self.TYPE_INTEGER if right_class is ConstExp else self._var_expr(right, right.name, right.sym, AccessKind.VALUE)
+                            types.append(self._op_expr(node, node.op, left_type_ir, right_type_ir))
+                        else:
+                            types.append(left_type_ir); push((_OP, node, node.op)); push((_EVAL, right, AccessKind.VALUE))
+                    elif right_class is IdExp or right_class is ConstExp:
+                        push((_OP_LEAF, node, right)); push((_EVAL, left, AccessKind.VALUE))
+                    else:
+                        push((_OP, node, node.op)); push((_EVAL, right, AccessKind.VALUE)); push((_EVAL, left, AccessKind.VALUE))
+                elif node_class is ArrayAccessExp:
+                    push((_ARRAY_BASE, node, (node.array, node.index))); push((_EVAL, node.array, AccessKind.VALUE))
+                else:
+                    self._coded_expr(node, arg, types, push)
+            elif action == _OP:
+                right_type_ir = types.pop(); left_type_ir = types.pop()
+                types.append(self._op_expr(node, arg, left_type_ir, right_type_ir))
+            elif action == _OP_LEAF:
+                right_type_ir = self.TYPE_INTEGER if type(arg) is ConstExp else self._var_expr(arg, arg.name, arg.sym, AccessKind.VALUE)
+                types.append(self._op_expr(node, node.op, types.pop(), right_type_ir))
+            elif action == _ARRAY_BASE:
+                array_base_node, index_expr_node = arg
+                array_type_ir = types.pop()
+                if array_type_ir.kind == TypeKind.UNKNOWN: types.append(self.TYPE_UNKNOWN); continue
+                array_base_type = array_type_ir.get_base_type()
+                if not isinstance(array_base_type, ArrayIR):
+                    self._log_error(f"标识符 '{self._array_name(array_base_node)}' 不是数组类型。", array_base_node)
+                    types.append(self.TYPE_UNKNOWN); continue
+                # 基址是数组时才检查下标
+                push((_ARRAY_INDEX, node, (array_base_node, index_expr_node, array_base_type)))
+                push((_EVAL, index_expr_node, AccessKind.VALUE))
+            else: # _ARRAY_INDEX
+                array_base_node, index_expr_node, array_base_type = arg
+                types.append(self._array_element(array_base_node, index_expr_node, array_base_type, types.pop()))
+        return types[0]
+
+    def _coded_expr(self, exp_node: TreeNode | None, access_kind_needed: AccessKind, types: list[TypeIR], push):
+        """_expr 中的 ExpK 节点 (值为 "Op +"、"IdV x" 等字符串，例如 NodeView)：叶子的类型压入 types，其余把求值步骤 push 到栈中。"""
         if not isinstance(exp_node, TreeNode) or not hasattr(exp_node, 'node_type'):
-            self._log_error("表达式节点无效或为 None。", exp_node); return self.TYPE_UNKNOWN
+            self._log_error("表达式节点无效或为 None。", exp_node); types.append(self.TYPE_UNKNOWN); return
         node_type = exp_node.node_type; node_val_str = exp_node.value
-        if node_type != "ExpK": self._log_error(f"表达式预期为 ExpK, 实际为 {node_type}", exp_node); return self.TYPE_UNKNOWN
-        if not isinstance(node_val_str, str): self._log_error(f"ExpK value 预期为字符串", exp_node); return self.TYPE_UNKNOWN
+        if node_type != "ExpK": self._log_error(f"表达式预期为 ExpK, 实际为 {node_type}", exp_node); types.append(self.TYPE_UNKNOWN); return
+        if not isinstance(node_val_str, str): self._log_error(f"ExpK value 预期为字符串", exp_node); types.append(self.TYPE_UNKNOWN); return
         parts = node_val_str.split(" ", 1)
-        if not parts: self._log_error(f"ExpK value 格式错误 (空)", exp_node); return self.TYPE_UNKNOWN
         exp_kind_token = parts[0]
 
         if exp_kind_token == "Op":
-            if len(parts) < 2: self._log_error(f"OpK value 格式错误 (缺操作符)", exp_node); return self.TYPE_UNKNOWN
+            if len(parts) < 2: self._log_error(f"OpK value 格式错误 (缺操作符)", exp_node); types.append(self.TYPE_UNKNOWN); return
             op_symbol = parts[1]
-            if len(exp_node.children) == 2:
-                left_type_ir = self._expr(exp_node.children[0]); right_type_ir = self._expr(exp_node.children[1])
-                if left_type_ir.kind == TypeKind.UNKNOWN or right_type_ir.kind == TypeKind.UNKNOWN: return self.TYPE_UNKNOWN
-                left_base_type = left_type_ir.get_base_type(); right_base_type = right_type_ir.get_base_type()
-                if op_symbol in ['+', '-', '*', '/']:
-                    if not (left_base_type.kind == TypeKind.INTEGER and right_base_type.kind == TypeKind.INTEGER):
-                        self._log_error(f"算术运算 '{op_symbol}' 需整型操作数", exp_node); return self.TYPE_UNKNOWN
-                    return self.TYPE_INTEGER
-                elif op_symbol in ['<', '=']:
-                    if left_base_type.kind != right_base_type.kind or \
-                       left_base_type.kind not in [TypeKind.INTEGER, TypeKind.CHAR]:
-                        self._log_error(f"比较运算 '{op_symbol}' 需同类型可比较操作数 (int,char)", exp_node); return self.TYPE_UNKNOWN
-                    return self.TYPE_BOOLEAN
-                else: self._log_error(f"未知二元操作符 '{op_symbol}'。", exp_node); return self.TYPE_UNKNOWN
-            else: self._log_error(f"操作符 '{op_symbol}' 操作数数量不正确。", exp_node); return self.TYPE_UNKNOWN
+            children = exp_node.children
+            if len(children) == 2:
+                push((_OP, exp_node, op_symbol)); push((_EVAL, children[1], AccessKind.VALUE)); push((_EVAL, children[0], AccessKind.VALUE))
+            else: self._log_error(f"操作符 '{op_symbol}' 操作数数量不正确。", exp_node); types.append(self.TYPE_UNKNOWN)
         elif exp_kind_token == "IdV":
-            if len(parts) < 2: self._log_error(f"IdV value 格式错误 (缺变量名)", exp_node); return self.TYPE_UNKNOWN
-            var_name = parts[1]; entry = self.symbol_table.find(var_name)
-            if not entry: self._log_error(f"变量 '{var_name}' 未声明。", exp_node); return self.TYPE_UNKNOWN
-            # 字段 (FIELD) 通常在特定上下文中（如记录访问）才被视为变量，这里可能需要更复杂的逻辑
-            # 如果 IdV 直接用于表示字段，那么它必须在记录访问的上下文中被限定
-            if entry.kind not in [SymbKind.VARIABLE, SymbKind.PARAMETER_VALUE, SymbKind.PARAMETER_VAR, SymbKind.FIELD]:
-                self._log_error(f"标识符 '{var_name}' 非变量/参数/域。", exp_node); return self.TYPE_UNKNOWN
-            if access_kind_needed == AccessKind.ADDRESS and entry.kind == SymbKind.PARAMETER_VALUE:
-                self._log_error(f"不能获取值参 '{var_name}' 地址。", exp_node) 
-            if entry.type_ir is None: self._log_error(f"标识符 '{var_name}' 类型信息为 None。", exp_node); return self.TYPE_UNKNOWN
-            return entry.type_ir
+            if len(parts) < 2: self._log_error(f"IdV value 格式错误 (缺变量名)", exp_node); types.append(self.TYPE_UNKNOWN); return
+            types.append(self._var_expr(exp_node, parts[1], getattr(exp_node, 'sym', None), access_kind_needed))
         elif exp_kind_token == "Const":
-            if len(parts) < 2: self._log_error(f"ConstK value 格式错误 (缺常量值)", exp_node); return self.TYPE_UNKNOWN
+            if len(parts) < 2: self._log_error(f"ConstK value 格式错误 (缺常量值)", exp_node); types.append(self.TYPE_UNKNOWN); return
             const_val_str = parts[1]
-            try: int(const_val_str); return self.TYPE_INTEGER
-            except ValueError: self._log_error(f"无效整数常量: {const_val_str}", exp_node); return self.TYPE_UNKNOWN
-        elif exp_kind_token == "ArrayAccess": return self._array_var(exp_node, access_kind_needed)
+            try: int(const_val_str); types.append(self.TYPE_INTEGER)
+            except ValueError: self._log_error(f"无效整数常量: {const_val_str}", exp_node); types.append(self.TYPE_UNKNOWN)
+        elif exp_kind_token == "ArrayAccess":
+            children = exp_node.children
+            if len(children) != 2: self._log_error("数组访问节点结构错误。", exp_node); types.append(self.TYPE_UNKNOWN); return
+            push((_ARRAY_BASE, exp_node, (children[0], children[1]))); push((_EVAL, children[0], AccessKind.VALUE))
         # TODO: 添加对记录字段访问表达式的处理 (例如 "RecordAccess", "FieldIdK" 等)
-        # elif exp_kind_token == "RecordAccess": return self._record_field_access_expr(exp_node, access_kind_needed)
-        else: self._log_error(f"未知表达式种类标记: {exp_kind_token}", exp_node); return self.TYPE_UNKNOWN
+        else: self._log_error(f"未知表达式种类标记: {exp_kind_token}", exp_node); types.append(self.TYPE_UNKNOWN)
+
+    def _op_expr(self, exp_node: TreeNode, op_symbol: str, left_type_ir: TypeIR, right_type_ir: TypeIR) -> TypeIR:
+        """二元运算的类型，两个操作数的类型已经求出。"""
+        if left_type_ir.kind == TypeKind.UNKNOWN or right_type_ir.kind == TypeKind.UNKNOWN: return self.TYPE_UNKNOWN
+        left_base_type = left_type_ir.get_base_type(); right_base_type = right_type_ir.get_base_type()
+        if op_symbol in ARITHMETIC_OPERATORS:
+            if not (left_base_type.kind == TypeKind.INTEGER and right_base_type.kind == TypeKind.INTEGER):
+                self._log_error(f"算术运算 '{op_symbol}' 需整型操作数", exp_node); return self.TYPE_UNKNOWN
+            return self.TYPE_INTEGER
+        elif op_symbol in COMPARISON_OPERATORS:
+            if left_base_type.kind != right_base_type.kind or \
+               left_base_type.kind not in COMPARABLE_KINDS:
+                self._log_error(f"比较运算 '{op_symbol}' 需同类型可比较操作数 (int,char)", exp_node); return self.TYPE_UNKNOWN
+            return self.TYPE_BOOLEAN
+        else: self._log_error(f"未知二元操作符 '{op_symbol}'。", exp_node); return self.TYPE_UNKNOWN
+
+    def _var_expr(self, exp_node: TreeNode, var_name: str, sym: int | None, access_kind_needed: AccessKind) -> TypeIR:
+        entry = self.symbol_table.find(var_name, sym)
+        if not entry: self._log_error(f"变量 '{var_name}' 未声明。", exp_node); return self.TYPE_UNKNOWN
+        # 字段 (FIELD) 通常在特定上下文中（如记录访问）才被视为变量，这里可能需要更复杂的逻辑
+        # 如果 IdV 直接用于表示字段，那么它必须在记录访问的上下文中被限定
+        if entry.kind not in VARIABLE_KINDS:
+            self._log_error(f"标识符 '{var_name}' 非变量/参数/域。", exp_node); return self.TYPE_UNKNOWN
+        if access_kind_needed == AccessKind.ADDRESS and entry.kind == SymbKind.PARAMETER_VALUE:
+            self._log_error(f"不能获取值参 '{var_name}' 地址。", exp_node) 
+        if entry.type_ir is None: self._log_error(f"标识符 '{var_name}' 类型信息为 None。", exp_node); return self.TYPE_UNKNOWN
+        return entry.type_ir
 
-    def _array_var(self, access_node: TreeNode, access_kind_needed: AccessKind) -> TypeIR:
-        # (与之前代码相同)
-        if len(access_node.children) != 2: self._log_error("数组访问节点结构错误。", access_node); return self.TYPE_UNKNOWN
-        array_base_node, index_expr_node = access_node.children[0], access_node.children[1]
-        array_type_ir = self._expr(array_base_node, AccessKind.VALUE) 
-        if array_type_ir.kind == TypeKind.UNKNOWN : return self.TYPE_UNKNOWN
-        array_base_type = array_type_ir.get_base_type()
-        if not isinstance(array_base_type, ArrayIR):
-            var_name_in_error = getattr(array_base_node, 'value', "未知数组基").split(" ",1)[-1] if isinstance(getattr(array_base_node, 'value', ""),str) else "??"
-            self._log_error(f"标识符 '{var_name_in_error}' 不是数组类型。", array_base_node); return self.TYPE_UNKNOWN
-        index_type_ir = self._expr(index_expr_node)
+    @staticmethod
+    def _array_name(array_base_node: TreeNode) -> str:
+        """错误信息中数组的名字 (取自基址节点的值 "IdV a")。"""
+        value = getattr(array_base_node, 'value', "未知数组基")
+        return value.split(" ", 1)[-1] if isinstance(value, str) else "??"
+
+    def _array_element(self, array_base_node: TreeNode, index_expr_node: TreeNode, array_base_type: ArrayIR, index_type_ir: TypeIR) -> TypeIR:
+        """数组元素的类型，基址 (数组类型 array_base_type) 和下标的类型已经求出。"""
         if index_type_ir.kind == TypeKind.UNKNOWN : return self.TYPE_UNKNOWN
         if index_type_ir.get_base_type().kind != TypeKind.INTEGER:
             self._log_error(f"数组下标需整型", index_expr_node); return self.TYPE_UNKNOWN
         if array_base_type.element_type is None:
-            self._log_error(f"数组 '{var_name_in_error}' 元素类型为 None。", array_base_node); return self.TYPE_UNKNOWN
+            self._log_error(f"数组 '{self._array_name(array_base_node)}' 元素类型为 None。", array_base_node); return self.TYPE_UNKNOWN
         return array_base_type.element_type
 
     def _assign_statement(self, assign_node: TreeNode):
@@ -583,8 +833,15 @@ class SemanticAnalyzer:
         rhs_type_ir = self._expr(rhs_node, AccessKind.VALUE)
         if lhs_type_ir.kind == TypeKind.UNKNOWN or rhs_type_ir.kind == TypeKind.UNKNOWN: return
         lhs_base_type = lhs_type_ir.get_base_type(); rhs_base_type = rhs_type_ir.get_base_type()
-        if lhs_base_type != rhs_base_type:
-            self._log_error(f"赋值类型不匹配: 左侧 '{lhs_type_ir}' (基础 '{lhs_base_type}'), 右侧 '{rhs_type_ir}' (基础 '{rhs_base_type}')。", assign_node)
+        if lhs_base_type is not rhs_base_type: # 基础类型都是唯一化的规范实例
+            self._log_error(f"赋值类型不匹配: 左侧 '{lhs_type_ir}' (基础 '{self._written_type(lhs_type_ir)}'), "
+                            f"右侧 '{rhs_type_ir}' (基础 '{self._written_type(rhs_type_ir)}')。", assign_node)
+
+    @staticmethod
+    def _written_type(type_ir: TypeIR) -> TypeIR:
+        """错误信息中显示的基础类型：只去掉外层的别名，成员类型保留原写法 (规范实例中成员的别名都已解析)。"""
+        while isinstance(type_ir, AliasIR): type_ir = type_ir.actual_type
+        return type_ir
 
     def _call_statement(self, call_node: TreeNode):
         # (与之前代码相同)
@@ -592,7 +849,7 @@ class SemanticAnalyzer:
             self._log_error("过程调用结构错误(缺过程名 ProcIdK 或子节点无效)。", call_node); return
         proc_id_node = call_node.children[0]; proc_name = proc_id_node.value
         if not isinstance(proc_name, str): self._log_error(f"ProcIdK value (过程名)非字符串", proc_id_node); return
-        proc_entry = self.symbol_table.find(proc_name)
+        proc_entry = self.symbol_table.find(proc_name, getattr(proc_id_node, 'sym', None))
         if not proc_entry: self._log_error(f"过程 '{proc_name}' 未声明。", proc_id_node); return
         if proc_entry.kind != SymbKind.PROCEDURE: self._log_error(f"标识符 '{proc_name}' 非过程。", proc_id_node); return
         formal_params_signature_ir = proc_entry.proc_params_ir
@@ -611,7 +868,7 @@ class SemanticAnalyzer:
             actual_arg_type_ir = self._expr(actual_arg_node, access_needed)
             if actual_arg_type_ir.kind == TypeKind.UNKNOWN: continue
             if formal_param.type_ir is None: self._log_error(f"内部错误: 形参 '{formal_param.name}' 类型信息为 None"); continue
-            if formal_param.type_ir.get_base_type() != actual_arg_type_ir.get_base_type():
+            if formal_param.type_ir.get_base_type() is not actual_arg_type_ir.get_base_type():
                 self._log_error(f"过程 '{proc_name}' 第 {i+1} 参数类型不匹配。期望 '{formal_param.type_ir}', 得到 '{actual_arg_type_ir}'。", actual_arg_node)
 
     def _if_statement(self, if_node: TreeNode):
@@ -622,15 +879,20 @@ class SemanticAnalyzer:
             self._log_error("If 语句结构错误或子节点无效。", if_node); return
         cond_expr_node, then_stmlk_node = if_node.children[0], if_node.children[1]
         cond_type_ir = self._expr(cond_expr_node)
-        if cond_type_ir.kind == TypeKind.UNKNOWN : return
+        if cond_type_ir.kind == TypeKind.UNKNOWN : return None
         if cond_type_ir.get_base_type().kind != TypeKind.BOOLEAN:
             self._log_error(f"If 条件需布尔型, 得到 {cond_type_ir}。", cond_expr_node)
-        self._traverse_node(then_stmlk_node)
+        # 两个分支交给 _traverse_node 继续遍历 (嵌套的 if 不再递归)
+        branches = [then_stmlk_node]
         if len(if_node.children) > 2:
             else_stmlk_node = if_node.children[2]
-            if isinstance(else_stmlk_node, TreeNode): self._traverse_node(else_stmlk_node)
+            if isinstance(else_stmlk_node, TreeNode): branches.append(else_stmlk_node)
             elif else_stmlk_node is not None:
-                   self._log_error("If else 分支节点无效 (非TreeNode)。", if_node)
+                branches.append((self._invalid_else_branch, if_node))
+        return branches
+
+    def _invalid_else_branch(self, if_node: TreeNode):
+        self._log_error("If else 分支节点无效 (非TreeNode)。", if_node)
 
     def _read_statement(self, read_node: TreeNode):
         # (与之前代码相同)
@@ -655,15 +917,8 @@ class SemanticAnalyzer:
             self._log_error(f"Write 不能输出类型 {expr_type_ir} (基础类型 {base_expr_type.kind.value})。需整型/字符型。", expr_node_to_write)
 
     def _add_symbol_table_snapshot_to_listing(self, title="符号表快照"):
-        self.listing_for_file.append(f"\n--- {title} ---")
-        for level, scope in enumerate(self.symbol_table.scopes):
-            next_offset_info = "N/A"
-            if level < len(self.scope_offsets_stack): # 确保不越界访问
-                next_offset_info = str(self.scope_offsets_stack[level])
-            self.listing_for_file.append(f"作用域层次: {level} (下一可用偏移: {next_offset_info})")
-            if not scope: self.listing_for_file.append("  <空>"); continue
-            for name, entry in scope.items(): self.listing_for_file.append(f"  {str(entry)}")
-        self.listing_for_file.append(f"--- 快照结束 ({title}) ---\n")
+        # 只记录对各层作用域的引用 (LISTING_FULL 以下不记录)，条目在渲染日志时才格式化
+        self.listing_for_file.snapshot(title, self.symbol_table, self.scope_offsets_stack)
 
     def _print_symbol_table_to_console(self, title="符号表快照 (控制台)"):
         print(f"\n--- {title} ---")
@@ -673,27 +928,33 @@ class SemanticAnalyzer:
                 next_offset_info = str(self.scope_offsets_stack[level])
             print(f"作用域层次: {level} (下一可用偏移: {next_offset_info})")
             if not scope: print("  <空>"); continue
-            for name, entry in scope.items(): print(f"  {str(entry)}")
+            for entry in scope: print(f"  {str(entry)}")
         print(f"--- 快照结束 ({title}) ---")
 
 
 # --- 5. 顶层函数和命令行测试 ---
-def perform_semantic_analysis_from_source(source_code_string: str, trace_to_console_for_debug: bool = False) -> tuple[str, str, str, list[str]]:
+def perform_semantic_analysis_from_source(source_code_string: str, trace_to_console_for_debug: bool = False,
+                                          listing_level: int = LISTING_FULL) -> tuple[str, str, str, AnalysisListing]:
+    # 返回的分析日志是 AnalysisListing：迭代时才逐行生成文本 (可以像字符串列表一样写入 listing.txt)
     ast_string = "未能生成AST (可能由于词法或语法错误)。"
     symbol_table_string = "未能生成符号表 (可能由于前期错误或语义分析错误)。"
     error_messages_list: list[str] = []
-    analysis_listing: list[str] = ["--- 开始完整分析流程 ---"]
+    analysis_listing = AnalysisListing(listing_level)
+    analysis_listing.append("--- 开始完整分析流程 ---")
 
     try:
         analysis_listing.append("\n--- 1. 词法分析与语法分析 (生成 AST) ---")
         # 这些函数需要从外部导入或在此处提供定义
         # from ASTparser import generate_ast_from_source, format_ast_to_display_string
-        ast_root = generate_ast_from_source(source_code_string)
+        # 本次编译的标识符驻留表，词法/语法分析与语义分析共用
+        interner = SymbolInterner()
+        ast_root = generate_ast_from_source(source_code_string, interner=interner)
         ast_string = format_ast_to_display_string(ast_root)
         analysis_listing.append("词法及语法分析成功，AST已生成。")
 
         analysis_listing.append("\n--- 2. 语义分析 ---")
-        analyzer = SemanticAnalyzer(trace_to_console=trace_to_console_for_debug)
+        analyzer = SemanticAnalyzer(trace_to_console=trace_to_console_for_debug,
+                                    line_index=LineIndex(source_code_string), interner=interner, listing_level=listing_level)
         symbol_table_entries, semantic_errors, semantic_internal_listing = analyzer.analyze(ast_root)
 
         error_messages_list.extend(semantic_errors)
@@ -715,16 +976,16 @@ def perform_semantic_analysis_from_source(source_code_string: str, trace_to_cons
         err_msg = f"语法/词法分析错误:\n{str(se_syn)}"
         error_messages_list.append(err_msg)
         ast_string = f"AST生成失败: {str(se_syn)}"
-        analysis_listing.append(err_msg)
+        analysis_listing.error(err_msg, prefix="")
     except ImportError:
         err_msg = "错误: 依赖的 Lexer 或 ASTparser 模块未能导入。"
         error_messages_list.append(err_msg)
-        analysis_listing.append(err_msg)
+        analysis_listing.error(err_msg, prefix="")
     except Exception as e_other:
         err_msg = f"分析过程中发生意外错误:\n{str(e_other)}"
         error_messages_list.append(err_msg)
         ast_string = f"AST生成失败: {str(e_other)}"
-        analysis_listing.append(err_msg)
+        analysis_listing.error(err_msg, prefix="")
         import traceback
         analysis_listing.append(traceback.format_exc())
 
@@ -766,7 +1027,7 @@ def main_compiler_pipeline_cli():
         print(f"\n(详细分析日志包含 {len(full_listing)} 行，将写入 listing.txt)")
         try:
             with open("listing.txt", "w", encoding="utf-8") as f_cli:
-                for line_item in full_listing: f_cli.write(line_item + "\n")
+                full_listing.write(f_cli) # 在这里才把日志事件渲染成文本
             print("(详细分析日志已写入 listing.txt)")
         except IOError as e: print(f"\n写入 listing.txt 时发生错误: {e}")
 
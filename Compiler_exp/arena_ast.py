@@ -0,0 +1,250 @@
+# arena_ast.py
+# 扁平的 AST 存储：所有节点放在几组平行数组中 (节点类型编码、值下标、起始偏移、符号 id、第一个子节点、下一个兄弟节点)，
+# 节点就是数组下标，不再为每个节点创建对象和 children 列表。适合语句数以百万计的超大程序。
+# ArenaParser 复用 Parser 的全部产生式，只把节点构造改成向 AstArena 追加；
+# NodeView 是按需创建的轻量视图，可以像 TreeNode 一样交给语义分析器和 format_ast_to_display_string。
+
+import sys
+from array import array
+
+from ASTparser import NODE_TYPES, Parser, TreeNode
+from Lexer import Lexer
+
+# 节点类型 -> kinds 数组中的编码 (即在 NODE_TYPES 中的下标)
+NODE_TYPE_CODES = {node_type: code for code, node_type in enumerate(NODE_TYPES)}
+
+NO_NODE = -1 # first_child / next_sibling 中表示"没有"；values / starts / syms 中表示 None
+
+
+class AstArena:
+    """
+    节点 i 的各个字段分别存放在 kinds[i]、values[i] 等数组中。
+    节点的值 (程序名、"Assign"、"Op +"、"IdV x" 等字符串) 登记在 value_table 中，相同的值只存一份。
+    子节点用 first_child / next_sibling 链起来；_last_child 只在构造时用来 O(1) 追加子节点 (finish() 后释放)。
+    """
+    def __init__(self):
+        # 节点下标、值下标和符号 id 都用 4 字节有符号整数 (最多约 21 亿个节点)，源码偏移用 8 字节
+        self.kinds = array("B")
+        self.values = array("i")
+        self.starts = array("q")
+        self.syms = array("i")
+        self.first_child = array("i")
+        self.next_sibling = array("i")
+        self._last_child = array("i")
+        self.value_table = []
+        self._value_ids = {}
+        self.root = NO_NODE
+
+    def __len__(self):
+        return len(self.kinds)
+
+    @classmethod
+    def from_tree(cls, root):
+        """把 TreeNode 树 (包括表达式节点和各种视图) 复制成 AstArena，节点按先序编号。用显式栈，不受递归深度限制。"""
+        arena = cls()
+        stack = [(root, NO_NODE)]
+        pop, push = stack.pop, stack.append
+        while stack:
+            node, parent = pop()
+            index = arena.add(node.node_type, node.value, node.start, node.sym)
+            if parent == NO_NODE:
+                arena.root = index
+            else:
+                arena.attach(parent, index)
+            for child in reversed(node.children):
+                push((child, index))
+        arena.finish()
+        return arena
+
+    def add(self, node_type, value=None, start=None, sym=None):
+        """追加一个 (还没有子节点的) 节点，返回它的下标。"""
+        if value is None:
+            value_id = NO_NODE
+        else:
+            value_id = self._value_ids.get(value)
+            if value_id is None:
+                value_id = self._value_ids[value] = len(self.value_table)
+                self.value_table.append(value)
+        self.kinds.append(NODE_TYPE_CODES[node_type])
+        self.values.append(value_id)
+        self.starts.append(NO_NODE if start is None else start)
+        self.syms.append(NO_NODE if sym is None else sym)
+        self.first_child.append(NO_NODE)
+        self.next_sibling.append(NO_NODE)
+        self._last_child.append(NO_NODE)
+        return len(self.kinds) - 1
+
+    def attach(self, parent, child):
+        """把 child 接到 parent 的子节点末尾 (与 TreeNode.add_child 相同，child 为 None 时忽略)。"""
+        if child is None:
+            return
+        last = self._last_child[parent]
+        if last == NO_NODE:
+            self.first_child[parent] = child
+        else:
+            self.next_sibling[last] = child
+        self._last_child[parent] = child
+
+    def finish(self):
+        """构造结束：释放只在追加子节点时使用的 _last_child 和值的查找表。"""
+        self._last_child = array("i")
+        self._value_ids = {}
+
+    def node_type(self, index):
+        return NODE_TYPES[self.kinds[index]]
+
+    def value(self, index):
+        value_id = self.values[index]
+        return None if value_id == NO_NODE else self.value_table[value_id]
+
+    def start(self, index):
+        start = self.starts[index]
+        return None if start == NO_NODE else start
+
+    def sym(self, index):
+        sym = self.syms[index]
+        return None if sym == NO_NODE else sym
+
+    def children(self, index):
+        """依次产生 index 的各子节点下标。"""
+        next_sibling = self.next_sibling
+        child = self.first_child[index]
+        while child != NO_NODE:
+            yield child
+            child = next_sibling[child]
+
+    def walk(self, index=None):
+        """先序遍历以 index (默认根节点) 为根的子树，产生 (节点下标, 深度)。用显式栈，不受递归深度限制。"""
+        first_child, next_sibling = self.first_child, self.next_sibling
+        stack = [(self.root if index is None else index, 0)]
+        pop, push = stack.pop, stack.append
+        while stack:
+            node, depth = pop()
+            yield node, depth
+            # 兄弟节点先压栈，保证先访问完当前节点的子树；子树的根不看它的兄弟
+            if depth > 0 and next_sibling[node] != NO_NODE:
+                push((next_sibling[node], depth))
+            child = first_child[node]
+            if child != NO_NODE:
+                push((child, depth + 1))
+
+    def format(self, index=None):
+        """与 str(TreeNode) 相同的缩进文本。"""
+        kinds, values, value_table = self.kinds, self.values, self.value_table
+        lines = []
+        for node, depth in self.walk(index):
+            value_id = values[node]
+            line = "  " * depth + NODE_TYPES[kinds[node]]
+            if value_id != NO_NODE:
+                line += f" {value_table[value_id]}"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def view(self, index=None):
+        """返回节点 index (默认根节点) 的 NodeView。"""
+        return NodeView(self, self.root if index is None else index)
+
+
+class NodeView(TreeNode):
+    """
+    AstArena 中一个节点的只读视图，字段与 TreeNode 相同 (children 每次读取时生成子节点的视图)。
+    它是 TreeNode 的子类，语义分析器等按 TreeNode 处理 AST 的代码可以直接使用。
+    """
+    __slots__ = ("arena", "index")
+
+    def __init__(self, arena, index):
+        self.arena = arena
+        self.index = index
+
+    @property
+    def node_type(self): return self.arena.node_type(self.index)
+
+    @property
+    def value(self): return self.arena.value(self.index)
+
+    @property
+    def start(self): return self.arena.start(self.index)
+
+    @property
+    def sym(self): return self.arena.sym(self.index)
+
+    @property
+    def children(self):
+        arena = self.arena
+        return [NodeView(arena, child) for child in arena.children(self.index)]
+
+    def add_child(self, child):
+        raise Exception("NodeView 是只读的，不能添加子节点")
+
+    def __str__(self):
+        return self.arena.format(self.index)
+
+
+class ArenaParser(Parser):
+    """产生式与 Parser 完全相同 (包括错误信息)，但节点追加到 AstArena 中；parse() 返回根节点下标。"""
+    def __init__(self, tokens, line_index=None, arena=None):
+        super().__init__(tokens, line_index)
+        self.arena = arena if arena is not None else AstArena()
+
+    def build_node(self, node_type, value=None, start=None, sym=None):
+        return self.arena.add(node_type, value, start, sym)
+
+    def build_op(self, op, left, right, start=None):
+        node = self.arena.add("ExpK", f"Op {op}", start)
+        self.arena.attach(node, left)
+        self.arena.attach(node, right)
+        return node
+
+    def build_id(self, name, start=None, sym=None):
+        return self.arena.add("ExpK", f"IdV {name}", start, sym)
+
+    def build_const(self, number, start=None):
+        return self.arena.add("ExpK", f"Const {number}", start)
+
+    def build_array_access(self, array, index, start=None):
+        node = self.arena.add("ExpK", "ArrayAccess", start)
+        self.arena.attach(node, array)
+        self.arena.attach(node, index)
+        return node
+
+    def attach(self, parent, child):
+        self.arena.attach(parent, child)
+
+    def node_start(self, node):
+        return self.arena.start(node)
+
+    def has_children(self, node):
+        return self.arena.first_child[node] != NO_NODE
+
+    def parse(self):
+        self.arena.root = super().parse()
+        self.arena.finish()
+        return self.arena.root
+
+
+def generate_arena_ast_from_source(source_code, interner=None):
+    """与 ASTparser.generate_ast_from_source 相同，但返回 AstArena (arena.view() 得到根节点的视图)。"""
+    if isinstance(source_code, str):
+        lexer = Lexer(source_code, interner=interner)
+    else:
+        lexer = Lexer.from_stream(source_code, interner=interner)
+    parser = ArenaParser(lexer.iter_tokens(), line_index=lexer.line_index)
+    parser.parse()
+    return parser.arena
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("用法: python arena_ast.py 源文件")
+        return
+    try:
+        with open(sys.argv[1], encoding="utf-8") as f:
+            arena = generate_arena_ast_from_source(f)
+        print(arena.format())
+        print(f"\n节点数: {len(arena)}, 不同的节点值: {len(arena.value_table)}")
+    except Exception as e:
+        print(f"错误: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+# ast_file.py
+# AST 的紧凑二进制文件格式：保存一次语法分析的结果，GUI、命令行和语义分析器不必每次重新做词法和语法分析。
+# 文件内容就是 arena_ast.AstArena 的几组平行数组 (节点表、子节点/兄弟节点下标) 加上节点值的字符串池，前面有带版本号的文件头。
+# load_ast 用 mmap 映射文件，数组直接在映射上读取 (memoryview)，节点值在第一次访问时才解码，
+# 返回的 MappedAst 与 AstArena 用法相同：view() 得到根节点的 NodeView，可以交给语义分析器和 format_ast_to_display_string。
+# 用法: python ast_file.py save 源文件 AST文件
+#       python ast_file.py show AST文件
+
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from arena_ast import NO_NODE, AstArena
+from Lexer import SymbolInterner
+
+AST_FILE_MAGIC = b"SNLA"
+# 文件布局改变时加 1，旧版本的文件不再被读取
+AST_FILE_VERSION = 1
+# 文件头: 魔数、版本号、标志位、根节点下标、节点数、字符串数、标识符数、字符串池字节数、源码摘要 (不知道源码时全为 0)
+HEADER = struct.Struct("<4sHHiIIIQ16s")
+SECTION_ALIGNMENT = 8
+FLAG_SYMBOLS = 1 # 文件中保存了 SymbolInterner 的标识符
+
+
+def source_digest(source):
+    """源码的摘要，保存在文件头中，用来判断 AST 文件是否还对应当前的源码。"""
+    if isinstance(source, str):
+        source = source.encode("utf-8")
+    return hashlib.sha256(source).digest()[:16]
+
+
+def _padding(size):
+    return b"\0" * (-size % SECTION_ALIGNMENT)
+
+
+def _little_endian(values):
+    """数组在文件中一律按小端序存放。"""
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def save_ast(ast, path, source=None, interner=None):
+    """
+    把 AST 写入 path。ast 可以是 TreeNode 树的根节点，也可以是 AstArena (包括 MappedAst)。
+    给出 source 时在文件头中记录它的摘要 (见 MappedAst.matches_source)；
+    给出生成 AST 时所用的 SymbolInterner 时同时保存其中的标识符，载入后 MappedAst.interner 与它一致，节点上的 sym 仍然有效。
+    节依次为: starts (8 字节)、字符串偏移 (8 字节)、values / syms / first_child / next_sibling / 标识符 (4 字节)、kinds (1 字节)、
+    字符串池，每一节都按 8 字节对齐。返回写入的节点数。
+    """
+    arena = ast if isinstance(ast, AstArena) else AstArena.from_tree(ast)
+    strings = list(arena.value_table)
+    for value in strings:
+        if not isinstance(value, str):
+            raise Exception(f"AST 节点值必须是字符串才能保存，实际为 {type(value).__name__}: {value!r}")
+    # 标识符 (关键字之后的部分) 也放进字符串池，与节点值共用相同的字符串
+    string_ids = {value: index for index, value in enumerate(strings)}
+    symbols = array("i")
+    for name in (interner.names[interner.keyword_count:] if interner is not None else ()):
+        string_id = string_ids.get(name)
+        if string_id is None:
+            string_id = string_ids[name] = len(strings)
+            strings.append(name)
+        symbols.append(string_id)
+    encoded = [value.encode("utf-8") for value in strings]
+    offsets = array("q", [0])
+    for data in encoded:
+        offsets.append(offsets[-1] + len(data))
+    node_count = len(arena)
+    digest = source_digest(source) if source is not None else b"\0" * 16
+    sections = [
+        _little_endian(array("q", arena.starts)),
+        _little_endian(offsets),
+        _little_endian(array("i", arena.values)),
+        _little_endian(array("i", arena.syms)),
+        _little_endian(array("i", arena.first_child)),
+        _little_endian(array("i", arena.next_sibling)),
+        _little_endian(symbols),
+        bytes(arena.kinds),
+    ]
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(AST_FILE_MAGIC, AST_FILE_VERSION, FLAG_SYMBOLS if interner is not None else 0, arena.root,
+                            node_count, len(encoded), len(symbols), offsets[-1], digest))
+        for data in sections:
+            f.write(data)
+            f.write(_padding(len(data)))
+        for data in encoded:
+            f.write(data)
+    return node_count
+
+
+class _StringPool:
+    """字符串池的只读序列：第 i 个字符串在第一次访问时才从映射中解码，之后缓存。"""
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+        self.cache = {}
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        value = self.cache.get(index)
+        if value is None:
+            if not 0 <= index < len(self.offsets) - 1:
+                raise IndexError(index)
+            value = self.cache[index] = str(self.data[self.offsets[index]:self.offsets[index + 1]], "utf-8")
+        return value
+
+
+class MappedAst(AstArena):
+    """
+    映射到内存中的 AST 文件。打开时只读取文件头并建立各节的 memoryview，不创建任何节点对象；
+    NodeView 在访问时按下标读取映射中的数据，所以打开一个很大的 AST 文件几乎不花时间，也只占用实际访问到的页面。
+    只读：不能 add / attach。用完调用 close() (或用 with 语句)。
+    """
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size < HEADER.size: # mmap 不能映射空文件
+                raise Exception("AST 文件格式错误: 文件太短")
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._load()
+        except Exception:
+            self._mmap.close()
+            raise
+
+    def _load(self):
+        (magic, version, self.flags, root, node_count, string_count, symbol_count, string_bytes,
+         self.digest) = HEADER.unpack_from(self._mmap, 0)
+        if magic != AST_FILE_MAGIC:
+            raise Exception("AST 文件格式错误: 魔数不匹配")
+        if version != AST_FILE_VERSION:
+            raise Exception(f"AST 文件版本为 {version}，当前只支持版本 {AST_FILE_VERSION}")
+        layout = [("q", node_count), ("q", string_count + 1), ("i", node_count), ("i", node_count),
+                  ("i", node_count), ("i", node_count), ("i", symbol_count), ("B", node_count)]
+        expected = HEADER.size + sum(-(-struct.calcsize(typecode) * count // SECTION_ALIGNMENT) * SECTION_ALIGNMENT
+                                     for typecode, count in layout) + string_bytes
+        if len(self._mmap) != expected:
+            raise Exception(f"AST 文件格式错误: 文件长度应为 {expected} 字节，实际为 {len(self._mmap)} 字节")
+        buffer = memoryview(self._mmap)
+        self._views = [buffer]
+        sections = []
+        offset = HEADER.size
+        for typecode, count in layout:
+            size = struct.calcsize(typecode) * count
+            section = buffer[offset:offset + size]
+            if sys.byteorder == "little":
+                section = section.cast(typecode)
+            else: # 大端机器上复制一份并转换字节序，不再零拷贝
+                section = array(typecode, section.tobytes())
+                section.byteswap()
+            self._views.append(section)
+            sections.append(section)
+            offset += size + (-size % SECTION_ALIGNMENT)
+        (self.starts, offsets, self.values, self.syms, self.first_child, self.next_sibling, self._symbols,
+         self.kinds) = sections
+        strings = buffer[offset:offset + string_bytes]
+        self._views.append(strings)
+        self.value_table = _StringPool(offsets, strings)
+        self.root = root
+        if root != NO_NODE and not 0 <= root < node_count:
+            raise Exception(f"AST 文件格式错误: 根节点下标 {root} 超出范围")
+
+    @property
+    def interner(self):
+        """与保存时的 SymbolInterner 内容相同的新驻留表 (保存时没有给出 interner 则为 None)，对这棵 AST 做语义分析时使用。"""
+        if not self.flags & FLAG_SYMBOLS:
+            return None
+        interner = SymbolInterner()
+        for string_id in self._symbols:
+            interner.intern(self.value_table[string_id])
+        return interner
+
+    def matches_source(self, source):
+        """文件是否由这份源码生成 (保存时没有给出源码的文件总是返回 False)。"""
+        return self.digest == source_digest(source)
+
+    def add(self, node_type, value=None, start=None, sym=None):
+        raise Exception("MappedAst 是只读的，不能添加节点")
+
+    def attach(self, parent, child):
+        raise Exception("MappedAst 是只读的，不能添加子节点")
+
+    def finish(self):
+        pass
+
+    def close(self):
+        """释放所有 memoryview 后关闭映射；之后不能再访问节点。"""
+        for view in reversed(self._views):
+            if isinstance(view, memoryview):
+                view.release()
+        self._views = []
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def load_ast(path):
+    """用 mmap 打开 save_ast 写出的文件，返回 MappedAst (mapped.view() 得到根节点的视图)。"""
+    return MappedAst(path)
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == "save":
+        from ASTparser import generate_ast_from_source
+        try:
+            with open(sys.argv[2], encoding="utf-8") as f:
+                source = f.read()
+            interner = SymbolInterner()
+            ast = generate_ast_from_source(source, interner=interner)
+            node_count = save_ast(ast, sys.argv[3], source=source, interner=interner)
+            print(f"已保存 {node_count} 个节点到 {sys.argv[3]}")
+        except Exception as e:
+            print(f"错误: {e}")
+    elif len(sys.argv) == 3 and sys.argv[1] == "show":
+        from ASTparser import format_ast_to_display_string
+        try:
+            with load_ast(sys.argv[2]) as mapped:
+                print(format_ast_to_display_string(mapped.view()))
+                print(f"\n节点数: {len(mapped)}, 不同的节点值: {len(mapped.value_table)}")
+        except Exception as e:
+            print(f"错误: {e}")
+    else:
+        print("用法: python ast_file.py save 源文件 AST文件\n      python ast_file.py show AST文件")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,943 @@
+# benchmark.py
+# 编译器前端各阶段的性能基准测试。
+# 用法: python benchmark.py [基准名 ...]      (不带参数时运行全部基准)
+
+import sys
+import time
+import tracemalloc
+
+from Lexer import Lexer
+
+
+# --- 合成 SNL 程序生成器 ---
+def generate_snl_program(statement_count, procedure_count=4, var_count=10):
+    """
+    生成一个语法和语义都正确的 SNL 程序，主程序体大约包含 statement_count 条语句。
+    程序中包含类型声明、变量声明、带值参/变参的过程、注释、if 语句和过程调用，
+    可用于词法、语法和语义分析各阶段的基准测试。
+    """
+    var_names = [f"v{i}" for i in range(var_count)]
+    lines = ["program bench", "type t1 = integer;", "var integer " + ", ".join(var_names) + ";", "    t1 w0;"]
+    for p in range(procedure_count):
+        lines += [
+            f"procedure p{p}(integer a; var integer b);",
+            "var integer c;",
+            "begin",
+            "   c := a + 1;",
+            f"   b := c * {p + 2}",
+            "end",
+        ]
+
+    statement_templates = [
+        "   read({0})",
+        "   {{ 注释 {3} }} {0} := ({1} + {3}) * {2} - {1} / 4",
+        "   if {0} < 100 then {1} := {1} + 1 else {2} := {2} - 1 fi",
+        "   w0 := {0} + w0",
+        "   p{4}({0}, {1})",
+        "   write({0})",
+    ]
+    body = []
+    for i in range(statement_count):
+        template = statement_templates[i % len(statement_templates)]
+        body.append(template.format(var_names[i % var_count], var_names[(i + 3) % var_count],
+                                    var_names[(i + 7) % var_count], i, i % max(procedure_count, 1)))
+    if procedure_count == 0:
+        body = [stmt for stmt in body if not stmt.lstrip().startswith("p")]
+    lines.append("begin")
+    lines.append(";\n".join(body) if body else "   write(0)")
+    lines.append("end.")
+    return "\n".join(lines) + "\n"
+
+
+def generate_expression_program(statement_count, operand_count=12, var_count=10):
+    """生成以长算术/比较表达式为主的 SNL 程序：每条语句是带括号的多项式赋值或以比较为条件的 if 语句。"""
+    var_names = [f"v{i}" for i in range(var_count)]
+    operators = ["+", "-", "*", "/"]
+    body = []
+    for i in range(statement_count):
+        terms = [var_names[(i + k) % var_count] if k % 3 else str(k + i % 7) for k in range(operand_count)]
+        expression = terms[0]
+        for k, term in enumerate(terms[1:], 1):
+            expression = f"({expression} {operators[k % 4]} {term})" if k % 4 == 0 else f"{expression} {operators[k % 4]} {term}"
+        target = var_names[i % var_count]
+        if i % 2:
+            body.append(f"   if {expression} < {target} * 2 then {target} := {expression} else {target} := 0 fi")
+        else:
+            body.append(f"   {target} := {expression}")
+    return "\n".join(["program expr", "var integer " + ", ".join(var_names) + ";", "begin",
+                      ";\n".join(body) if body else "   write(0)", "end."]) + "\n"
+
+
+def generate_stress_expression(operator_count=0, nesting_depth=0):
+    """
+    生成一条超长或超深的 SNL 表达式：operator_count 个二元运算符依次连接的长表达式，
+    或者交替嵌套 nesting_depth 层括号和数组下标 (a[(a[(...)])]) 的深表达式。
+    """
+    operators = ["+", "*", "-", "/"]
+    if nesting_depth:
+        opening = "".join("(" if level % 2 else "a[" for level in range(nesting_depth))
+        closing = "".join(f" + {level % 10})" if level % 2 else "]" for level in reversed(range(nesting_depth)))
+        return opening + "v1" + closing
+    return "v0" + "".join(f" {operators[i % 4]} {f'v{i % 10}' if i % 3 else i % 97}" for i in range(operator_count))
+
+
+def _format_rate(count, seconds):
+    return f"{count / seconds:,.0f}" if seconds > 0 else "inf"
+
+
+# --- 各项基准 ---
+def bench_lexer(statement_counts=(1_000, 10_000, 50_000, 200_000), repeat=3):
+    """Lexer.tokenize 的吞吐量 (tokens/s)，输入规模从小到数 MB。"""
+    print("Lexer.tokenize 吞吐量")
+    print(f"{'语句数':>10} {'源码字节':>12} {'Token数':>10} {'最佳耗时(s)':>12} {'tokens/s':>14}")
+    for statement_count in statement_counts:
+        source = generate_snl_program(statement_count)
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            tokens = Lexer(source).tokenize()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print(f"{statement_count:>10} {len(source):>12} {len(tokens):>10} {best:>12.4f} {_format_rate(len(tokens), best):>14}")
+
+
+def _measure_retained(build):
+    """返回 (结果, 结果占用的内存字节数, tracemalloc 记录的峰值字节数, 耗时)。"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current, peak, elapsed
+
+
+def bench_token_memory(statement_counts=(10_000, 100_000)):
+    """Token 对象列表与紧凑 TokenBuffer 的内存占用对比。"""
+    print("Token 列表 vs TokenBuffer 内存占用")
+    print(f"{'语句数':>10} {'Token数':>10} {'容器':>12} {'保留内存(MB)':>14} {'字节/Token':>11} {'峰值(MB)':>10} {'耗时(s)':>9}")
+    for statement_count in statement_counts:
+        source = generate_snl_program(statement_count)
+        for label, build in (("list[Token]", lambda: Lexer(source).tokenize()),
+                             ("TokenBuffer", lambda: Lexer(source).tokenize_to_buffer())):
+            tokens, retained, peak, elapsed = _measure_retained(build)
+            print(f"{statement_count:>10} {len(tokens):>10} {label:>12} {retained / 2**20:>14.1f} "
+                  f"{retained / len(tokens):>11.1f} {peak / 2**20:>10.1f} {elapsed:>9.2f}")
+            del tokens
+
+
+def bench_incremental_lexer(statement_counts=(10_000, 50_000, 200_000), keystrokes=400):
+    """
+    在文件中部模拟逐键输入，对比 IncrementalLexer.apply_edit 与完整重新扫描的单次耗时。
+    增量编辑只重新扫描编辑点附近的几个 Token，源码和 Token 都分块保存，块的增量、大小和分片长度放在树状数组中，
+    单次耗时只随块数的对数增长 (块被拆分或合并时的整体重建分摊到很多次编辑上)。
+    """
+    from incremental_lexer import IncrementalLexer
+    print("增量词法分析: 单次按键的平均耗时")
+    print(f"{'语句数':>10} {'源码字节':>12} {'完整扫描(ms)':>14} {'增量编辑(ms)':>14} {'加速比':>8}")
+    # 输入过程中的每个中间状态都必须能通过词法分析 (单独的 ':' 是词法错误)，所以不输入 :=
+    typed_text = "   write(total + 42);\n" * (keystrokes // 22 + 1)
+    for statement_count in statement_counts:
+        source = generate_snl_program(statement_count)
+        start = time.perf_counter()
+        Lexer(source).tokenize()
+        full_ms = (time.perf_counter() - start) * 1000
+
+        incremental = IncrementalLexer(source)
+        position = source.index(";\n", len(source) // 2) + 2 # 某条语句之后的行首
+        start = time.perf_counter()
+        for offset in range(keystrokes):
+            incremental.apply_edit(position + offset, position + offset, typed_text[offset])
+        edit_ms = (time.perf_counter() - start) * 1000 / keystrokes
+        print(f"{statement_count:>10} {len(source):>12} {full_ms:>14.2f} {edit_ms:>14.4f} {full_ms / edit_ms:>8.0f}x")
+
+
+def bench_dfa_lexer(statement_counts=(10_000, 50_000, 200_000), repeat=3):
+    """表驱动 DFA 引擎与 master regex 引擎的吞吐量对比，并检查两者的 Token 序列完全相同。"""
+    import dfa_lexer
+    start = time.perf_counter()
+    dfa_lexer.build_dfa_table()
+    build_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    data = dfa_lexer.load_table_data()
+    load_ms = (time.perf_counter() - start) * 1000
+    print(f"DFA 表: {len(data['transitions'])} 个状态 x {len(data['signature_classes'])} 个字符类, "
+          f"生成 {build_ms:.1f} ms, 从缓存加载 {load_ms:.1f} ms")
+    print(f"{'语句数':>10} {'源码字节':>12} {'引擎':>6} {'最佳耗时(s)':>12} {'tokens/s':>14} {'结果一致':>8}")
+    for statement_count in statement_counts:
+        source = generate_snl_program(statement_count)
+        reference = None
+        for engine in ("regex", "dfa"):
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                tokens = Lexer(source, engine).tokenize()
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            signature = [(t.type, t.value, t.start, t.end) for t in tokens]
+            reference = reference or signature
+            print(f"{statement_count:>10} {len(source):>12} {engine:>6} {best:>12.4f} "
+                  f"{_format_rate(len(tokens), best):>14} {'是' if signature == reference else '否':>8}")
+
+
+def bench_parallel_lexer(statement_count=200_000, worker_counts=None):
+    """并行分块词法分析相对串行 tokenize_to_buffer 的加速比，随进程数变化 (进程池在计时前创建)。"""
+    import os
+    from concurrent.futures import ProcessPoolExecutor
+    from parallel_lexer import parallel_tokenize_to_buffer
+    cpu_count = os.cpu_count() or 1
+    worker_counts = worker_counts or sorted({1, 2, 4, cpu_count})
+    source = generate_snl_program(statement_count)
+    start = time.perf_counter()
+    reference = Lexer(source).tokenize_to_buffer()
+    serial = time.perf_counter() - start
+    print(f"源码 {len(source)} 字节, {len(reference)} 个 Token, 本机 CPU 数 {cpu_count}, 串行耗时 {serial:.3f} s")
+    print(f"{'进程数':>8} {'耗时(s)':>10} {'加速比':>8} {'结果一致':>8}")
+    for workers in worker_counts:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            executor.submit(int).result() # 先启动进程池
+            start = time.perf_counter()
+            buffer = parallel_tokenize_to_buffer(source, workers, executor=executor)
+            elapsed = time.perf_counter() - start
+        same = (buffer.kinds == reference.kinds and buffer.starts == reference.starts and buffer.ends == reference.ends)
+        print(f"{workers:>8} {elapsed:>10.3f} {serial / elapsed:>8.2f} {'是' if same else '否':>8}")
+
+
+def bench_mmap_lexer(statement_counts=(50_000, 200_000)):
+    """
+    读入 str 后 tokenize_to_buffer 与 mmap 零拷贝扫描 (mmap_lexer.tokenize_file) 的峰值内存和耗时对比。
+    源码写入临时文件；mmap 映射的页面属于文件缓存，不计入 tracemalloc，峰值应接近 Token 数组本身。
+    """
+    import os
+    import tempfile
+    from mmap_lexer import tokenize_file
+    print(f"{'语句数':>10} {'文件(MB)':>9} {'Token数':>10} {'方式':>14} {'峰值(MB)':>10} {'保留(MB)':>10} {'耗时(s)':>9} {'一致':>4}")
+    status = 0
+    for statement_count in statement_counts:
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", suffix=".snl", delete=False) as f:
+            f.write(generate_snl_program(statement_count))
+            path = f.name
+        try:
+            size = os.path.getsize(path)
+
+            def read_and_tokenize():
+                with open(path, encoding="utf-8") as source_file:
+                    return Lexer(source_file.read()).tokenize_to_buffer()
+
+            reference, retained, peak, elapsed = _measure_retained(read_and_tokenize)
+            print(f"{statement_count:>10} {size / 2**20:>9.1f} {len(reference):>10} {'read()+str':>14} "
+                  f"{peak / 2**20:>10.1f} {retained / 2**20:>10.1f} {elapsed:>9.2f}")
+            buffer, retained, peak, elapsed = _measure_retained(lambda: tokenize_file(path))
+            # 注释中含中文，mmap 模式的偏移是字节偏移：抽样换算成字符偏移后比较
+            data = buffer.source
+            same = buffer.kinds == reference.kinds and all(
+                buffer.value_at(i) == reference.value_at(i)
+                and len(data[:buffer.starts[i]].decode("utf-8")) == reference.starts[i]
+                for i in range(0, len(buffer), len(buffer) // 50 + 1))
+            status |= not same
+            print(f"{statement_count:>10} {size / 2**20:>9.1f} {len(buffer):>10} {'mmap+bytes':>14} "
+                  f"{peak / 2**20:>10.1f} {retained / 2**20:>10.1f} {elapsed:>9.2f} {'是' if same else '否':>4}")
+            buffer.close()
+            del reference, buffer
+        finally:
+            os.unlink(path)
+    return status
+
+
+def bench_expr_ast(statement_counts=(2_000, 10_000), repeat=3):
+    """
+    带类型字段的表达式节点 (OpExp/IdExp/ConstExp) 与旧的字符串编码 TreeNode ("Op +"、"IdV x") 对比：
+    AST 占用的内存 (tracemalloc)，以及对同一棵树做语义分析的耗时。旧格式的树用 to_plain_tree 转换得到。
+    """
+    from ASTparser import generate_ast_from_source, to_plain_tree
+    from analyzer import SemanticAnalyzer
+    from Lexer import SymbolInterner
+    print(f"{'语句数':>8} {'AST格式':>10} {'AST内存(MB)':>12} {'语义分析(s)':>12} {'加速比':>7} {'结果一致':>8}")
+    status = 0
+    for statement_count in statement_counts:
+        source = generate_expression_program(statement_count)
+        interner = SymbolInterner()
+        typed_ast, typed_memory, _, _ = _measure_retained(lambda: generate_ast_from_source(source, interner=interner))
+        plain_ast, plain_memory, _, _ = _measure_retained(lambda: to_plain_tree(typed_ast))
+        results = {}
+        for label, ast in (("字符串", plain_ast), ("类型化", typed_ast)):
+            best = None
+            for _ in range(repeat):
+                analyzer = SemanticAnalyzer(interner=interner)
+                start = time.perf_counter()
+                entries, errors, _ = analyzer.analyze(ast)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            results[label] = (best, [str(entry) for entry in entries], errors)
+        same = results["字符串"][1:] == results["类型化"][1:] and str(plain_ast) == str(typed_ast)
+        status |= not same
+        base_time = results["字符串"][0]
+        for label, memory in (("字符串", plain_memory), ("类型化", typed_memory)):
+            print(f"{statement_count:>8} {label:>10} {memory / 2**20:>12.1f} {results[label][0]:>12.3f} "
+                  f"{base_time / results[label][0]:>7.2f} {'是' if same else '否':>8}")
+    return status
+
+
+def _arena_ast_child(representation, statement_count):
+    """
+    在独立的子进程中执行：生成并扫描程序后，构建一种 AST (tree = TreeNode，arena = AstArena) 并做一次先序遍历，
+    打印 "构建耗时 遍历耗时 构建引起的峰值RSS增量(字节) 节点数"。
+    """
+    import resource
+    from ASTparser import Parser
+    from arena_ast import ArenaParser
+    tokens = list(Lexer(generate_snl_program(statement_count)).iter_tokens())
+    # ru_maxrss 在 Linux 上以 KB 为单位，在 macOS 上以字节为单位
+    unit = 1 if sys.platform == "darwin" else 1024
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit
+    start = time.perf_counter()
+    if representation == "arena":
+        parser = ArenaParser(tokens)
+        parser.parse()
+        arena = parser.arena
+    else:
+        root = Parser(tokens).parse()
+    build = time.perf_counter() - start
+    rss_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit
+    start = time.perf_counter()
+    if representation == "arena":
+        node_count = sum(1 for _ in arena.walk())
+    else:
+        node_count, stack = 0, [root]
+        while stack:
+            node = stack.pop()
+            node_count += 1
+            stack.extend(node.children)
+    walk = time.perf_counter() - start
+    print(build, walk, rss_peak - rss_before, node_count)
+
+
+def bench_arena_ast(statement_counts=(50_000, 200_000)):
+    """
+    扁平的 AstArena 与 TreeNode 对象树的对比：语法分析构建 AST 的耗时、先序遍历耗时和构建时的峰值 RSS 增量。
+    每种表示在单独的子进程中测量 (需要 resource 模块，即类 Unix 系统)，互不影响峰值 RSS。
+    """
+    import os
+    import subprocess
+    try:
+        import resource # noqa: F401
+    except ImportError:
+        print("本基准需要 resource 模块 (类 Unix 系统)，已跳过。")
+        return 0
+    here = os.path.dirname(os.path.abspath(__file__))
+    print(f"{'语句数':>8} {'AST表示':>8} {'节点数':>10} {'构建(s)':>9} {'遍历(s)':>9} {'峰值RSS增量(MB)':>16}")
+    status = 0
+    for statement_count in statement_counts:
+        node_counts = set()
+        for representation in ("tree", "arena"):
+            code = f"import benchmark; benchmark._arena_ast_child({representation!r}, {statement_count})"
+            result = subprocess.run([sys.executable, "-c", code], cwd=here, capture_output=True, text=True)
+            if result.returncode != 0:
+                print(result.stderr)
+                return 1
+            build, walk, rss, node_count = result.stdout.split()
+            node_counts.add(node_count)
+            print(f"{statement_count:>8} {representation:>8} {int(node_count):>10} {float(build):>9.2f} {float(walk):>9.3f} "
+                  f"{int(rss) / 2**20:>16.1f}")
+        if len(node_counts) != 1:
+            print("两种表示的节点数不一致！")
+            status = 1
+    return status
+
+
+def bench_stream_parse(statement_counts=(20_000, 100_000)):
+    """
+    从文件流式读取并解析时的峰值内存：先收集完整 Token 列表再解析，与 Parser 通过 TokenStream 边扫描边取 Token 对比。
+    后者已经解析过的 Token 随即可以回收，峰值应接近 AST 本身 (表中"AST"一列是解析结束后保留的内存)。
+    """
+    import os
+    import tempfile
+    from ASTparser import Parser, generate_ast_from_source
+    print(f"{'语句数':>8} {'文件(MB)':>9} {'方式':>14} {'峰值(MB)':>10} {'AST(MB)':>9} {'耗时(s)':>8}")
+    for statement_count in statement_counts:
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", suffix=".snl", delete=False) as f:
+            f.write(generate_snl_program(statement_count))
+            path = f.name
+        try:
+            def parse_token_list():
+                with open(path, encoding="utf-8") as source_file:
+                    lexer = Lexer.from_stream(source_file)
+                    return Parser(list(lexer.iter_tokens()), lexer.line_index).parse()
+
+            def parse_streamed():
+                with open(path, encoding="utf-8") as source_file:
+                    return generate_ast_from_source(source_file)
+
+            for label, build in (("Token 列表", parse_token_list), ("TokenStream", parse_streamed)):
+                ast, retained, peak, elapsed = _measure_retained(build)
+                print(f"{statement_count:>8} {os.path.getsize(path) / 2**20:>9.1f} {label:>14} {peak / 2**20:>10.1f} "
+                      f"{retained / 2**20:>9.1f} {elapsed:>8.2f}")
+                del ast
+        finally:
+            os.unlink(path)
+
+
+def bench_stream_check(statement_counts=(10_000, 50_000)):
+    """
+    从文件读取并做完整的语法+语义分析时的峰值内存：先生成整个 AST 再 SemanticAnalyzer.analyze，
+    与 stream_check.check_streaming (主程序体的语句逐条检查后丢弃) 对比，并确认两者报告的错误相同。
+    """
+    import os
+    import tempfile
+    from analyzer import SemanticAnalyzer
+    from ASTparser import generate_ast_from_source
+    from Lexer import SymbolInterner
+    from stream_check import check_streaming
+    print(f"{'语句数':>8} {'文件(MB)':>9} {'方式':>10} {'峰值(MB)':>10} {'耗时(s)':>8} {'错误数':>7}")
+    for statement_count in statement_counts:
+        # 每 30 条语句中有一条使用未声明的变量，两种方式都应报告同样的错误
+        source = generate_snl_program(statement_count).replace("   w0 := v1 + w0", "   w0 := zz + w0")
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", suffix=".snl", delete=False) as f:
+            f.write(source)
+            path = f.name
+        try:
+            def check_full_ast():
+                interner = SymbolInterner()
+                with open(path, encoding="utf-8") as source_file:
+                    ast = generate_ast_from_source(source_file, interner=interner)
+                return SemanticAnalyzer(interner=interner).analyze(ast)[1]
+
+            def check_streamed():
+                with open(path, encoding="utf-8") as source_file:
+                    return check_streaming(source_file)[1]
+
+            results = []
+            for label, check in (("完整 AST", check_full_ast), ("流式检查", check_streamed)):
+                errors, _, peak, elapsed = _measure_retained(check)
+                results.append(errors)
+                print(f"{statement_count:>8} {os.path.getsize(path) / 2**20:>9.1f} {label:>10} {peak / 2**20:>10.1f} "
+                      f"{elapsed:>8.2f} {len(errors):>7}")
+            # 完整 AST 方式没有行首偏移表，比较时去掉流式检查附加的行:列
+            if results[0] != [error.split(" (行:列")[0] for error in results[1]]:
+                print("  错误: 两种方式报告的语义错误不同")
+        finally:
+            os.unlink(path)
+
+
+def bench_parser(statement_counts=(10_000, 50_000), repeat=5):
+    """Parser 的吞吐量 (tokens/s)：以语句为主和以长表达式为主的两类程序，Token 预先扫描好，只计语法分析。"""
+    from ASTparser import Parser
+    print(f"{'程序':>6} {'语句数':>8} {'Token数':>10} {'最佳耗时(s)':>12} {'tokens/s':>12}")
+    for label, generate in (("语句", generate_snl_program), ("表达式", generate_expression_program)):
+        for statement_count in statement_counts:
+            tokens = Lexer(generate(statement_count)).tokenize()
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                Parser(tokens).parse()
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            print(f"{label:>6} {statement_count:>8} {len(tokens):>10} {best:>12.3f} {_format_rate(len(tokens), best):>12}")
+
+
+def bench_parse_recovery(statement_counts=(10_000, 50_000), repeat=5):
+    """错误恢复模式 (Parser(..., recover=True)) 在没有错误的输入上相对普通模式的额外开销 (Token 预先扫描好，只计语法分析)。"""
+    from ASTparser import Parser
+    print(f"{'语句数':>8} {'Token数':>10} {'普通模式(s)':>12} {'恢复模式(s)':>12} {'额外开销':>9}")
+    for statement_count in statement_counts:
+        tokens = Lexer(generate_snl_program(statement_count)).tokenize()
+        best = {}
+        for _ in range(repeat):
+            for recover in (False, True):
+                start = time.perf_counter()
+                parser = Parser(tokens, recover=recover)
+                parser.parse()
+                elapsed = time.perf_counter() - start
+                assert not parser.errors
+                best[recover] = min(best.get(recover, elapsed), elapsed)
+        print(f"{statement_count:>8} {len(tokens):>10} {best[False]:>12.3f} {best[True]:>12.3f} "
+              f"{(best[True] / best[False] - 1) * 100:>8.1f}%")
+
+
+def bench_incremental_parser(sizes=((2_000, 100), (10_000, 500), (40_000, 2_000)), keystrokes=200):
+    """
+    在中间一个过程的语句末尾逐键输入数字，对比 IncrementalParser.update 与 generate_ast_from_source 的单次耗时。
+    增量解析只重新解析被编辑的过程，其余过程和主程序体的子树直接复用。
+    """
+    from ASTparser import generate_ast_from_source
+    from incremental_parser import IncrementalParser
+    print("增量语法分析: 单次按键 (源码 -> AST) 的平均耗时")
+    print(f"{'语句数':>8} {'过程数':>6} {'源码字节':>10} {'完整解析(ms)':>14} {'增量解析(ms)':>14} {'加速比':>8} {'一致':>4}")
+    for statement_count, procedure_count in sizes:
+        source = generate_snl_program(statement_count, procedure_count=procedure_count)
+        start = time.perf_counter()
+        generate_ast_from_source(source)
+        full_ms = (time.perf_counter() - start) * 1000
+
+        parser = IncrementalParser()
+        parser.update(source)
+        position = source.index(f"b := c * {procedure_count // 2 + 2}\n") + len(f"b := c * {procedure_count // 2 + 2}")
+        start = time.perf_counter()
+        for offset in range(keystrokes):
+            source = source[:position + offset] + str(offset % 10) + source[position + offset:]
+            ast = parser.update(source)
+        edit_ms = (time.perf_counter() - start) * 1000 / keystrokes
+        same = str(ast) == str(generate_ast_from_source(source))
+        print(f"{statement_count:>8} {procedure_count:>6} {len(source):>10} {full_ms:>14.2f} {edit_ms:>14.3f} "
+              f"{full_ms / edit_ms:>8.0f}x {'是' if same else '否':>4}")
+        if not same:
+            return 1
+    return 0
+
+
+def bench_expr_stress(operator_counts=(10_000, 100_000), nesting_depths=(1_000, 10_000)):
+    """
+    超长 (10^5 个运算符) 和超深 (10^4 层括号/数组下标) 表达式的语法分析耗时。
+    Parser.exp 用显式栈做优先级爬升，在默认的递归深度限制下也能解析，不会 RecursionError。
+    """
+    from ASTparser import generate_ast_from_source
+    print(f"递归深度限制: {sys.getrecursionlimit()}")
+    print(f"{'表达式':>16} {'Token数':>10} {'解析耗时(s)':>12} {'AST节点数':>10} {'AST深度':>8}")
+    cases = [(f"{count} 个运算符", generate_stress_expression(operator_count=count)) for count in operator_counts]
+    cases += [(f"{depth} 层嵌套", generate_stress_expression(nesting_depth=depth)) for depth in nesting_depths]
+    for label, expression in cases:
+        source = f"program stress\nvar integer v0, v1, v2, v3, v4, v5, v6, v7, v8, v9;\nbegin\n   v0 := {expression}\nend.\n"
+        token_count = len(Lexer(source).tokenize_to_buffer())
+        start = time.perf_counter()
+        ast = generate_ast_from_source(source)
+        elapsed = time.perf_counter() - start
+        node_count, max_depth, stack = 0, 0, [(ast, 0)]
+        while stack:
+            node, depth = stack.pop()
+            node_count += 1
+            max_depth = max(max_depth, depth)
+            stack.extend((child, depth + 1) for child in node.children)
+        print(f"{label:>16} {token_count:>10} {elapsed:>12.3f} {node_count:>10} {max_depth:>8}")
+
+
+def bench_ll1_parser(statement_counts=(10_000, 50_000), if_depths=(1_000, 10_000), repeat=3):
+    """
+    表驱动 LL(1) 分析 (ll1_parser.LL1Parser) 与递归下降 (Parser) 的吞吐量对比 (Token 预先扫描好，只计语法分析)，
+    以及分析表从文法生成和从缓存加载的耗时、深层嵌套 if 语句在默认递归深度限制下的表现。
+    """
+    from ASTparser import Parser
+    from ll1_parser import LL1Parser, LL1Table, build_ll1_table, load_table_data
+    start = time.perf_counter()
+    build_ll1_table()
+    build_ms = (time.perf_counter() - start) * 1000
+    load_table_data()
+    start = time.perf_counter()
+    table = LL1Table(load_table_data())
+    load_ms = (time.perf_counter() - start) * 1000
+    print(f"分析表: 由文法生成 {build_ms:.1f} ms, 从缓存加载 {load_ms:.1f} ms")
+
+    print(f"{'语句数':>8} {'Token数':>10} {'递归下降(tok/s)':>16} {'LL(1)(tok/s)':>14} {'相对耗时':>9} {'一致':>4}")
+    for statement_count in statement_counts:
+        tokens = Lexer(generate_snl_program(statement_count)).tokenize()
+        best, trees = {}, {}
+        for _ in range(repeat):
+            for name, parser_class in (("rd", Parser), ("ll1", LL1Parser)):
+                parser = parser_class(tokens) if parser_class is Parser else parser_class(tokens, table=table)
+                start = time.perf_counter()
+                trees[name] = parser.parse()
+                elapsed = time.perf_counter() - start
+                best[name] = min(best.get(name, elapsed), elapsed)
+        same = str(trees["rd"]) == str(trees["ll1"])
+        print(f"{statement_count:>8} {len(tokens):>10} {len(tokens) / best['rd']:>16,.0f} {len(tokens) / best['ll1']:>14,.0f} "
+              f"{best['ll1'] / best['rd']:>8.2f}x {'是' if same else '否':>4}")
+
+    print(f"递归深度限制: {sys.getrecursionlimit()}")
+    print(f"{'if 嵌套层数':>10} {'递归下降':>12} {'LL(1)(s)':>10}")
+    for depth in if_depths:
+        source = ("program deep\nvar integer x;\nbegin\n" + "if x < 1 then " * depth + "x := 1" + " fi" * depth + "\nend.\n")
+        tokens = Lexer(source).tokenize()
+        try:
+            start = time.perf_counter()
+            Parser(tokens).parse()
+            recursive = f"{time.perf_counter() - start:.3f}s"
+        except (RecursionError, SyntaxError) as e: # 递归过深时 Parser.parse 把 RecursionError 包装成 SyntaxError
+            recursive = "RecursionError" if isinstance(e, RecursionError) or "recursion" in str(e) else "SyntaxError"
+        start = time.perf_counter()
+        LL1Parser(tokens, table=table).parse()
+        print(f"{depth:>10} {recursive:>12} {time.perf_counter() - start:>10.3f}")
+
+
+def build_nested_type_ast(depth, assignment_count):
+    """
+    直接构造一个类型声明很深的程序的 AST (语法分析器还不支持 array / record 类型，见 ASTparser.type_name 中的 TODO)：
+    两条结构相同、名字不同的类型链 a0..a{depth} 和 b0..b{depth}，a0 = b0 = integer，
+    a{k} = record a{k-1} x; array [1..3] of a{k-1} y; integer z; end (b{k} 同理)；
+    变量 va: a{depth}、vb: b{depth}，主程序体是 assignment_count 条 va := vb / vb := va (类型相容，没有语义错误)。
+    """
+    from ASTparser import TreeNode
+
+    def node(node_type, value=None, *children):
+        tree_node = TreeNode(node_type, value)
+        for child in children: tree_node.add_child(child)
+        return tree_node
+
+    type_k = node("TypeK")
+    for chain in "ab":
+        type_k.add_child(node("DecK", f"{chain}0", node("IntegerK")))
+        for k in range(1, depth + 1):
+            element = f"{chain}{k - 1}"
+            record_k = node("RecordK", None,
+                            node("DecK", "x", node("IdK", element)),
+                            node("DecK", "y", node("ArrayK", None, node("ExpK", "Const 1"), node("ExpK", "Const 3"), node("IdK", element))),
+                            node("DecK", "z", node("IntegerK")))
+            type_k.add_child(node("DecK", f"{chain}{k}", record_k))
+    var_k = node("VarK", None, node("DecK", None, node("IdK", f"a{depth}"), node("IdK", "va")),
+                 node("DecK", None, node("IdK", f"b{depth}"), node("IdK", "vb")))
+    body = node("StmLK")
+    for i in range(assignment_count):
+        left, right = ("va", "vb") if i % 2 == 0 else ("vb", "va")
+        body.add_child(node("StmtK", "Assign", node("ExpK", f"IdV {left}"), node("ExpK", f"IdV {right}")))
+    return node("ProK", None, node("PheadK", "nested"), type_k, var_k, body)
+
+
+def bench_type_equality(depths=(2, 6, 10), assignment_count=2_000, repeat=3):
+    """
+    类型相容检查：TypeFactory 唯一化的类型 (比较规范实例是否相同) 与原来的做法 (每次声明新建类型对象、
+    别名每次访问都沿别名链查找、赋值时递归比较结构) 对比。程序见 build_nested_type_ast，记录类型嵌套 depth 层。
+    """
+    from analyzer import AccessKind, AliasIR, ArrayIR, SemanticAnalyzer, TypeFactory, TypeKind
+    from analysis_listing import LISTING_ERRORS
+
+    class ChainAliasIR(AliasIR): # 原来的别名：大小和基础类型每次访问都沿别名链查找
+        base_type = property(lambda self: self.actual_type.get_base_type(), lambda self, value: None)
+        size = property(lambda self: self.actual_type.size)
+
+    class StructuralTypes(TypeFactory): # 原来的做法：不唯一化
+        def alias(self, alias_name, actual_type): return ChainAliasIR(alias_name, actual_type)
+        def array(self, index_low, index_high, element_type): return ArrayIR(index_low, index_high, element_type)
+        def record(self, record_ir): return record_ir
+
+    class StructuralAnalyzer(SemanticAnalyzer):
+        type_factory_class = StructuralTypes
+        def _assign_statement(self, assign_node):
+            lhs_node, rhs_node = assign_node.children
+            lhs_type_ir = self._expr(lhs_node, AccessKind.ADDRESS); rhs_type_ir = self._expr(rhs_node, AccessKind.VALUE)
+            if lhs_type_ir.kind == TypeKind.UNKNOWN or rhs_type_ir.kind == TypeKind.UNKNOWN: return
+            if lhs_type_ir.get_base_type() != rhs_type_ir.get_base_type(): # 逐层比较结构
+                self._log_error("赋值类型不匹配", assign_node)
+
+    print(f"{'嵌套层数':>8} {'结构比较(ms)':>12} {'唯一化(ms)':>11} {'加速':>7} {'结构比较(us/次赋值)':>18} {'唯一化(us/次赋值)':>17} {'规范类型数':>10}")
+    for depth in depths:
+        ast = build_nested_type_ast(depth, assignment_count)
+        results = {}
+        for analyzer_class in (StructuralAnalyzer, SemanticAnalyzer):
+            best = None
+            for _ in range(repeat):
+                analyzer = analyzer_class(listing_level=LISTING_ERRORS)
+                start = time.perf_counter()
+                _, errors, _ = analyzer.analyze(ast)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            if errors: raise Exception(f"{analyzer_class.__name__} 报告了语义错误: {errors[:3]}")
+            results[analyzer_class] = (best, analyzer)
+        structural, (interned, analyzer) = results[StructuralAnalyzer][0], results[SemanticAnalyzer]
+        print(f"{depth:>8} {structural * 1000:>12.2f} {interned * 1000:>11.2f} {structural / interned:>6.1f}x "
+              f"{structural / assignment_count * 1e6:>18.1f} {interned / assignment_count * 1e6:>17.2f} {len(analyzer.types._types):>10}")
+
+
+def bench_symbol_table(depths=(1, 10, 100, 1_000), names_per_scope=10, lookups=20_000, repeat=3):
+    """
+    符号表查找：散列表 + 作用域链 (analyzer.SymbolTable) 与原来每层一个 dict、find 从最内层逐层向外查找的实现对比。
+    嵌套 depth 层作用域，每层声明 names_per_scope 个标识符，然后在最内层查找随机一层中的标识符 (原实现平均要探查约 depth/2 层)。
+    另列建立并逐层退出全部作用域的耗时，以及每个条目占用的内存 (__slots__ 条目与带 __dict__ 的条目)。
+    """
+    import random
+    from analyzer import SymbKind, SymbolTable, SymbTableEntry
+    from Lexer import SymbolInterner
+
+    class DictEntry: # 原来的条目：普通对象，带 __dict__
+        def __init__(self, name, kind, type_ir, level, offset=0):
+            self.name = name; self.kind = kind; self.type_ir = type_ir; self.level = level; self.offset = offset
+            self.proc_params_ir = None
+
+    class ScanSymbolTable(SymbolTable): # 原来的实现
+        def __init__(self, interner=None):
+            super().__init__(interner)
+            self.scopes = [{}]
+        def enter_scope(self): self.scopes.append({}); self.current_level += 1
+        def exit_scope(self):
+            if self.current_level > 0: self.scopes.pop(); self.current_level -= 1
+        def insert(self, name, kind, type_ir, offset=0, sym=None):
+            current_scope = self.scopes[-1]; key = self._key(name, sym)
+            if key in current_scope: return None
+            entry = DictEntry(name, kind, type_ir, self.current_level, offset); current_scope[key] = entry
+            return entry
+        def find(self, name, sym=None):
+            key = self._lookup_key(name, sym)
+            for level in range(self.current_level, -1, -1):
+                entry = self.scopes[level].get(key)
+                if entry is not None: return entry
+            return None
+
+    def build(table_class, interner, names):
+        table = table_class(interner)
+        for level, level_names in enumerate(names):
+            if level: table.enter_scope()
+            for name, sym in level_names: table.insert(name, SymbKind.VARIABLE, None, sym=sym)
+        return table
+
+    print(f"{'嵌套层数':>8} {'逐层查找(ns/次)':>15} {'散列表(ns/次)':>14} {'加速':>7} {'逐层建立+退出(ms)':>17} {'散列表建立+退出(ms)':>18}")
+    rng = random.Random(1)
+    for depth in depths:
+        interner = SymbolInterner()
+        names = [[(name, interner.intern(name)) for name in (f"s{level}_{i}" for i in range(names_per_scope))] for level in range(depth)]
+        queries = [rng.choice(rng.choice(names)) for _ in range(lookups)]
+        best = {}
+        for _ in range(repeat):
+            for table_class in (ScanSymbolTable, SymbolTable):
+                start = time.perf_counter()
+                table = build(table_class, interner, names)
+                built = time.perf_counter() - start
+                find = table.find
+                start = time.perf_counter()
+                for name, sym in queries: find(name, sym)
+                found = time.perf_counter() - start
+                start = time.perf_counter()
+                for _ in range(depth - 1): table.exit_scope()
+                built += time.perf_counter() - start
+                old_find, old_build = best.get(table_class, (found, built))
+                best[table_class] = (min(old_find, found), min(old_build, built))
+        scan, hashed = best[ScanSymbolTable], best[SymbolTable]
+        print(f"{depth:>8} {scan[0] / lookups * 1e9:>15.0f} {hashed[0] / lookups * 1e9:>14.0f} {scan[0] / hashed[0]:>6.1f}x "
+              f"{scan[1] * 1000:>17.2f} {hashed[1] * 1000:>18.2f}")
+
+    interner = SymbolInterner()
+    names = [[(name, interner.intern(name)) for name in (f"s{level}_{i}" for i in range(names_per_scope))] for level in range(10_000)]
+    count = 10_000 * names_per_scope
+    for label, entry_class, table_class in (("带 __dict__ 的条目", DictEntry, ScanSymbolTable), ("__slots__ 条目", SymbTableEntry, SymbolTable)):
+        entries, entry_bytes, _, _ = _measure_retained(lambda: [entry_class(f"s{i}", SymbKind.VARIABLE, None, 0, i) for i in range(count)])
+        del entries
+        table, table_bytes, _, _ = _measure_retained(lambda: build(table_class, interner, names))
+        del table
+        print(f"{label}: 每个条目 {entry_bytes / count:.0f} 字节 (含名字字符串)，连同符号表结构 {table_bytes / count:.0f} 字节")
+
+
+def bench_analysis_listing(sizes=((50, 200), (200, 1_000), (500, 2_000)), repeat=3):
+    """
+    语义分析日志 (analysis_listing.AnalysisListing) 的开销：N 个过程、M 个全局变量的程序，每个过程都有符号表快照，
+    渲染成文本共约 O(N*M) 行。分析时只记录事件，表中分别列出三种详细程度的分析耗时、事件数，以及需要时渲染全部文本的耗时。
+    """
+    from analysis_listing import LISTING_ERRORS, LISTING_FULL, LISTING_NORMAL
+    from analyzer import SemanticAnalyzer
+    from ASTparser import generate_ast_from_source
+    from Lexer import SymbolInterner
+    print(f"{'过程数':>6} {'全局变量':>8} {'详细程度':>8} {'分析(s)':>8} {'事件数':>8} {'渲染行数':>9} {'渲染(s)':>8}")
+    for procedure_count, var_count in sizes:
+        interner = SymbolInterner()
+        ast = generate_ast_from_source(generate_snl_program(procedure_count, procedure_count, var_count), interner=interner)
+        for label, level in (("FULL", LISTING_FULL), ("NORMAL", LISTING_NORMAL), ("ERRORS", LISTING_ERRORS)):
+            best = None
+            for _ in range(repeat):
+                analyzer = SemanticAnalyzer(interner=interner, listing_level=level)
+                start = time.perf_counter()
+                listing = analyzer.analyze(ast)[2]
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            start = time.perf_counter()
+            line_count = sum(1 for _ in listing)
+            render_elapsed = time.perf_counter() - start
+            print(f"{procedure_count:>6} {var_count:>8} {label:>8} {best:>8.3f} {len(listing.events):>8} {line_count:>9} {render_elapsed:>8.3f}")
+
+
+def bench_analyzer_dispatch(statement_counts=(10_000, 50_000), if_depths=(1_000, 10_000), repeat=3):
+    """
+    SemanticAnalyzer 遍历 AST 的分派开销：分派表 + 显式栈 (_traverse_node) 与逐节点拼方法名、getattr、递归调用的旧方式对比。
+    两者都把语句当作普通节点只遍历子节点，每个节点恰好分派一次，所以 ns/节点 就是分派本身的开销；另列完整语义分析的耗时。
+    最后是 LL(1) 分析得到的深层嵌套 if 语句在默认递归深度限制下能否完成语义分析。
+    """
+    from analyzer import SemanticAnalyzer
+    from arena_ast import AstArena
+    from ASTparser import generate_ast_from_source
+    from Lexer import SymbolInterner
+    from ll1_parser import generate_ll1_ast_from_source
+
+    class DispatchOnly(SemanticAnalyzer):
+        _handle_stmtk = SemanticAnalyzer._handle_unknown_node # 语句不做类型检查，只遍历子节点
+
+    class GetattrDispatch(DispatchOnly):
+        def _traverse_node(self, node):
+            # 旧的遍历方式：每个节点拼出 "_handle_xxx" 再 getattr，子节点递归处理
+            if node is None: return
+            handler = getattr(self, f"_handle_{node.node_type.lower()}", self._handle_unknown_node)
+            try:
+                for item in handler(node) or ():
+                    if type(item) is tuple: item[0](item[1])
+                    else: self._traverse_node(item)
+            except Exception as e:
+                self._log_error(f"处理节点 {node.node_type} 时发生内部错误: {e}", node)
+
+    print(f"{'语句数':>8} {'节点数':>9} {'getattr(ns/节点)':>16} {'分派表(ns/节点)':>15} {'加速':>6} {'完整语义分析(s)':>15}")
+    for statement_count in statement_counts:
+        interner = SymbolInterner()
+        ast = generate_ast_from_source(generate_snl_program(statement_count), interner=interner)
+        node_count = len(AstArena.from_tree(ast))
+        best = {}
+        for _ in range(repeat):
+            for analyzer_class in (GetattrDispatch, DispatchOnly, SemanticAnalyzer):
+                analyzer = analyzer_class(interner=interner)
+                start = time.perf_counter()
+                analyzer.analyze(ast)
+                elapsed = time.perf_counter() - start
+                best[analyzer_class] = min(best.get(analyzer_class, elapsed), elapsed)
+        old, new = best[GetattrDispatch] / node_count * 1e9, best[DispatchOnly] / node_count * 1e9
+        print(f"{statement_count:>8} {node_count:>9} {old:>16.0f} {new:>15.0f} {old / new:>5.1f}x {best[SemanticAnalyzer]:>15.3f}")
+
+    print(f"递归深度限制: {sys.getrecursionlimit()}")
+    print(f"{'if 嵌套层数':>10} {'getattr 递归':>14} {'分派表(s)':>10} {'错误数':>7}")
+    for depth in if_depths:
+        source = ("program deep\nvar integer x;\nbegin\n" + "if x < 1 then " * depth + "x := y" + " fi" * depth + "\nend.\n")
+        interner = SymbolInterner()
+        ast = generate_ll1_ast_from_source(source, interner=interner)
+        try:
+            errors = GetattrDispatch(interner=interner).analyze(ast)[1]
+            recursive = "RecursionError" if any("recursion" in error for error in errors) else "完成"
+        except RecursionError:
+            recursive = "RecursionError"
+        start = time.perf_counter()
+        errors = SemanticAnalyzer(interner=interner).analyze(ast)[1]
+        print(f"{depth:>10} {recursive:>14} {time.perf_counter() - start:>10.3f} {len(errors):>7}")
+
+
+def bench_ast_file(statement_counts=(10_000, 50_000, 200_000)):
+    """
+    保存的二进制 AST 文件 (ast_file.py) 与从源码重新分析的耗时对比：
+    mmap 打开文件只读文件头，另外给出打开后完整遍历一次 (format_ast_to_display_string) 的耗时，并检查输出与原 AST 相同。
+    """
+    import os
+    import tempfile
+    from ASTparser import format_ast_to_display_string, generate_ast_from_source
+    from ast_file import load_ast, save_ast
+    print(f"{'语句数':>8} {'源码(MB)':>9} {'AST文件(MB)':>11} {'重新分析(s)':>12} {'保存(s)':>8} "
+          f"{'打开(ms)':>9} {'打开+遍历(s)':>13} {'一致':>4}")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.ast")
+        for statement_count in statement_counts:
+            source = generate_snl_program(statement_count)
+            start = time.perf_counter()
+            ast = generate_ast_from_source(source)
+            parse_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            save_ast(ast, path, source=source)
+            save_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            mapped = load_ast(path)
+            root = mapped.view()
+            open_ms = (time.perf_counter() - start) * 1000
+            text = format_ast_to_display_string(root)
+            walk_seconds = time.perf_counter() - start
+            same = text == format_ast_to_display_string(ast)
+            del root
+            mapped.close()
+            print(f"{statement_count:>8} {len(source.encode('utf-8')) / 2**20:>9.1f} {os.path.getsize(path) / 2**20:>11.1f} "
+                  f"{parse_seconds:>12.3f} {save_seconds:>8.3f} {open_ms:>9.2f} {walk_seconds:>13.3f} {'是' if same else '否':>4}")
+
+
+def _lexer_corpus(statement_counts):
+    """基准语料：仓库中的示例程序 test1.txt / test2.txt，加上规模递增的合成程序 (内容固定，结果可重复)。"""
+    import os
+    corpus = []
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in ("test1.txt", "test2.txt"):
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                corpus.append((name, f.read()))
+    for statement_count in statement_counts:
+        corpus.append((f"合成 {statement_count} 句", generate_snl_program(statement_count)))
+    return corpus
+
+
+def bench_lexer_engines(statement_counts=(100, 1_000, 10_000, 50_000, 200_000), min_seconds=0.2):
+    """
+    所有词法分析引擎 (Lexer.SCAN_ENGINES) 在同一组语料上的对比：
+    吞吐量 (tokens/s)、tracemalloc 记录的峰值内存，以及吞吐量随输入规模变化的曲线；
+    并检查各引擎产生的 Token 序列 (类型、值、起止偏移) 与 regex 引擎完全相同。
+    每项重复运行到累计至少 min_seconds 秒，取最好的一次。
+    """
+    from Lexer import SCAN_ENGINES
+    engines = list(SCAN_ENGINES)
+    corpus = _lexer_corpus(statement_counts)
+    print(f"Python {sys.version.split()[0]}, 引擎: {', '.join(engines)}")
+    print(f"{'输入':>14} {'字节':>10} {'Token数':>9} {'引擎':>7} {'最佳耗时(s)':>12} {'tokens/s':>12} {'峰值内存(MB)':>13} {'一致':>4}")
+    rates = {engine: [] for engine in engines}
+    mismatches = []
+    for label, source in corpus:
+        reference = None
+        for engine in engines:
+            best, total, runs = None, 0.0, 0
+            while runs == 0 or total < min_seconds:
+                start = time.perf_counter()
+                tokens = Lexer(source, engine).tokenize()
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+                total += elapsed
+                runs += 1
+            _, _, peak, _ = _measure_retained(lambda: Lexer(source, engine).tokenize())
+            signature = [(t.type, t.value, t.start, t.end) for t in tokens]
+            if reference is None:
+                reference = signature
+            same = signature == reference
+            if not same:
+                mismatches.append((label, engine))
+            rates[engine].append(len(tokens) / best if best > 0 else 0.0)
+            print(f"{label:>14} {len(source):>10} {len(tokens):>9} {engine:>7} {best:>12.5f} "
+                  f"{_format_rate(len(tokens), best):>12} {peak / 2**20:>13.2f} {'是' if same else '否':>4}")
+
+    # 规模曲线：各引擎在每个输入上的吞吐量，相对 regex 引擎的倍数
+    print("\n吞吐量随输入规模的变化 (tokens/s，括号内为相对 regex 引擎的倍数)")
+    print(f"{'输入':>14} " + " ".join(f"{engine:>22}" for engine in engines))
+    for index, (label, _) in enumerate(corpus):
+        cells = []
+        for engine in engines:
+            rate, reference_rate = rates[engine][index], rates[engines[0]][index]
+            cells.append(f"{rate:>14,.0f} ({rate / reference_rate if reference_rate else 0:>4.2f}x)")
+        print(f"{label:>14} " + " ".join(f"{cell:>22}" for cell in cells))
+    if mismatches:
+        print("Token 序列不一致: " + ", ".join(f"{label}/{engine}" for label, engine in mismatches))
+        return 1
+    print("所有引擎的 Token 序列完全一致。")
+    return 0
+
+
+BENCHMARKS = {
+    "lexer": bench_lexer,
+    "token_memory": bench_token_memory,
+    "incremental_lexer": bench_incremental_lexer,
+    "dfa_lexer": bench_dfa_lexer,
+    "parallel_lexer": bench_parallel_lexer,
+    "lexer_engines": bench_lexer_engines,
+    "mmap_lexer": bench_mmap_lexer,
+    "expr_ast": bench_expr_ast,
+    "expr_stress": bench_expr_stress,
+    "arena_ast": bench_arena_ast,
+    "stream_parse": bench_stream_parse,
+    "stream_check": bench_stream_check,
+    "parser": bench_parser,
+    "parse_recovery": bench_parse_recovery,
+    "incremental_parser": bench_incremental_parser,
+    "ll1_parser": bench_ll1_parser,
+    "ast_file": bench_ast_file,
+    "analyzer_dispatch": bench_analyzer_dispatch,
+    "analysis_listing": bench_analysis_listing,
+    "symbol_table": bench_symbol_table,
+    "type_equality": bench_type_equality,
+}
+
+
+def main(argv):
+    names = argv or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"未知基准: {name} (可选: {', '.join(BENCHMARKS)})")
+            return 1
+    status = 0
+    for name in names:
+        print(f"\n=== {name} ===")
+        if BENCHMARKS[name](): # 返回非 0 表示检查失败 (如各引擎结果不一致)
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,9 +1,11 @@
 import tkinter as tk
 from tkinter import scrolledtext, font, messagebox, PanedWindow # PanedWindow用于可拖动调整的区域
-from ASTparser import generate_ast_from_source, format_ast_to_display_string # 新增的函数
+from ASTparser import generate_ast_from_source, format_ast_to_display_string, write_ast # 新增的函数
 from analyzer import perform_semantic_analysis_from_source
 
 from Lexer import Lexer # 从 Lexer.py 导入 Lexer 类
+from incremental_lexer import IncrementalLexer
+from incremental_parser import IncrementalParser
 
 class PlaceholderASTNode: # 用于演示
     def __init__(self, node_type, value=None, children=None):
@@ -18,23 +20,48 @@ def placeholder_format_symbol_table(table):
     return "\n".join([str(entry) for entry in table])
 # --- 占位符结束 ---
 
-def run_lexical_analysis(source_code):
-    """调用词法分析器并格式化Token序列。"""
+def run_lexical_analysis(source_code, incremental_lexer=None):
+    """调用词法分析器并格式化Token序列。传入 IncrementalLexer 时只重新扫描上次分析之后改动过的部分。"""
     try:
-        lexer_instance = Lexer(source_code)
-        tokens = lexer_instance.tokenize()
+        if incremental_lexer is not None:
+            incremental_lexer.update(source_code)
+            tokens = incremental_lexer.tokens
+        else:
+            lexer_instance = Lexer(source_code)
+            tokens = lexer_instance.tokenize()
         # 将Token列表转换为每行一个Token的字符串
         return "\n".join([str(token) for token in tokens])
     except Exception as e:
         # 返回格式化的错误信息
         return f"词法分析错误 (Lexical Error):\n{str(e)}"
 
-def run_syntax_analysis(source_code):
-    """调用词法和语法分析器，然后格式化AST。"""
+# 语法分析结果区最多显示的 AST 节点数，避免超大程序把文本控件撑满
+GUI_AST_MAX_NODES = 20000
+
+class TextWidgetSink:
+    """把 write_ast 写出的文本追加到 tkinter 文本控件末尾的适配器。"""
+    def __init__(self, text_widget):
+        self.text_widget = text_widget
+
+    def write(self, text):
+        self.text_widget.insert(tk.END, text)
+
+def run_syntax_analysis(source_code, sink=None, max_nodes=None, incremental_parser=None):
+    """
+    调用词法和语法分析器，然后格式化AST。
+    传入 sink 时AST文本由 write_ast 边遍历边写入 sink，成功时返回 None；出错时总是返回错误信息字符串。
+    传入 IncrementalParser 时只重新解析上次分析之后改动过的顶层区域 (过程声明、程序体等)。
+    """
     try:
         # 1. 调用 ASTparser.py 中的顶层函数来生成AST
         #    这个函数内部会处理词法分析和语法分析
-        ast_root_node = generate_ast_from_source(source_code)
+        if incremental_parser is not None:
+            ast_root_node = incremental_parser.update(source_code)
+        else:
+            ast_root_node = generate_ast_from_source(source_code)
+        if sink is not None:
+            write_ast(ast_root_node, sink, max_nodes=max_nodes)
+            return None
         
         # 2. 调用 ASTparser.py 中的格式化函数 (或TreeNode的__str__) 将AST转换为字符串
         #    如果 ast_root_node 为 None (虽然我们建议在出错时抛异常而不是返回None)，
@@ -109,6 +136,11 @@ class CompilerGUI:
         self.label_font = font.Font(family="Arial", size=10, weight="bold")
         self.button_font = font.Font(family="Arial", size=10)
 
+        # 保存上一次词法分析的结果，再次分析时只重新扫描编辑过的区域
+        self.incremental_lexer = IncrementalLexer("")
+        # 同样保存上一次语法分析的各个顶层子树，只重新解析编辑过的过程或程序体
+        self.incremental_parser = IncrementalParser("")
+
         # 使用PanedWindow来创建可拖动调整左右区域的布局
         self.main_pane = PanedWindow(master_window, orient=tk.HORIZONTAL, sashrelief=tk.RAISED, sashwidth=6)
         self.main_pane.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
@@ -175,14 +207,19 @@ class CompilerGUI:
     def trigger_lexical_analysis(self):
         source_code = self._get_source_code_from_input()
         if source_code is not None:
-            result_string = run_lexical_analysis(source_code)
+            result_string = run_lexical_analysis(source_code, self.incremental_lexer)
             self._display_output(result_string)
 
     def trigger_syntax_analysis(self):
         source_code = self._get_source_code_from_input()
         if source_code is not None:
-            result_string = run_syntax_analysis(source_code)
-            self._display_output(result_string)
+            self._display_output("")
+            self.analysis_output_text.config(state=tk.NORMAL)
+            error_string = run_syntax_analysis(source_code, TextWidgetSink(self.analysis_output_text), GUI_AST_MAX_NODES,
+                                               self.incremental_parser)
+            self.analysis_output_text.config(state=tk.DISABLED)
+            if error_string is not None:
+                self._display_output(error_string)
 
     def trigger_semantic_analysis(self):
         source_code = self._get_source_code_from_input()
@@ -0,0 +1,386 @@
+# dfa_lexer.py
+# 表驱动的 DFA 词法分析引擎。
+# 把 Lexer.py 中的 SKIP_SPECIFICATIONS 和 TOKEN_SPECIFICATIONS 编译成按字符类索引的 DFA 转移表：
+#   正则 -> Thompson NFA -> 子集构造 -> DFA
+# 生成的表以 JSON 保存在 __pycache__ 中，规则不变时后续进程直接加载。
+# 用法: Lexer(source, engine="dfa")，或 python dfa_lexer.py 重新生成并查看表的规模。
+
+import hashlib
+import json
+import os
+import sys
+
+from Lexer import KIND_ID, MAX_LOOKAHEAD, SKIP_SPECIFICATIONS, TOKEN_KINDS, TOKEN_SPECIFICATIONS, Token
+from table_cache import CACHE_DIRECTORY, load_cached_table
+
+# 表的格式或生成算法改变时加 1，使旧的缓存文件失效
+DFA_FORMAT_VERSION = 1
+
+# 非 ASCII 字符的代表：规则中的字符集合只显式列出 ASCII 字符，
+# 所以非 ASCII 字符是否属于某个集合只取决于它是不是空白 (\s)，两个代表就覆盖了全部情况。
+NON_ASCII_REPRESENTATIVES = ("　", "一")
+
+
+# --- 正则 -> NFA ---
+# 字符集合 (atom) 的表示:
+#   ("set", 是否取反, 字符串)   [...] 或单个字面字符
+#   ("space", False, "")        \s，与 str.isspace() 一致
+#   ("any", False, "")          .，除换行符之外的任意字符
+def _atom_contains(atom, char):
+    kind, negated, chars = atom
+    if kind == "set":
+        return (char in chars) != negated
+    if kind == "space":
+        return char.isspace()
+    return char != "\n"
+
+
+class _NFA:
+    """Thompson NFA：每个状态有若干 ε 转移和若干 (字符集合编号, 目标状态) 转移。"""
+    def __init__(self):
+        self.epsilon = []
+        self.edges = []
+        self.atoms = []       # 字符集合编号 -> atom
+        self._atom_ids = {}
+
+    def new_state(self):
+        self.epsilon.append([])
+        self.edges.append([])
+        return len(self.epsilon) - 1
+
+    def atom_id(self, atom):
+        if atom not in self._atom_ids:
+            self._atom_ids[atom] = len(self.atoms)
+            self.atoms.append(atom)
+        return self._atom_ids[atom]
+
+
+class _RegexParser:
+    """
+    只支持规则中用到的正则子集：字面字符、\\ 转义、\\s、.、[...] / [^...]、
+    ( ) 分组、| 择一以及 * + ? 重复。每个子表达式生成一个 (起始状态, 接受状态) 的 NFA 片段。
+    """
+    def __init__(self, pattern, nfa):
+        self.pattern = pattern
+        self.pos = 0
+        self.nfa = nfa
+
+    def parse(self):
+        fragment = self._alternation()
+        if self.pos != len(self.pattern):
+            self._error()
+        return fragment
+
+    def _error(self):
+        raise Exception(f"DFA 生成器不支持的正则语法: {self.pattern!r} 位置 {self.pos}")
+
+    def _peek(self):
+        return self.pattern[self.pos] if self.pos < len(self.pattern) else None
+
+    def _next(self):
+        if self.pos >= len(self.pattern):
+            self._error()
+        char = self.pattern[self.pos]
+        self.pos += 1
+        return char
+
+    def _alternation(self):
+        fragments = [self._concatenation()]
+        while self._peek() == "|":
+            self.pos += 1
+            fragments.append(self._concatenation())
+        if len(fragments) == 1:
+            return fragments[0]
+        nfa = self.nfa
+        start, accept = nfa.new_state(), nfa.new_state()
+        for fragment_start, fragment_accept in fragments:
+            nfa.epsilon[start].append(fragment_start)
+            nfa.epsilon[fragment_accept].append(accept)
+        return start, accept
+
+    def _concatenation(self):
+        fragment = None
+        while self._peek() is not None and self._peek() not in "|)":
+            following = self._repetition()
+            if fragment is None:
+                fragment = following
+            else:
+                self.nfa.epsilon[fragment[1]].append(following[0])
+                fragment = (fragment[0], following[1])
+        if fragment is None: # 空串
+            state = self.nfa.new_state()
+            fragment = (state, state)
+        return fragment
+
+    def _repetition(self):
+        fragment = self._atom()
+        while self._peek() is not None and self._peek() in "*+?":
+            operator = self._next()
+            nfa = self.nfa
+            inner_start, inner_accept = fragment
+            start, accept = nfa.new_state(), nfa.new_state()
+            nfa.epsilon[start].append(inner_start)
+            nfa.epsilon[inner_accept].append(accept)
+            if operator in "*+":
+                nfa.epsilon[inner_accept].append(inner_start)
+            if operator in "*?":
+                nfa.epsilon[start].append(accept)
+            fragment = (start, accept)
+        return fragment
+
+    def _atom(self):
+        char = self._next()
+        if char == "(":
+            if self.pattern.startswith("?:", self.pos):
+                self.pos += 2
+            fragment = self._alternation()
+            if self._next() != ")":
+                self._error()
+            return fragment
+        if char == "[":
+            atom = self._character_class()
+        elif char == "\\":
+            escaped = self._next()
+            if escaped == "s":
+                atom = ("space", False, "")
+            elif escaped.isalnum():
+                self._error() # \d \w 等未使用的转义
+            else:
+                atom = ("set", False, escaped)
+        elif char == ".":
+            atom = ("any", False, "")
+        elif char in "*+?|)":
+            self._error()
+        else:
+            atom = ("set", False, char)
+        nfa = self.nfa
+        start, accept = nfa.new_state(), nfa.new_state()
+        nfa.edges[start].append((nfa.atom_id(atom), accept))
+        return start, accept
+
+    def _character_class(self):
+        negated = self._peek() == "^"
+        if negated:
+            self.pos += 1
+        chars = []
+        first = True
+        while True:
+            char = self._next()
+            if char == "]" and not first:
+                break
+            first = False
+            if char == "\\":
+                char = self._next()
+            if self._peek() == "-" and self.pos + 1 < len(self.pattern) and self.pattern[self.pos + 1] != "]":
+                self.pos += 1
+                last = self._next()
+                if last == "\\":
+                    last = self._next()
+                chars.extend(chr(code) for code in range(ord(char), ord(last) + 1))
+            else:
+                chars.append(char)
+        return ("set", negated, "".join(sorted(set(chars))))
+
+
+# --- NFA -> DFA ---
+def _character_classes(atoms):
+    """
+    把字符划分成等价类：属于完全相同的一组字符集合的字符归为一类。
+    返回 (ASCII 码点 -> 类编号 的列表, {成员签名: 类编号})，签名是每个 atom 是否包含该字符的 "0"/"1" 串。
+    """
+    def signature(char):
+        return "".join("1" if _atom_contains(atom, char) else "0" for atom in atoms)
+
+    signature_classes = {}
+    explicit_non_ascii = sorted({char for _, _, chars in atoms for char in chars if ord(char) >= 128})
+    ascii_classes = []
+    for char in [chr(code) for code in range(128)] + explicit_non_ascii + list(NON_ASCII_REPRESENTATIVES):
+        class_id = signature_classes.setdefault(signature(char), len(signature_classes))
+        if ord(char) < 128:
+            ascii_classes.append(class_id)
+    return ascii_classes, signature_classes
+
+
+def build_dfa_table(skip_specifications=SKIP_SPECIFICATIONS, token_specifications=TOKEN_SPECIFICATIONS):
+    """
+    生成 DFA 转移表 (可直接写成 JSON 的 dict)。
+    规则编号: 先是 skip 规则，再是 token 规则；接受状态记录其中编号最小的规则，
+    扫描时取最长匹配，长度相同时编号小的规则优先——对这套规则与 master regex 的择一顺序结果相同。
+    """
+    rules = [(name, pattern) for name, pattern in skip_specifications]
+    rules += [(cat_or_lit, pattern) for cat_or_lit, pattern, *_ in token_specifications]
+    nfa = _NFA()
+    nfa_start = nfa.new_state()
+    accepting = {}
+    for rule_index, (_, pattern) in enumerate(rules):
+        fragment_start, fragment_accept = _RegexParser(pattern, nfa).parse()
+        nfa.epsilon[nfa_start].append(fragment_start)
+        accepting[fragment_accept] = rule_index
+
+    ascii_classes, signature_classes = _character_classes(nfa.atoms)
+    class_count = len(signature_classes)
+    # 每个 atom 包含哪些字符类
+    atom_classes = [{class_id for sig, class_id in signature_classes.items() if sig[atom_id] == "1"}
+                    for atom_id in range(len(nfa.atoms))]
+
+    def closure(states):
+        stack, result = list(states), set(states)
+        while stack:
+            for target in nfa.epsilon[stack.pop()]:
+                if target not in result:
+                    result.add(target)
+                    stack.append(target)
+        return frozenset(result)
+
+    start = closure([nfa_start])
+    dfa_ids = {start: 0}
+    worklist = [start]
+    transitions, accepts = [], []
+    while worklist:
+        states = worklist.pop(0)
+        row = [-1] * class_count
+        for class_id in range(class_count):
+            moved = {target for state in states for atom_id, target in nfa.edges[state] if class_id in atom_classes[atom_id]}
+            if not moved:
+                continue
+            target_states = closure(moved)
+            if target_states not in dfa_ids:
+                dfa_ids[target_states] = len(dfa_ids)
+                worklist.append(target_states)
+            row[class_id] = dfa_ids[target_states]
+        transitions.append(row)
+        accepts.append(min((accepting[state] for state in states if state in accepting), default=-1))
+
+    return {
+        "version": DFA_FORMAT_VERSION,
+        "rules": [name for name, _ in rules],
+        "skip_count": len(skip_specifications),
+        "atoms": [list(atom) for atom in nfa.atoms],
+        "ascii_classes": ascii_classes,
+        "signature_classes": signature_classes,
+        "transitions": transitions,
+        "accepts": accepts,
+    }
+
+
+# --- 表的缓存 ---
+def specification_key(skip_specifications=SKIP_SPECIFICATIONS, token_specifications=TOKEN_SPECIFICATIONS):
+    """规则内容的摘要，作为缓存文件名的一部分：规则或表格式改变后自动重新生成。"""
+    text = json.dumps([DFA_FORMAT_VERSION, [list(spec) for spec in skip_specifications],
+                       [[cat_or_lit, pattern] for cat_or_lit, pattern, *_ in token_specifications]])
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def cache_path(key):
+    return os.path.join(CACHE_DIRECTORY, f"snl_dfa_{key}.json")
+
+
+def load_table_data(skip_specifications=SKIP_SPECIFICATIONS, token_specifications=TOKEN_SPECIFICATIONS, rebuild=False):
+    """从缓存文件读取转移表，不存在 (或 rebuild=True) 时生成并写入缓存 (见 table_cache.load_cached_table)。"""
+    key = specification_key(skip_specifications, token_specifications)
+    return load_cached_table(cache_path(key), DFA_FORMAT_VERSION, key,
+                             lambda: build_dfa_table(skip_specifications, token_specifications), rebuild)
+
+
+class _ClassMap(dict):
+    """str.translate 使用的映射：码点 -> 字符类编号对应的字符。非 ASCII 码点第一次出现时才计算。"""
+    def __init__(self, ascii_classes, atoms, signature_classes):
+        super().__init__((code, chr(class_id)) for code, class_id in enumerate(ascii_classes))
+        self.atoms = atoms
+        self.signature_classes = signature_classes
+
+    def __missing__(self, code):
+        char = chr(code)
+        signature = "".join("1" if _atom_contains(atom, char) else "0" for atom in self.atoms)
+        value = self[code] = chr(self.signature_classes[signature])
+        return value
+
+
+class DFATable:
+    """加载后的 DFA：转移表、接受表以及把源码字符映射成字符类编号的方法。"""
+    def __init__(self, data, token_specifications=TOKEN_SPECIFICATIONS):
+        self.transitions = data["transitions"]
+        self.accepts = data["accepts"]
+        self.rules = data["rules"]
+        self.skip_count = data["skip_count"]
+        # 状态是否还有出边：没有出边的接受状态 (如刚闭合的注释) 在块末尾也不必等待更多输入
+        self.can_continue = [any(target >= 0 for target in row) for row in self.transitions]
+        atoms = [tuple(atom) for atom in data["atoms"]]
+        self.class_map = _ClassMap(data["ascii_classes"], atoms, data["signature_classes"])
+        # 纯 ASCII 源码走 bytes.translate 的快速路径
+        self.ascii_translation = bytes(data["ascii_classes"]) + bytes(128)
+        # 规则编号 -> (Token 类型/字面量, 值提取函数)；skip 规则为 None
+        self.actions = [None] * self.skip_count + [
+            (cat_or_lit, rest_ext[0] if rest_ext else None) for cat_or_lit, _, *rest_ext in token_specifications]
+
+    def classify(self, text):
+        """把文本逐字符换成字符类编号，返回 bytes。"""
+        if text.isascii():
+            return text.encode("ascii").translate(self.ascii_translation)
+        return text.translate(self.class_map).encode("latin-1")
+
+
+_default_table = None
+
+
+def default_table():
+    """按 Lexer.py 当前规则生成的 DFA，每个进程只加载一次。"""
+    global _default_table
+    if _default_table is None:
+        _default_table = DFATable(load_table_data())
+    return _default_table
+
+
+def dfa_scan(lexer, buffer, pos, end, base=0, final=True):
+    """
+    Lexer 的 "dfa" 扫描引擎，参数和返回值约定与 Lexer._scan 相同。
+    每个 Token 从初始状态出发逐字符查表，直到进入死状态，取最后一次经过的接受状态 (最长匹配)。
+    """
+    table = default_table()
+    transitions, accepts, actions, can_continue = table.transitions, table.accepts, table.actions, table.can_continue
+    skip_count = table.skip_count
+    interner = lexer.interner
+    keyword_count = interner.keyword_count
+    classes = table.classify(buffer[pos:end])
+    length = len(classes)
+    i = 0 # 相对 pos 的下标
+    while i < length:
+        state = 0
+        rule, rule_end = -1, i
+        j = i
+        while j < length:
+            state = transitions[state][classes[j]]
+            if state < 0:
+                break
+            j += 1
+            if accepts[state] >= 0:
+                rule, rule_end = accepts[state], j
+        if j == length and state >= 0 and can_continue[state] and not final:
+            return pos + i # 自动机在块末尾仍未停下：Token 可能在下一块中继续，等待更多输入
+        if rule < 0:
+            if not final and (buffer[pos + i] == "{" or length - i < MAX_LOOKAHEAD):
+                return pos + i
+            lexer._raise_no_match(buffer[pos + i], base + pos + i)
+        if rule >= skip_count:
+            token_type, value_extractor_fn = actions[rule]
+            matched_text = buffer[pos + i:pos + rule_end]
+            if token_type == "ID":
+                sym = interner.intern(matched_text)
+                kind = KIND_ID
+                if sym < keyword_count:
+                    token_type = "KEYWORD"
+                    kind = sym
+                yield Token(token_type, interner.names[sym], base + pos + i, base + pos + rule_end, sym, kind)
+            else:
+                yield Token(token_type, value_extractor_fn(matched_text) if value_extractor_fn else matched_text,
+                            base + pos + i, base + pos + rule_end, None, TOKEN_KINDS[token_type])
+        i = rule_end
+    lexer.pos = base + pos + i
+    return pos + i
+
+
+if __name__ == "__main__":
+    data = load_table_data(rebuild="--rebuild" in sys.argv[1:])
+    print(f"规则数: {len(data['rules'])}  字符类数: {len(data['signature_classes'])}  "
+          f"DFA 状态数: {len(data['transitions'])}")
+    print(f"缓存文件: {cache_path(data['key'])}")
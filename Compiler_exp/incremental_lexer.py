@@ -0,0 +1,417 @@
+# incremental_lexer.py
+# 增量词法分析：源码被编辑后，只重新扫描编辑位置附近的一小段，其余 Token 直接复用。
+
+from itertools import accumulate
+
+from Lexer import Lexer, LineIndex, SymbolInterner
+
+
+def _common_prefix_length(a, b):
+    """两个字符串公共前缀的长度 (先按块比较，再逐字符比较)。"""
+    limit = min(len(a), len(b))
+    length, step = 0, 4096
+    while length + step <= limit and a[length:length + step] == b[length:length + step]:
+        length += step
+    while length < limit and a[length] == b[length]:
+        length += 1
+    return length
+
+
+def edit_from_sources(old_source, new_source):
+    """
+    比较编辑前后的两份源码，返回等价的单个编辑 (start, end, replacement)：
+    把 old_source[start:end] 替换为 replacement 即得到 new_source。
+    """
+    prefix = _common_prefix_length(old_source, new_source)
+    max_suffix = min(len(old_source), len(new_source)) - prefix
+    suffix = _common_prefix_length(old_source[::-1][:max_suffix], new_source[::-1][:max_suffix])
+    return prefix, len(old_source) - suffix, new_source[prefix:len(new_source) - suffix]
+
+
+class _DeferredLineIndex:
+    """只在真正报告错误位置时才拼出完整源码并建立 LineIndex。"""
+    def __init__(self, build_source):
+        self._build_source = build_source
+        self._index = None
+
+    def describe(self, offset):
+        if self._index is None:
+            self._index = LineIndex(self._build_source())
+        return self._index.describe(offset)
+
+
+class _FenwickTree:
+    """树状数组：单点修改 values[i]、求前缀和、按前缀和定位都是 O(log n)。values 保存各项的当前值。"""
+    def __init__(self, values):
+        self.values = list(values)
+        n = len(self.values)
+        tree = [0] + self.values
+        for i in range(1, n + 1):
+            parent = i + (i & -i)
+            if parent <= n:
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def __len__(self):
+        return len(self.values)
+
+    def add(self, index, amount):
+        self.values[index] += amount
+        tree = self._tree
+        i, n = index + 1, len(tree)
+        while i < n:
+            tree[i] += amount
+            i += i & -i
+
+    def prefix(self, stop):
+        """values[:stop] 之和。"""
+        tree = self._tree
+        total = 0
+        while stop > 0:
+            total += tree[stop]
+            stop &= stop - 1
+        return total
+
+    def search(self, target):
+        """values[:i + 1] 之和大于 target 的最小 i (要求各项非负)；没有时返回 len(values)。"""
+        tree = self._tree
+        n = len(tree) - 1
+        pos, step = 0, 1 << n.bit_length()
+        while step:
+            following = pos + step
+            if following <= n and tree[following] <= target:
+                pos = following
+                target -= tree[following]
+            step >>= 1
+        return pos
+
+
+class IncrementalLexer:
+    """
+    维护一份源码及其 Token 序列 (带 start/end 偏移，最后是 EOF)。
+    apply_edit() 从编辑位置之前最近的安全重启点开始重新扫描，
+    一旦新产生的 Token 与旧序列在编辑区之后的同一位置对齐，就停止扫描并复用后面的旧 Token。
+
+    源码按 PIECE_SIZE 分片保存，Token 按 BLOCK_SIZE 分块保存，都不整体复制。
+    第 i 块 Token 的偏移还需加上增量 _block_shifts.prefix(i + 1) (编辑之后的所有块共用一个增量标记，
+    平移它们只需修改一项)；各块的 Token 数和各分片的长度也放在树状数组中，按下标或偏移定位都是 O(log 块数)。
+    因此一次编辑的开销只与重新扫描的 Token 数、一两块的大小和 log(块数) 有关，与文件大小无关；
+    块或分片被拆分、合并时 (累计插入或删除约 BLOCK_SIZE 个 Token / PIECE_SIZE 个字符才发生一次) 才用 O(块数) 重建树状数组。
+    source / tokens 属性在需要时才拼接出完整的字符串和列表。
+
+    tokens / iter_tokens 交出的是内部保存的 Token 对象本身 (不复制)：之后的编辑会直接修改其中一部分 Token 的 start / end。
+    所以交出的 Token 只在下一次 apply_edit / update 之前有效，需要跨编辑保留偏移的调用者应当自己记下 (start, end)。
+    """
+    PIECE_SIZE = 32 * 1024  # 源码分片的目标长度
+    BLOCK_SIZE = 2048       # Token 分块的目标长度
+    WINDOW_SIZE = 1024      # 重新扫描时每次从旧源码中取出的字符数
+
+    def __init__(self, source="", verify=False):
+        piece_size, block_size = self.PIECE_SIZE, self.BLOCK_SIZE
+        self._set_pieces([source[i:i + piece_size] for i in range(0, len(source), piece_size)])
+        self._length = len(source)
+        # 所有版本的源码共用一个驻留表，复用的 Token 与新扫描的 Token 的符号 id 保持一致
+        self.interner = SymbolInterner()
+        tokens = Lexer(source, interner=self.interner).tokenize()
+        blocks = [tokens[i:i + block_size] for i in range(0, len(tokens), block_size)]
+        self._set_blocks(blocks, [0] * len(blocks))
+        self._source_cache = source
+        self._tokens_cache = tokens
+        self._line_index = None
+        # 正确性检查模式：每次编辑后与完整重新扫描的结果比较
+        self.verify = verify
+
+    # --- 完整视图 ---
+    @property
+    def source(self):
+        if self._source_cache is None:
+            self._source_cache = "".join(self._pieces)
+        return self._source_cache
+
+    @property
+    def tokens(self):
+        """完整的 Token 列表 (所有偏移均已补齐)；列表和其中的 Token 只在下一次编辑之前有效 (见类的说明)。"""
+        if self._tokens_cache is None:
+            blocks = self._blocks
+            for block, delta in zip(blocks, self._block_deltas()):
+                if delta:
+                    for token in block:
+                        token.start += delta
+                        token.end += delta
+            self._block_shifts = _FenwickTree([0] * len(blocks))
+            self._tokens_cache = [token for block in blocks for token in block]
+        return self._tokens_cache
+
+    def __len__(self):
+        return self._block_sizes.prefix(len(self._blocks))
+
+    def iter_tokens(self, first=0):
+        """
+        从下标 first 开始依次产生 Token (偏移已补齐)；只归一化实际访问到的块，不拼接完整列表。
+        产生的 Token 与 tokens 一样只在下一次编辑之前有效，迭代过程中也不能编辑。
+        """
+        blocks = self._blocks
+        block_index = self._block_sizes.search(first)
+        first -= self._block_sizes.prefix(block_index)
+        while block_index < len(blocks):
+            self._normalize_block(block_index, 0)
+            block = blocks[block_index]
+            for index in range(first, len(block)):
+                yield block[index]
+            block_index, first = block_index + 1, 0
+
+    @property
+    def line_index(self):
+        """当前源码的行首表，供语法分析器报告 行:列；只在真正查询时才拼出源码。"""
+        if self._line_index is None:
+            self._line_index = _DeferredLineIndex(lambda: self.source)
+        return self._line_index
+
+    # --- 内部辅助 ---
+    def _set_pieces(self, pieces):
+        """替换全部源码分片并重建分片长度的树状数组。"""
+        self._pieces = pieces
+        self._piece_lengths = _FenwickTree(map(len, pieces))
+
+    def _set_blocks(self, blocks, deltas):
+        """替换全部 Token 块 (deltas[i] 是第 i 块的增量) 并重建块大小和增量标记的树状数组。"""
+        self._blocks = blocks
+        self._block_sizes = _FenwickTree(map(len, blocks))
+        # 增量标记：第 i 块的增量是前 i + 1 个标记之和
+        self._block_shifts = _FenwickTree(delta - previous for previous, delta in zip([0] + deltas, deltas))
+
+    def _block_delta(self, index):
+        return self._block_shifts.prefix(index + 1)
+
+    def _block_deltas(self):
+        """各块的增量 (完整列表，只在整体重建时使用)。"""
+        return list(accumulate(self._block_shifts.values))
+
+    def _text(self, start, stop):
+        """旧源码中 [start, stop) 的文本，只拼接涉及的分片。"""
+        stop = min(stop, self._length)
+        if start >= stop:
+            return ""
+        pieces, lengths = self._pieces, self._piece_lengths
+        index = lengths.search(start)
+        piece_start = lengths.prefix(index)
+        parts = []
+        while index < len(pieces) and piece_start < stop:
+            piece = pieces[index]
+            parts.append(piece[max(start - piece_start, 0):stop - piece_start])
+            piece_start += len(piece)
+            index += 1
+        return "".join(parts)
+
+    def _normalize_block(self, index, target_delta):
+        """把第 index 块的增量改为 target_delta，差值直接加到块内每个 Token 上。"""
+        difference = self._block_delta(index) - target_delta
+        if difference:
+            for token in self._blocks[index]:
+                token.start += difference
+                token.end += difference
+            shifts = self._block_shifts
+            shifts.add(index, -difference)
+            if index + 1 < len(shifts):
+                shifts.add(index + 1, difference)
+
+    def _first_token_ending_at_or_after(self, offset):
+        """返回第一个结束位置 >= offset 的 Token 的 (块号, 块内下标)；EOF 保证它存在。"""
+        blocks, block_delta = self._blocks, self._block_delta
+        low, high = 0, len(blocks) - 1
+        while low < high:
+            middle = (low + high) // 2
+            if blocks[middle][-1].end + block_delta(middle) < offset:
+                low = middle + 1
+            else:
+                high = middle
+        block, delta = blocks[low], block_delta(low)
+        first, last = 0, len(block) - 1
+        while first < last:
+            middle = (first + last) // 2
+            if block[middle].end + delta < offset:
+                first = middle + 1
+            else:
+                last = middle
+        return low, first
+
+    def _iter_old_starts(self, block_index, index):
+        """从 (块号, 块内下标) 开始依次产生旧 Token 的 (块号, 块内下标, 实际起始偏移)。"""
+        blocks = self._blocks
+        while block_index < len(blocks):
+            block, delta = blocks[block_index], self._block_delta(block_index)
+            for i in range(index, len(block)):
+                yield block_index, i, block[i].start + delta
+            block_index, index = block_index + 1, 0
+
+    # --- 编辑 ---
+    def update(self, new_source):
+        """把源码整体替换为 new_source：先求出等价的单个编辑，再增量处理。"""
+        return self.apply_edit(*edit_from_sources(self.source, new_source))
+
+    def apply_edit(self, start, end, replacement):
+        """
+        把 source[start:end] 替换为 replacement，并增量更新 Token 序列。
+        返回 (first, old_stop, new_stop)：旧序列中下标 [first, old_stop) 的 Token
+        被替换成了新序列中下标 [first, new_stop) 的 Token，其余 Token 都是复用的。
+        编辑后的源码有词法错误时抛出与 Lexer 相同的异常，并且保持编辑前的状态不变。
+        """
+        length = self._length
+        if not 0 <= start <= end <= length:
+            raise ValueError(f"无效的编辑区间 [{start}, {end})，源码长度为 {length}")
+        delta = len(replacement) - (end - start)
+        blocks = self._blocks
+
+        # 1. 安全重启点：结束位置严格在编辑起点之前的最后一个 Token 之后。
+        #    这样的 Token 连同决定它在哪里结束的那个字符都未被编辑，扫描器在它之后处于初始状态。
+        first_block, first_index = self._first_token_ending_at_or_after(start)
+        if first_index > 0:
+            restart_pos = blocks[first_block][first_index - 1].end + self._block_delta(first_block)
+        elif first_block > 0:
+            restart_pos = blocks[first_block - 1][-1].end + self._block_delta(first_block - 1)
+        else:
+            restart_pos = 0
+
+        # 2. 从重启点开始扫描新源码，直到某个 Token 在编辑区之后与旧 Token 的位置对齐：
+        #    对齐点之后的源码与旧源码完全相同，扫描器又处于初始状态，所以后续 Token 也必然相同。
+        #    新源码不整体拼接，而是按 WINDOW_SIZE 从旧分片中逐段取出。
+        lexer = Lexer(None, interner=self.interner)
+        lexer.line_index = _DeferredLineIndex(
+            lambda: self._text(0, start) + replacement + self._text(end, length))
+        buffer, buffer_base = self._text(restart_pos, start) + replacement, restart_pos
+        next_old, pos = end, 0
+        edit_new_end = start + len(replacement)
+        old_starts = self._iter_old_starts(first_block, first_index)
+        old_block, old_index, old_start = next(old_starts)
+        new_tokens = []
+        sync = None
+        while sync is None:
+            more = self._text(next_old, next_old + self.WINDOW_SIZE)
+            next_old += len(more)
+            buffer, buffer_base, pos = buffer[pos:] + more, buffer_base + pos, 0
+            final = next_old >= length
+            scan = lexer._scan(buffer, 0, len(buffer), buffer_base, final)
+            while True:
+                try:
+                    token = next(scan)
+                except StopIteration as stop:
+                    pos = stop.value
+                    break
+                if token.start >= edit_new_end:
+                    old_pos = token.start - delta
+                    while old_start < old_pos:
+                        old_block, old_index, old_start = next(old_starts)
+                    if old_start == old_pos:
+                        sync = (old_block, old_index)
+                        break
+                new_tokens.append(token)
+            if sync is None and final:
+                sync = (len(blocks) - 1, len(blocks[-1]) - 1) # 扫描到末尾仍未对齐时，在 EOF 处对齐
+        sync_block, sync_index = sync
+
+        sizes = self._block_sizes
+        blocks_before = sizes.prefix(first_block)
+        result = (blocks_before + first_index,
+                  sizes.prefix(sync_block) + sync_index,
+                  blocks_before + first_index + len(new_tokens))
+
+        # 3. 拼接 Token 块：编辑之前的部分 (head)、新 Token 和对齐点之后的旧 Token (tail) 合成一块，
+        #    按 head 原来的增量或 tail 平移后的增量中的一个归一化，只需逐个平移较短的一边 (至多一两块中的 Token)；
+        #    后面所有块的增量加上 delta 只需修改一个增量标记。
+        head = blocks[first_block][:first_index]
+        tail = blocks[sync_block][sync_index:]
+        head_delta = self._block_delta(first_block)
+        tail_delta = self._block_delta(sync_block) + delta
+        merged_delta, shifted, shift = ((head_delta, tail, tail_delta - head_delta) if len(head) >= len(tail)
+                                        else (tail_delta, head, head_delta - tail_delta))
+        if shift:
+            for token in shifted:
+                token.start += shift
+                token.end += shift
+        for token in new_tokens:
+            token.start -= merged_delta
+            token.end -= merged_delta
+        merged = head + new_tokens + tail
+        block_size = self.BLOCK_SIZE
+        if sync_block == first_block and (len(blocks) == 1 or block_size // 4 <= len(merged) <= 2 * block_size):
+            sizes.add(first_block, len(merged) - len(blocks[first_block]))
+            blocks[first_block] = merged
+            shifts = self._block_shifts
+            if merged_delta != head_delta:
+                shifts.add(first_block, merged_delta - head_delta)
+            if first_block + 1 < len(blocks) and delta != merged_delta - head_delta:
+                shifts.add(first_block + 1, delta - (merged_delta - head_delta))
+        else: # 块的划分改变：整体重建 (很少发生)
+            deltas = self._block_deltas()
+            for index in range(sync_block + 1, len(blocks)):
+                deltas[index] += delta
+            blocks[first_block:sync_block + 1] = [merged]
+            deltas[first_block:sync_block + 1] = [merged_delta]
+            self._rebalance_blocks(blocks, deltas, first_block, first_block + 1)
+            self._set_blocks(blocks, deltas)
+
+        # 4. 修改源码分片
+        self._replace_text(start, end, replacement)
+        self._length = length + delta
+        self._source_cache = self._tokens_cache = self._line_index = None
+
+        if self.verify:
+            self._verify_against_full_relex()
+        return result
+
+    def _rebalance_blocks(self, blocks, deltas, first, stop):
+        """拆分过大的块、合并过小 (或为空) 的块，使块的大小保持在 BLOCK_SIZE 附近 (只修改 blocks 和 deltas 两个列表)。"""
+        block_size = self.BLOCK_SIZE
+        index = max(first - 1, 0)
+        stop = min(stop + 1, len(blocks))
+        while index < stop and index < len(blocks):
+            block = blocks[index]
+            if len(block) > 2 * block_size:
+                blocks[index:index + 1] = [block[:block_size], block[block_size:]]
+                deltas[index:index + 1] = [deltas[index], deltas[index]]
+                stop += 1
+            elif len(block) < block_size // 4 and len(blocks) > 1:
+                # 并入相邻的块：把较小一块的 Token 按相邻块的增量归一化
+                neighbor = index + 1 if index + 1 < len(blocks) else index - 1
+                difference = deltas[index] - deltas[neighbor]
+                if difference:
+                    for token in block:
+                        token.start += difference
+                        token.end += difference
+                low, high = min(index, neighbor), max(index, neighbor)
+                blocks[low:high + 1] = [blocks[low] + blocks[high]]
+                deltas[low:high + 1] = [deltas[neighbor]]
+                stop -= 1
+                index = low
+                continue
+            index += 1
+
+    def _replace_text(self, start, end, replacement):
+        """在分片中把旧源码 [start, end) 替换为 replacement。"""
+        pieces, lengths = self._pieces, self._piece_lengths
+        piece_size = self.PIECE_SIZE
+        if pieces:
+            first = min(lengths.search(start), len(pieces) - 1)
+            last = min(lengths.search(end), len(pieces) - 1)
+            first_start, last_start = lengths.prefix(first), lengths.prefix(last)
+            merged = pieces[first][:start - first_start] + replacement + pieces[last][end - last_start:]
+            if first == last and piece_size // 2 <= len(merged) <= 2 * piece_size:
+                pieces[first] = merged # 分片的划分不变，只修改这一片的长度
+                lengths.add(first, len(merged) - lengths.values[first])
+                return
+            while len(merged) < piece_size // 2 and last + 1 < len(pieces):
+                last += 1 # 太短的分片与后一片合并，避免分片越来越碎
+                merged += pieces[last]
+        else:
+            first, last, merged = 0, -1, replacement
+        pieces[first:last + 1] = [merged[i:i + piece_size] for i in range(0, len(merged), piece_size)]
+        self._set_pieces(pieces)
+
+    def _verify_against_full_relex(self):
+        expected = [(t.type, t.value, t.start, t.end) for t in Lexer(self.source).tokenize()]
+        actual = [(t.type, t.value, t.start, t.end) for t in self.tokens]
+        if actual != expected:
+            mismatch = next((i for i, (a, e) in enumerate(zip(actual, expected)) if a != e), min(len(actual), len(expected)))
+            raise Exception(f"增量词法分析结果与完整重新扫描不一致: 第 {mismatch} 个 Token "
+                            f"增量为 {actual[mismatch] if mismatch < len(actual) else None}, "
+                            f"完整扫描为 {expected[mismatch] if mismatch < len(expected) else None}")
@@ -0,0 +1,311 @@
+# incremental_parser.py
+# 增量语法分析：把程序的 Token 序列切成顶层区域 (程序头、type 声明、var 声明、每个过程声明、程序体)，
+# 每个区域单独解析成一棵子树并缓存。源码被编辑后只重新解析 Token 发生变化的区域，其余子树直接复用，
+# 所以修改一个过程体时，其他过程和主程序体都不会重新解析。
+# 用法: python incremental_parser.py 源文件   (在文件中部模拟逐键输入，并与完整解析的结果比较)
+
+import sys
+import time
+
+from ASTparser import K_EOF, KW_BEGIN, KW_END, KW_PROCEDURE, KW_TYPE, KW_VAR, Parser, TreeNode, generate_ast_from_source
+from incremental_lexer import IncrementalLexer
+
+# 区域在这些关键字之前结束 (不包括该关键字)；过程声明在它的第一个 end 处结束 (包括 end)，程序体一直到 EOF
+HEAD_END_KINDS = frozenset((KW_TYPE, KW_VAR, KW_PROCEDURE, KW_BEGIN))
+TYPE_END_KINDS = frozenset((KW_VAR, KW_PROCEDURE, KW_BEGIN))
+VAR_END_KINDS = frozenset((KW_PROCEDURE, KW_BEGIN))
+# 顶层区域的合法顺序：程序头、至多一个 type 声明、至多一个 var 声明、任意多个过程声明、程序体
+REGION_ORDER = {"PheadK": 0, "TypeK": 1, "VarK": 2, "ProcDecK": 3, "StmLK": 4}
+# 被替换下来的子树最多保留这么多棵 (撤销编辑、把过程改回原样时可以直接取回)
+SUBTREE_CACHE_SIZE = 64
+
+
+class _Region:
+    """
+    一个顶层区域：Token 下标 [lo, hi)，node 是它解析出的子树 (还没有解析时为 None)。
+    scan_end 是确定区域边界时看过的最后一个 Token 的下标 (区域之后的那个关键字，或过程末尾的 end)。
+    key 由区域内 Token 的类型、值和相对偏移算出，key 相同的区域可以共用同一棵子树。
+    base 是区域第一个 Token 现在的偏移，node_base 是解析出 node 时它的偏移，两者之差就是子树中偏移要加的量。
+    tokens 只在本次 update() 中、区域等待解析时保存它的 Token。
+    """
+    __slots__ = ("kind", "lo", "hi", "scan_end", "key", "base", "node", "node_base", "tokens")
+
+    def __init__(self, kind, lo, hi, scan_end, key, base):
+        self.kind = kind
+        self.lo = lo
+        self.hi = hi
+        self.scan_end = scan_end
+        self.key = key
+        self.base = base
+        self.node = None
+        self.node_base = None
+        self.tokens = None
+
+
+class _FullParseNeeded(Exception):
+    """只看区域本身无法确定结果 (区域的 Token 不够用、区域的顺序不合法等)，需要完整解析一次。"""
+
+
+class ShiftedNode(TreeNode):
+    """
+    子树的只读视图：字段与原节点相同，只是起始偏移都加上 delta (children 每次读取时生成子节点的视图)。
+    复用的子树在源码中的位置变了时用它包装，不必逐个修改子树中的节点。
+    """
+    __slots__ = ("node", "delta")
+
+    def __init__(self, node, delta):
+        self.node = node
+        self.delta = delta
+
+    @property
+    def node_type(self): return self.node.node_type
+
+    @property
+    def value(self): return self.node.value
+
+    @property
+    def start(self):
+        start = self.node.start
+        return None if start is None else start + self.delta
+
+    @property
+    def sym(self): return self.node.sym
+
+    @property
+    def children(self):
+        delta = self.delta
+        return [ShiftedNode(child, delta) for child in self.node.children]
+
+    def add_child(self, child):
+        raise Exception("ShiftedNode 是只读的，不能添加子节点")
+
+
+class IncrementalParser:
+    """
+    update(new_source) 返回新源码的 AST，结果 (包括出错时的异常类型和错误信息) 与 generate_ast_from_source 相同。
+    内部的 IncrementalLexer 给出这次编辑替换了哪些 Token：编辑之前的区域原样保留，编辑之后的区域只平移偏移，
+    只有编辑涉及的区域重新切分；新区域先按 key 在缓存中查找被替换下来的子树，找不到才重新解析。
+    子树解析出来之后不再修改：位置变了的子树在 AST 中用 ShiftedNode 包装，所以每次返回的 AST 都一直有效。
+    """
+    def __init__(self, source=""):
+        self.lexer = IncrementalLexer(source)
+        self.interner = self.lexer.interner # 语义分析要使用同一个驻留表
+        self.root = None
+        self._source_length = len(source)
+        self._regions = None # 还没有切分过
+        self._cache = {}     # key -> (子树, 它的 node_base)，按放入的先后排列
+
+    def update(self, new_source):
+        """把源码替换为 new_source 并增量地重新解析，返回 AST 根节点；有错误时抛出与完整解析相同的异常。"""
+        try:
+            first, old_stop, new_stop = self.lexer.update(new_source)
+        except Exception:
+            # 词法错误：由完整解析按源码顺序报告最先出现的错误 (可能是词法错误之前的语法错误)
+            generate_ast_from_source(new_source, interner=self.interner)
+            raise
+        shift = len(new_source) - self._source_length
+        self._source_length = len(new_source)
+        if self._regions is None:
+            self._regions = self._segment([], 0, [], 0)
+        else:
+            self._regions = self._resegment(first, old_stop, new_stop, shift)
+        try:
+            self.root = self._assemble()
+        except _FullParseNeeded:
+            self.root = generate_ast_from_source(new_source, interner=self.interner)
+        return self.root
+
+    # --- 区域切分 ---
+    def _resegment(self, first, old_stop, new_stop, shift):
+        """旧 Token 下标 [first, old_stop) 被替换成了新下标 [first, new_stop)：只重新切分受影响的区域。"""
+        regions = self._regions
+        # 确定边界时看过的 Token 都在编辑之前的区域原样保留
+        keep = 0
+        while keep < len(regions) and regions[keep].scan_end < first and regions[keep].node is not None:
+            keep += 1
+        # 从 old_stop 开始的区域 Token 不变，只是下标和偏移要平移 (程序头总是第一个区域，不参与)
+        tail = len(regions)
+        while tail > max(keep, 1) and regions[tail - 1].lo >= old_stop and regions[tail - 1].node is not None:
+            tail -= 1
+        index_shift = new_stop - old_stop
+        for region in regions[tail:]:
+            region.lo += index_shift
+            region.hi += index_shift
+            region.scan_end += index_shift
+        start = regions[keep - 1].hi if keep else 0 # 区域首尾相接
+        self._evict(regions[keep:tail])
+        return self._segment(regions[:keep], start, regions[tail:], shift)
+
+    def _segment(self, regions, start, suffix, shift):
+        """
+        从 Token 下标 start 开始依次切出区域追加到 regions 之后，直到新区域的起点与 suffix 中某个旧区域的起点重合，
+        然后沿用 suffix 中剩下的区域 (它们的边界只取决于自己范围内没有改动的 Token)，它们的偏移都加上 shift。
+        """
+        tokens = self.lexer.iter_tokens(start)
+        token = next(tokens)
+        index, k = start, 0
+        while True:
+            while k < len(suffix) and suffix[k].lo < index: # 被新区域跨过的旧区域
+                self._evict(suffix[k:k + 1])
+                k += 1
+            if regions and k < len(suffix) and suffix[k].lo == index:
+                if shift:
+                    for region in suffix[k:]:
+                        region.base += shift
+                regions.extend(suffix[k:])
+                return regions
+            region, token = self._scan_region(index, token, tokens, not regions)
+            regions.append(region)
+            index = region.hi
+            if region.kind == "StmLK": # 程序体一直到 EOF
+                self._evict(suffix[k:])
+                return regions
+
+    def _scan_region(self, index, token, tokens, head):
+        """
+        token 是下标 index 处的 Token，tokens 产生它之后的 Token。切出从这里开始的一个区域 (head 为真时是程序头，可能为空)，
+        返回 (区域, 区域之后的第一个 Token)。
+        """
+        stop_kinds, through_end = frozenset(), False
+        if head:
+            kind, stop_kinds = "PheadK", HEAD_END_KINDS
+        elif token.kind == KW_TYPE:
+            kind, stop_kinds = "TypeK", TYPE_END_KINDS
+        elif token.kind == KW_VAR:
+            kind, stop_kinds = "VarK", VAR_END_KINDS
+        elif token.kind == KW_PROCEDURE:
+            kind, through_end = "ProcDecK", True
+        else:
+            kind = "StmLK"
+        region_tokens = []
+        append = region_tokens.append
+        scan_end = None
+        while token.kind != K_EOF and token.kind not in stop_kinds:
+            append(token)
+            token = next(tokens)
+            if through_end and region_tokens[-1].kind == KW_END:
+                scan_end = index + len(region_tokens) - 1
+                break
+        if kind == "StmLK":
+            append(token) # 程序体包括 EOF
+            token = None
+            scan_end = index + len(region_tokens) - 1
+        hi = index + len(region_tokens)
+        if scan_end is None:
+            scan_end = hi # 区域之后的那个关键字 (或 EOF)
+        base = region_tokens[0].start if region_tokens else None
+        key = (kind, len(region_tokens), hash(tuple((t.type, t.value, t.start - base) for t in region_tokens)))
+        region = _Region(kind, index, hi, scan_end, key, base)
+        cached = self._cache.pop(key, None)
+        if cached is not None:
+            region.node, region.node_base = cached
+        else:
+            region.tokens = region_tokens
+        return region, token
+
+    def _evict(self, regions):
+        """把不再使用的区域的子树放进缓存，超出 SUBTREE_CACHE_SIZE 时丢掉最早放入的。"""
+        cache = self._cache
+        for region in regions:
+            if region.node is not None:
+                cache.pop(region.key, None)
+                cache[region.key] = (region.node, region.node_base)
+        while len(cache) > SUBTREE_CACHE_SIZE:
+            del cache[next(iter(cache))]
+
+    # --- 解析 ---
+    def _assemble(self):
+        """解析还没有子树的区域，按顺序把各区域的子树接到新的 ProK 节点下。"""
+        regions = self._regions
+        order_end = len(regions) # 从这个区域开始顺序不合法，完整解析会在这里走上另一条路
+        previous = 0
+        for i in range(1, len(regions)):
+            rank = REGION_ORDER[regions[i].kind]
+            if rank < previous or (rank == previous and regions[i].kind != "ProcDecK"):
+                order_end = i
+                break
+            previous = rank
+        try:
+            for i, region in enumerate(regions):
+                if region.node is None:
+                    if i >= order_end:
+                        raise _FullParseNeeded()
+                    region.node = self._parse_region(region)
+                    region.node_base = region.base
+        finally:
+            for region in regions:
+                region.tokens = None
+        if order_end < len(regions):
+            raise _FullParseNeeded()
+        root = TreeNode("ProK", start=regions[0].base)
+        for region in regions:
+            delta = region.base - region.node_base
+            root.add_child(ShiftedNode(region.node, delta) if delta else region.node)
+        return root
+
+    def _parse_region(self, region):
+        """
+        用区域自己的 Token 调用对应的产生式。前面的区域都已正确解析，所以在区域内部的 Token 上出错时，
+        完整解析也会在同一个 Token 上以同样的信息出错；用完区域的 Token 仍未结束时交给完整解析。
+        """
+        parser = Parser(region.tokens, line_index=self.lexer.line_index)
+        parser.pos = region.lo # 错误信息中的词法单元索引与完整解析一致
+        try:
+            if region.kind == "PheadK":
+                node = parser.program_head()
+            elif region.kind == "TypeK":
+                node = parser.type_declarations()
+            elif region.kind == "VarK":
+                node = parser.var_declarations()
+            elif region.kind == "ProcDecK":
+                node = parser.proc_declaration()
+            else:
+                node = parser.program_body()
+                parser.match(".")
+        except Exception as e:
+            if parser.pos >= region.hi:
+                raise _FullParseNeeded() from e
+            # 与 Parser.parse 对意外错误的包装相同
+            raise SyntaxError(f"语法分析意外中断: {e} {parser._error_context()}") from e
+        if region.kind == "StmLK":
+            if parser.current_token.type != "EOF":
+                raise SyntaxError(f"语法错误: 输入未完全解析，在 '{parser.current_token}' 处停止。")
+        elif parser.pos != region.hi:
+            raise _FullParseNeeded()
+        return node
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("用法: python incremental_parser.py 源文件")
+        return
+    try:
+        with open(sys.argv[1], encoding="utf-8") as f:
+            source = f.read()
+        parser = IncrementalParser()
+        start = time.perf_counter()
+        parser.update(source)
+        print(f"首次解析: {(time.perf_counter() - start) * 1000:.2f} ms, 顶层区域数: {len(parser._regions)}")
+        # 在中间某个区域的第一条语句末尾逐个字符输入 "+1"，每一步都与完整解析比较
+        position = source.index(";", len(source) // 2)
+        for step, char in enumerate("+1" * 5):
+            source = source[:position] + char + source[position:]
+            position += 1
+            start = time.perf_counter()
+            try:
+                ast = str(parser.update(source))
+                error = None
+            except Exception as e:
+                ast, error = None, f"{type(e).__name__}: {e}"
+            elapsed = (time.perf_counter() - start) * 1000
+            try:
+                expected, expected_error = str(generate_ast_from_source(source)), None
+            except Exception as e:
+                expected, expected_error = None, f"{type(e).__name__}: {e}"
+            print(f"第 {step + 1} 次编辑: {elapsed:.2f} ms, 与完整解析{'一致' if (ast, error) == (expected, expected_error) else '不一致'}")
+    except Exception as e:
+        print(f"错误: {e}")
+
+
+if __name__ == "__main__":
+    main()
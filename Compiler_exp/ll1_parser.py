@@ -0,0 +1,437 @@
+# ll1_parser.py
+# 表驱动的 LL(1) 语法分析引擎 (书中的 LL(1) 分析方法)。
+# SNL_GRAMMAR 描述 ASTparser.Parser 目前支持的 SNL 子集，产生式中嵌入语义动作 (#名字)；
+# 生成器求出 FIRST / FOLLOW / predict 集合，得到按 [非终极符][终极符] 索引的稠密分析表，
+# 以 JSON 保存在 __pycache__ 中，文法不变时后续进程直接加载。
+# LL1Parser 用显式的符号栈和语义栈驱动分析，不使用递归，生成与 Parser 完全相同的 TreeNode。
+# 用法: python ll1_parser.py [--rebuild] [源文件]
+
+import hashlib
+import json
+import os
+import sys
+
+from ASTparser import Parser
+from Lexer import KEYWORDS, KIND_NAMES, Lexer
+from table_cache import CACHE_DIRECTORY, load_cached_table
+
+# 表的格式或生成算法改变时加 1，使旧的缓存文件失效
+LL1_FORMAT_VERSION = 1
+
+# 文法：每行 "左部 -> 候选式 | 候选式 ..."，以 "|" 开头的行是上一个左部的更多候选式。
+# 出现在左部的名字是非终极符；关键字、Token 类型 (ID、INTC、"+"、":=" 等) 是终极符；ε 表示空串；
+# #名字 是语义动作，分析到它时调用 LL1Parser._action_名字，在语义栈上建立和连接 AST 节点。
+# 语义动作中的 "当前 Token" 指向前看的 Token，"刚匹配的 Token" 指最近一次匹配的终极符。
+SNL_GRAMMAR = r"""
+Program        -> #program ProgramHead #attach DeclarePart ProgramBody #attach .
+ProgramHead    -> program ID #head
+DeclarePart    -> TypeDec VarDec ProcDecPart
+TypeDec        -> ε | type #type_section TypeDecMore #attach
+TypeDecList    -> ID #type_dec = TypeName #attach ; #attach TypeDecMore
+TypeDecMore    -> ε | TypeDecList
+TypeName       -> integer #integer | char #char | ID #id_node
+VarDec         -> ε | var #var_section VarDecMore #attach
+VarDecList     -> TypeName #var_dec VarIdList ; #attach VarDecMore
+VarIdList      -> ID #id_node #attach VarIdMore
+VarIdMore      -> ε | , VarIdList
+VarDecMore     -> ε | VarDecList
+ProcDecPart    -> ε | ProcDec #attach ProcDecPart
+ProcDec        -> procedure ID #procedure ( ParamList ) ; TypeDec VarDec ProgramBody #attach
+ParamList      -> ε | #param_list ParamDecList #attach
+ParamDecList   -> Param #attach ParamMore
+Param          -> #value_param TypeName #attach FormList
+               |  var #var_param TypeName #attach FormList
+FormList       -> ID #id_node #attach FidMore
+FidMore        -> ε | , FormList
+ParamMore      -> ε | ; ParamTail
+ParamTail      -> ε | ParamDecList
+ProgramBody    -> begin #body StmList end
+StmList        -> ε | Stm #attach StmMore
+StmMore        -> ε | ; StmList
+Stm            -> ConditionalStm | InputStm | OutputStm | ID #token AssCall
+AssCall        -> #call ( #arg_list ArgList ) #attach_args
+               |  #assign VariMore #attach := Exp #attach
+ArgList        -> ε | Exp #attach ExpMore
+ExpMore        -> ε | , Exp #attach ExpMore
+ConditionalStm -> if #if Exp #attach then #stm_list StmList #attach ElsePart fi
+ElsePart       -> #stm_list #attach | else #stm_list StmList #attach
+InputStm       -> read #read ( ID #id_exp #attach )
+OutputStm      -> write #write ( Exp #attach )
+Exp            -> SimpleExp OtherRelE
+OtherRelE      -> ε | CmpOp SimpleExp #binary
+CmpOp          -> < #token | = #token
+SimpleExp      -> Term OtherTerm
+OtherTerm      -> ε | AddOp Term #binary OtherTerm
+AddOp          -> + #token | - #token
+Term           -> Factor OtherFactor
+OtherFactor    -> ε | MultOp Factor #binary OtherFactor
+MultOp         -> * #token | / #token
+Factor         -> ( Exp ) | INTC #const | Variable
+Variable       -> ID #id_exp VariMore
+VariMore       -> ε | [ Exp ] #array_access
+"""
+
+EPSILON = "ε"
+END_MARKER = "EOF"      # 输入结束，开始符号的 FOLLOW 集合中只有它
+OTHER_TERMINAL = "其他"  # 文法中没有出现的 Token (如 while、array 等关键字)，表中没有任何产生式
+
+
+# --- 文法 -> LL(1) 分析表 ---
+def parse_grammar(text):
+    """把文法文本解析成 (开始符号, [(左部, [右部符号...]), ...])。"""
+    productions, left = [], None
+    for line_number, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line:
+            continue
+        if "->" in line:
+            left, right = (part.strip() for part in line.split("->", 1))
+        elif line.startswith("|") and left is not None:
+            right = line[1:]
+        else:
+            raise Exception(f"文法第 {line_number} 行格式错误: {line}")
+        for alternative in right.split("|"):
+            symbols = alternative.split()
+            if not symbols:
+                raise Exception(f"文法第 {line_number} 行有空的候选式 (空串请写 {EPSILON})")
+            productions.append((left, [] if symbols == [EPSILON] else symbols))
+    return productions[0][0], productions
+
+
+def build_ll1_table(grammar=SNL_GRAMMAR):
+    """
+    求出各非终极符的 FIRST、FOLLOW 集合和各产生式的 predict 集合，生成稠密分析表。
+    表中 table[A][a] 是非终极符 A 遇到终极符 a 时使用的产生式编号，-1 表示出错。
+    有两个产生式的 predict 集合相交 (文法不是 LL(1) 的) 时抛出异常。
+    """
+    start, productions = parse_grammar(grammar)
+    nonterminals = list(dict.fromkeys(left for left, _ in productions))
+    nonterminal_set = set(nonterminals)
+    terminals = [END_MARKER]
+    for _, right in productions:
+        for symbol in right:
+            if not symbol.startswith("#") and symbol not in nonterminal_set and symbol not in terminals:
+                terminals.append(symbol)
+    terminals.append(OTHER_TERMINAL)
+
+    # FIRST 集合 (不含语义动作)；nullable 记录能推出空串的非终极符
+    first = {name: set() for name in nonterminals}
+    nullable = set()
+
+    def first_of(symbols):
+        """符号串的 FIRST 集合，以及它能否推出空串。"""
+        result = set()
+        for symbol in symbols:
+            if symbol.startswith("#"):
+                continue
+            if symbol not in nonterminal_set:
+                result.add(symbol)
+                return result, False
+            result |= first[symbol]
+            if symbol not in nullable:
+                return result, False
+        return result, True
+
+    changed = True
+    while changed:
+        changed = False
+        for left, right in productions:
+            symbols, empty = first_of(right)
+            if not symbols <= first[left]:
+                first[left] |= symbols
+                changed = True
+            if empty and left not in nullable:
+                nullable.add(left)
+                changed = True
+
+    # FOLLOW 集合
+    follow = {name: set() for name in nonterminals}
+    follow[start].add(END_MARKER)
+    changed = True
+    while changed:
+        changed = False
+        for left, right in productions:
+            for index, symbol in enumerate(right):
+                if symbol not in nonterminal_set:
+                    continue
+                symbols, empty = first_of(right[index + 1:])
+                if empty:
+                    symbols = symbols | follow[left]
+                if not symbols <= follow[symbol]:
+                    follow[symbol] |= symbols
+                    changed = True
+
+    # predict 集合 -> 分析表
+    terminal_ids = {name: index for index, name in enumerate(terminals)}
+    nonterminal_ids = {name: index for index, name in enumerate(nonterminals)}
+    table = [[-1] * len(terminals) for _ in nonterminals]
+    for number, (left, right) in enumerate(productions):
+        symbols, empty = first_of(right)
+        if empty:
+            symbols = symbols | follow[left]
+        row = table[nonterminal_ids[left]]
+        for terminal in symbols:
+            previous = row[terminal_ids[terminal]]
+            if previous >= 0:
+                raise Exception(f"文法不是 LL(1) 的: {left} 遇到 {terminal} 时可以用产生式 {previous} 或 {number}")
+            row[terminal_ids[terminal]] = number
+
+    # 右部符号编码：终极符 0..T-1，非终极符 T..T+N-1，语义动作 T+N 起
+    actions = list(dict.fromkeys(symbol[1:] for _, right in productions for symbol in right if symbol.startswith("#")))
+    action_ids = {name: index for index, name in enumerate(actions)}
+
+    def encode(symbol):
+        if symbol.startswith("#"):
+            return len(terminals) + len(nonterminals) + action_ids[symbol[1:]]
+        if symbol in nonterminal_set:
+            return len(terminals) + nonterminal_ids[symbol]
+        return terminal_ids[symbol]
+
+    return {
+        "version": LL1_FORMAT_VERSION,
+        "start": nonterminal_ids[start],
+        "terminals": terminals,
+        "nonterminals": nonterminals,
+        "actions": actions,
+        "productions": [[nonterminal_ids[left], [encode(symbol) for symbol in right]] for left, right in productions],
+        "first": {name: sorted(first[name]) for name in nonterminals},
+        "follow": {name: sorted(follow[name]) for name in nonterminals},
+        "nullable": sorted(nullable),
+        "table": table,
+    }
+
+
+# --- 表的缓存 ---
+def grammar_key(grammar=SNL_GRAMMAR):
+    """文法内容的摘要，作为缓存文件名的一部分：文法或表格式改变后自动重新生成。"""
+    text = json.dumps([LL1_FORMAT_VERSION, grammar])
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def cache_path(key):
+    return os.path.join(CACHE_DIRECTORY, f"snl_ll1_{key}.json")
+
+
+def load_table_data(grammar=SNL_GRAMMAR, rebuild=False):
+    """从缓存文件读取分析表，不存在 (或 rebuild=True) 时生成并写入缓存 (见 table_cache.load_cached_table)。"""
+    key = grammar_key(grammar)
+    return load_cached_table(cache_path(key), LL1_FORMAT_VERSION, key, lambda: build_ll1_table(grammar), rebuild)
+
+
+class LL1Table:
+    """加载后的分析表：每个产生式右部按逆序预先排好 (直接压栈)，以及从 Token 到终极符编号的映射。"""
+    def __init__(self, data):
+        self.terminals = data["terminals"]
+        self.nonterminals = data["nonterminals"]
+        self.actions = data["actions"]
+        self.table = data["table"]
+        self.start = len(self.terminals) + data["start"]
+        self.pushes = [list(reversed(right)) for _, right in data["productions"]]
+        self.nonterminal_base = len(self.terminals)
+        self.action_base = len(self.terminals) + len(self.nonterminals)
+        self.other = self.terminals.index(OTHER_TERMINAL)
+        # Token 种类 -> 终极符编号 (文法中没有出现的种类都是 OTHER_TERMINAL)
+        terminal_ids = {name: index for index, name in enumerate(self.terminals)}
+        self.kind_terminals = [terminal_ids.get(name, self.other) for name in KIND_NAMES]
+        # 匹配终极符失败时交给 Parser.match 报告错误所用的 (类型, 值)
+        self.match_arguments = [("KEYWORD", name) if name in KEYWORDS else (name, None) for name in self.terminals]
+
+    def terminal_of(self, token):
+        return self.kind_terminals[token.kind]
+
+
+_default_table = None
+
+
+def default_table():
+    """按 SNL_GRAMMAR 生成的分析表，每个进程只加载一次。"""
+    global _default_table
+    if _default_table is None:
+        _default_table = LL1Table(load_table_data())
+    return _default_table
+
+
+# --- LL(1) 驱动程序 ---
+class LL1Parser(Parser):
+    """
+    与 Parser 接收相同的输入、生成相同的 AST，但 program() 由分析表驱动：
+    符号栈中放终极符、非终极符和语义动作，语义栈中放正在构造的节点和 Token，嵌套深度只受内存限制。
+    终极符不匹配时的错误信息与 Parser.match 相同；分析表中没有产生式时报告当前位置期待哪些终极符，
+    出错位置与递归下降的其他错误一样由 Parser._error_context 给出 (格式相同)。
+    parse() 沿用 Parser.parse (包括末尾的 EOF 检查和错误包装)；不支持错误恢复模式。
+    """
+    def __init__(self, tokens, line_index=None, table=None):
+        super().__init__(tokens, line_index)
+        self.table = table if table is not None else default_table()
+        self.values = []     # 语义栈
+        self.matched = None  # 刚匹配的 Token
+        self._actions = [getattr(self, f"_action_{name}") for name in self.table.actions]
+
+    def program(self):
+        table = self.table
+        rows, pushes, actions = table.table, table.pushes, self._actions
+        nonterminal_base, action_base = table.nonterminal_base, table.action_base
+        kind_terminals = table.kind_terminals
+        stack = [table.start]
+        pop, extend = stack.pop, stack.extend
+        lookahead = kind_terminals[self.current_token.kind]
+        while stack:
+            symbol = pop()
+            if symbol < nonterminal_base: # 终极符
+                self.matched = self.current_token
+                if symbol != lookahead:
+                    self.match(*table.match_arguments[symbol]) # 抛出与递归下降相同的错误
+                else:
+                    self.advance()
+                lookahead = kind_terminals[self.current_token.kind]
+            elif symbol < action_base: # 非终极符：按分析表展开
+                production = rows[symbol - nonterminal_base][lookahead]
+                if production < 0:
+                    self._unexpected(symbol - nonterminal_base)
+                extend(pushes[production])
+            else:
+                actions[symbol - action_base]()
+        self.root = self.values.pop()
+        return self.root
+
+    def _unexpected(self, nonterminal):
+        # 不自带位置：与递归下降的 "Invalid start of statement" 等错误一样，由 Parser.parse 包装时加上 _error_context()
+        table = self.table
+        expected = [table.terminals[t] for t, production in enumerate(table.table[nonterminal]) if production >= 0]
+        token = self.current_token
+        raise Exception(f"语法错误: {table.nonterminals[nonterminal]} 不能以 {token.type} ({token.value}) 开始，"
+                        f"期待 {' '.join(expected)} 之一")
+
+    # --- 语义动作 ---
+    def _action_attach(self):
+        child = self.values.pop()
+        self.attach(self.values[-1], child)
+
+    def _action_token(self):
+        self.values.append(self.matched)
+
+    def _action_program(self):
+        self.values.append(self.build_node("ProK", start=self.current_token.start))
+
+    def _action_head(self):
+        token = self.matched
+        self.values.append(self.build_node("PheadK", value=token.value, start=token.start, sym=token.sym))
+
+    def _action_type_section(self):
+        self.values.append(self.build_node("TypeK", start=self.matched.start))
+
+    def _action_var_section(self):
+        self.values.append(self.build_node("VarK", start=self.matched.start))
+
+    def _action_type_dec(self):
+        token = self.matched
+        self.values.append(self.build_node("DecK", value=token.value, start=token.start, sym=token.sym))
+
+    def _action_integer(self):
+        self.values.append(self.build_node("IntegerK", start=self.matched.start))
+
+    def _action_char(self):
+        self.values.append(self.build_node("CharK", start=self.matched.start))
+
+    def _action_id_node(self):
+        token = self.matched
+        self.values.append(self.build_node("IdK", value=token.value, start=token.start, sym=token.sym))
+
+    def _action_var_dec(self):
+        type_node = self.values.pop()
+        dec_node = self.build_node("DecK", start=self.node_start(type_node))
+        self.attach(dec_node, type_node)
+        self.values.append(dec_node)
+
+    def _action_procedure(self):
+        token = self.matched
+        self.values.append(self.build_node("ProcDecK", value=token.value, start=token.start, sym=token.sym))
+
+    def _action_param_list(self):
+        self.values.append(self.build_node("ParamListK", start=self.current_token.start))
+
+    def _action_value_param(self):
+        self.values.append(self.build_node("DecK", value="value param", start=self.current_token.start))
+
+    def _action_var_param(self):
+        self.values.append(self.build_node("DecK", value="var param", start=self.matched.start))
+
+    def _action_body(self):
+        self.values.append(self.build_node("StmLK", start=self.matched.start))
+
+    def _action_stm_list(self):
+        self.values.append(self.build_node("StmLK", start=self.current_token.start))
+
+    def _action_if(self):
+        self.values.append(self.build_node("StmtK", value="If", start=self.matched.start))
+
+    def _action_read(self):
+        self.values.append(self.build_node("StmtK", value="Read", start=self.matched.start))
+
+    def _action_write(self):
+        self.values.append(self.build_node("StmtK", value="Write", start=self.matched.start))
+
+    def _action_call(self):
+        token = self.values.pop()
+        call_node = self.build_node("StmtK", value="Call", start=token.start)
+        self.attach(call_node, self.build_node("ProcIdK", value=token.value, start=token.start, sym=token.sym))
+        self.values.append(call_node)
+
+    def _action_arg_list(self):
+        self.values.append(self.build_node("ArgListK", start=self.matched.start))
+
+    def _action_attach_args(self):
+        arg_list_node = self.values.pop()
+        if self.has_children(arg_list_node): # 没有实参时不加 ArgListK，与 Parser.stm 相同
+            self.attach(self.values[-1], arg_list_node)
+
+    def _action_assign(self):
+        token = self.values.pop()
+        self.values.append(self.build_node("StmtK", value="Assign", start=token.start))
+        self.values.append(self.build_id(token.value, start=token.start, sym=token.sym))
+
+    def _action_binary(self):
+        values = self.values
+        right_node = values.pop()
+        op_token = values.pop()
+        values[-1] = self.build_op(op_token.value, values[-1], right_node, start=op_token.start)
+
+    def _action_const(self):
+        self.values.append(self.build_const(int(self.matched.value), start=self.matched.start))
+
+    def _action_id_exp(self):
+        token = self.matched
+        self.values.append(self.build_id(token.value, start=token.start, sym=token.sym))
+
+    def _action_array_access(self):
+        index_node = self.values.pop()
+        array_node = self.values.pop()
+        self.values.append(self.build_array_access(array_node, index_node, start=self.node_start(array_node)))
+
+
+def generate_ll1_ast_from_source(source_code, interner=None):
+    """与 ASTparser.generate_ast_from_source 相同，但由 LL(1) 分析表驱动。"""
+    if isinstance(source_code, str):
+        lexer = Lexer(source_code, interner=interner)
+    else:
+        lexer = Lexer.from_stream(source_code, interner=interner)
+    return LL1Parser(lexer.iter_tokens(), line_index=lexer.line_index).parse()
+
+
+def main():
+    arguments = [argument for argument in sys.argv[1:] if argument != "--rebuild"]
+    data = load_table_data(rebuild="--rebuild" in sys.argv[1:])
+    filled = sum(production >= 0 for row in data["table"] for production in row)
+    print(f"产生式数: {len(data['productions'])}  非终极符数: {len(data['nonterminals'])}  "
+          f"终极符数: {len(data['terminals'])}  语义动作数: {len(data['actions'])}  分析表非空项: {filled}")
+    print(f"缓存文件: {cache_path(data['key'])}")
+    if arguments:
+        try:
+            with open(arguments[0], encoding="utf-8") as f:
+                print(generate_ll1_ast_from_source(f))
+        except Exception as e:
+            print(f"错误: {e}")
+
+
+if __name__ == "__main__":
+    main()
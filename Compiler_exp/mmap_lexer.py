@@ -0,0 +1,171 @@
+# mmap_lexer.py
+# 零拷贝的文件词法分析：用 mmap 映射源文件，直接以 bytes 模式的正则在映射区上扫描，
+# 不把源码读成 Python str。Token 只记录类型编码和字节偏移，值在访问时才从映射区解码。
+# 用法: python mmap_lexer.py 源文件
+
+import mmap
+import re
+import sys
+import time
+from bisect import bisect_right
+
+from Lexer import (CODE_EOF, CODE_KEYWORD, KEYWORD_LIST, SKIP_GROUPS, SKIP_SPECIFICATIONS, TOKEN_SPECIFICATIONS,
+                   TOKEN_TYPE_CODES, Lexer, LineIndex, TokenBuffer)
+
+# str 模式下 \s 匹配的全部字符 (即 str.isspace() 为真的字符)。直接列出，不在导入时遍历全部 110 万个码位 (约 80 ms)；
+# tests/test_lexer_engines.py 检查它与当前 Python 的 str.isspace() 一致
+WHITESPACE_CHARS = ("\t\n\x0b\x0c\r\x1c\x1d\x1e\x1f \x85\xa0\u1680\u2000\u2001\u2002\u2003\u2004\u2005\u2006\u2007"
+                    "\u2008\u2009\u200a\u2028\u2029\u202f\u205f\u3000")
+# 转成 UTF-8 字节序列的择一式
+_UTF8_WHITESPACE = "|".join(re.escape(char.encode("utf-8")).decode("latin-1") for char in WHITESPACE_CHARS)
+# str 模式下 . 匹配的一个字符 (换行符除外)，按 UTF-8 编码规则写成字节模式
+_UTF8_CHAR_EXCEPT_NEWLINE = r"[\x00-\x09\x0b-\x7f]|[\xc2-\xdf][\x80-\xbf]|[\xe0-\xef][\x80-\xbf]{2}|[\xf0-\xf4][\x80-\xbf]{3}"
+
+
+def _bytes_pattern(pattern_str):
+    """把规则中的 str 正则改写成匹配 UTF-8 字节的 bytes 正则：\\s 和 . 要按多字节字符展开。"""
+    parts, index, in_class = [], 0, False
+    while index < len(pattern_str):
+        char = pattern_str[index]
+        if char == "\\":
+            escaped = pattern_str[index:index + 2]
+            parts.append(f"(?:{_UTF8_WHITESPACE})" if escaped == r"\s" and not in_class else escaped)
+            index += 2
+            continue
+        if char == "[":
+            in_class = True
+        elif char == "]":
+            in_class = False
+        elif char == "." and not in_class:
+            char = f"(?:{_UTF8_CHAR_EXCEPT_NEWLINE})"
+        parts.append(char)
+        index += 1
+    return "".join(parts).encode("latin-1")
+
+
+def build_bytes_master_regex(token_specifications=TOKEN_SPECIFICATIONS):
+    """
+    与 Lexer.build_master_regex 相同的规则和顺序，但编译成 bytes 模式。
+    另外在 ID 之前加入关键字分支 KW，扫描时只看分组名就能区分关键字，不必取出匹配的字节。
+    返回 (编译后的正则, {分组名: 类型编码})。
+    """
+    parts = [f"(?P<{name}>{_bytes_pattern(pattern_str).decode('latin-1')})" for name, pattern_str in SKIP_SPECIFICATIONS]
+    group_codes = {}
+    for index, (cat_or_lit, pattern_str, *_) in enumerate(token_specifications):
+        if cat_or_lit == "ID":
+            keywords = "|".join(sorted(KEYWORD_LIST, key=len, reverse=True))
+            parts.append(f"(?P<KW>(?:{keywords})(?![a-zA-Z0-9]))")
+            group_codes["KW"] = CODE_KEYWORD
+        group_name = f"T{index}"
+        parts.append(f"(?P<{group_name}>{_bytes_pattern(pattern_str).decode('latin-1')})")
+        group_codes[group_name] = TOKEN_TYPE_CODES[cat_or_lit]
+    return re.compile("|".join(parts).encode("latin-1")), group_codes
+
+
+BYTES_MASTER_REGEX, BYTES_GROUP_CODES = build_bytes_master_regex()
+
+
+class ByteLineIndex(LineIndex):
+    """按字节偏移建立的行首表；列号换算成字符数，与 str 模式下的 行:列 相同。"""
+    def __init__(self, data):
+        super().__init__()
+        self.data = data
+        self._built = False
+
+    def line_col(self, offset):
+        if not self._built:
+            self._built = True
+            find, append = self.data.find, self.line_starts.append
+            newline = find(b"\n")
+            while newline >= 0:
+                append(newline + 1)
+                newline = find(b"\n", newline + 1)
+        line = bisect_right(self.line_starts, offset)
+        line_start = self.line_starts[line - 1]
+        return line, len(self.data[line_start:offset].decode("utf-8", "replace")) + 1
+
+
+class BytesTokenBuffer(TokenBuffer):
+    """
+    source 是 bytes 或 mmap 对象，starts/ends 是字节偏移。
+    Token 的值在访问时才从 source 中切出并按 UTF-8 解码。
+    """
+    def value_at(self, index):
+        value = super().value_at(index)
+        return value.decode("utf-8") if isinstance(value, (bytes, bytearray)) else value
+
+    def close(self):
+        """关闭映射的文件 (之后不能再访问 Token 的值)。"""
+        if isinstance(self.source, mmap.mmap):
+            self.source.close()
+
+
+def tokenize_bytes(data, interner=None):
+    """
+    扫描 bytes / mmap 对象中的 UTF-8 源码，返回 BytesTokenBuffer (偏移为字节偏移)。
+    Token 序列与 Lexer(data.decode()).tokenize_to_buffer() 相同；
+    词法错误的信息也相同 (位置换算成字符偏移和 行:列)。
+    """
+    buffer = BytesTokenBuffer(data, interner)
+    kinds, starts, ends = buffer.kinds.append, buffer.starts.append, buffer.ends.append
+    match = BYTES_MASTER_REGEX.match
+    group_codes = BYTES_GROUP_CODES
+    pos, end = 0, len(data)
+    while pos < end:
+        m = match(data, pos, end)
+        if m is None:
+            _raise_bytes_no_match(data, pos)
+        group_name = m.lastgroup
+        token_end = m.end()
+        if group_name not in SKIP_GROUPS:
+            kinds(group_codes[group_name]); starts(pos); ends(token_end)
+        pos = token_end
+    buffer.append(CODE_EOF, end, end)
+    return buffer
+
+
+def _raise_bytes_no_match(data, offset):
+    """出错时才解码 offset 之前的内容，按字符偏移抛出与 str 模式完全相同的词法错误。"""
+    prefix = data[:offset].decode("utf-8", "replace")
+    char = data[offset:offset + 4].decode("utf-8", "replace")[:1]
+    Lexer(prefix + char)._raise_no_match(char, len(prefix))
+
+
+def tokenize_file(path, interner=None):
+    """
+    用 mmap 映射文件并扫描，源码不会复制成 Python 对象。
+    返回的 BytesTokenBuffer 持有映射，用完后调用 close()；它的 line_index 属性可以交给 Parser 报告位置。
+    """
+    with open(path, "rb") as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError: # 空文件无法映射
+            data = b""
+    try:
+        buffer = tokenize_bytes(data, interner)
+    except Exception:
+        if isinstance(data, mmap.mmap):
+            data.close()
+        raise
+    buffer.line_index = ByteLineIndex(data)
+    return buffer
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("用法: python mmap_lexer.py 源文件")
+        return
+    try:
+        start = time.perf_counter()
+        buffer = tokenize_file(sys.argv[1])
+        elapsed = time.perf_counter() - start
+        size = len(buffer.source)
+        token_bytes = sum(a.itemsize * len(a) for a in (buffer.kinds, buffer.starts, buffer.ends))
+        print(f"文件 {size} 字节, Token 数: {len(buffer)}, Token 数组 {token_bytes} 字节, 耗时: {elapsed:.3f} s")
+        buffer.close()
+    except Exception as e:
+        print(f"错误: {e}")
+
+
+if __name__ == "__main__":
+    main()
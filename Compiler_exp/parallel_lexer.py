@@ -0,0 +1,136 @@
+# parallel_lexer.py
+# 多进程并行词法分析：把很大的源码在可证明安全的位置切成若干块，
+# 用 concurrent.futures 进程池分别扫描，再按原顺序拼接成一个带全局偏移的 TokenBuffer。
+# 用法: python parallel_lexer.py 源文件 [进程数]
+
+import os
+import re
+import sys
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from Lexer import CODE_EOF, Lexer, TokenBuffer
+
+# 源码短于这个长度时直接串行扫描：进程启动和传输数据的开销超过并行带来的收益
+MIN_PARALLEL_SIZE = 256 * 1024
+# 每个进程分到的块数，块多一些可以平衡各进程的负载
+CHUNKS_PER_WORKER = 4
+
+_WHITESPACE = re.compile(r"\s")
+
+
+def _is_safe_split(source, position):
+    """
+    position 处的空白字符是否可以作为切分点 (前一块到此为止，后一块从这里开始)。
+    只要不在 {...} 注释中、也不是字符常量 ' ' 中间的空格，它就属于某个空白 Token，
+    扫描器在这里处于初始状态，两边各自扫描的结果拼起来与整体扫描相同。
+    注释不嵌套且在第一个 '}' 处结束，所以如果 position 之前最后一个 '}' 在最后一个 '{' 之后
+    (或者根本没有 '{')，position 一定不在注释中。这个判断是保守的：
+    例如字符常量 '{' 会让之后的位置被误认为可能在注释中，只是少了一些切分点。
+    """
+    if source[position - 1:position] == "'" and source[position + 1:position + 2] == "'":
+        return False
+    last_open = source.rfind("{", 0, position)
+    return last_open < 0 or last_open < source.rfind("}", 0, position)
+
+
+def find_split_points(source, count):
+    """在 source 中找出最多 count - 1 个安全的切分位置 (递增)，尽量把源码均匀分成 count 块。"""
+    length = len(source)
+    points = []
+    for k in range(1, count):
+        position = max(k * length // count, points[-1] + 1 if points else 1)
+        limit = (k + 1) * length // count
+        while position < limit:
+            m = _WHITESPACE.search(source, position, limit)
+            if m is None:
+                break
+            candidate = m.start()
+            if _is_safe_split(source, candidate):
+                points.append(candidate)
+                break
+            if source[candidate - 1:candidate] == "'":
+                position = candidate + 1
+                continue
+            # 可能在注释中：跳到下一个 '}' 之后再找
+            close = source.find("}", candidate)
+            if close < 0:
+                break
+            position = close + 1
+    return points
+
+
+def _lex_chunk(text, base, offset_typecode, engine):
+    """
+    进程池中执行：扫描一块源码，返回 ("ok", 类型编码, 起始偏移, 结束偏移) 三个数组 (已加上全局偏移 base，去掉 EOF)，
+    或在词法错误时返回 ("error", 出错字符, 全局偏移)，由主进程按完整源码生成带行列号的错误信息。
+    """
+    lexer = Lexer(text, engine)
+    try:
+        buffer = lexer.tokenize_to_buffer()
+    except Exception:
+        return ("error", text[lexer.pos], base + lexer.pos)
+    count = len(buffer) - 1
+    kinds = buffer.kinds[:count]
+    starts = array(offset_typecode, (start + base for start in buffer.starts[:count]))
+    ends = array(offset_typecode, (end + base for end in buffer.ends[:count]))
+    return ("ok", kinds, starts, ends)
+
+
+def parallel_tokenize_to_buffer(source, workers=None, engine="regex", executor=None, min_parallel_size=MIN_PARALLEL_SIZE,
+                                interner=None):
+    """
+    与 Lexer(source, engine).tokenize_to_buffer() 结果相同 (包括词法错误的信息)，但各块在多个进程中并行扫描。
+    workers 默认为 CPU 数；可以传入已有的 executor 以复用进程池。
+    源码太短、只有一个进程或找不到切分点时退回串行扫描。
+    各进程只返回偏移，标识符在访问 Token 时才登记到 interner (默认新建) 中。
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(source) < min_parallel_size:
+        return Lexer(source, engine, interner).tokenize_to_buffer()
+    points = find_split_points(source, workers * CHUNKS_PER_WORKER)
+    if not points:
+        return Lexer(source, engine, interner).tokenize_to_buffer()
+
+    bounds = [0] + points + [len(source)]
+    buffer = TokenBuffer(source, interner)
+    typecode = buffer.starts.typecode
+    texts = [source[bounds[i]:bounds[i + 1]] for i in range(len(bounds) - 1)]
+    arguments = (texts, bounds[:-1], [typecode] * len(texts), [engine] * len(texts))
+    if executor is None:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_lex_chunk, *arguments))
+    else:
+        results = list(executor.map(_lex_chunk, *arguments))
+
+    for result in results:
+        if result[0] == "error":
+            # 前面各块都没有错误，所以这就是整体扫描时遇到的第一个错误
+            _, char, offset = result
+            Lexer(source, engine)._raise_no_match(char, offset)
+        _, kinds, starts, ends = result
+        buffer.kinds.extend(kinds)
+        buffer.starts.extend(starts)
+        buffer.ends.extend(ends)
+    buffer.append(CODE_EOF, len(source), len(source))
+    return buffer
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("用法: python parallel_lexer.py 源文件 [进程数]")
+        return
+    with open(sys.argv[1], encoding="utf-8") as f:
+        source = f.read()
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    try:
+        start = time.perf_counter()
+        buffer = parallel_tokenize_to_buffer(source, workers)
+        print(f"Token 数: {len(buffer)}  耗时: {time.perf_counter() - start:.3f} s")
+    except Exception as e:
+        print(f"错误: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# stream_check.py
+# 流式语法+语义检查：不为主程序体建立完整的 AST。
+# 声明部分 (程序头、type、var、过程声明) 解析完后先交给 SemanticAnalyzer，建好符号表；
+# 此后主程序体 begin ... end 中每解析出一条顶层语句，就立即做类型检查，然后丢弃 (或交给回调)。
+# 主程序体有几百万条语句时，峰值内存也只与声明部分和单条语句的大小有关，不随程序体长度增长。
+# 报告的错误和分析日志与先生成完整 AST 再 analyze() 完全相同 (analyze 本身就是 begin_analysis + finish_analysis)。
+# 用法: python stream_check.py 源文件
+
+import sys
+import time
+import tracemalloc
+
+from analyzer import SemanticAnalyzer
+from ASTparser import Parser
+from Lexer import Lexer, SymbolInterner
+
+
+class StreamingParser(Parser):
+    """
+    产生式与 Parser 完全相同 (包括错误信息)，只是主程序体的语句不接到 StmLK 下：
+    建立主程序体的 StmLK 时 (此时声明部分都已接到根节点下) 调用 on_declarations(根节点)，
+    之后每解析出一条主程序体语句调用 on_statement(语句节点)。parse() 返回的根节点中主程序体的 StmLK 是空的。
+    """
+    def __init__(self, tokens, on_declarations, on_statement, line_index=None):
+        self.on_declarations = on_declarations
+        self.on_statement = on_statement
+        self.main_body = None
+        self.statement_count = 0
+        self._procedure_depth = 0
+        super().__init__(tokens, line_index)
+
+    def proc_declaration(self):
+        # 过程体也由 program_body 解析，它的 StmLK 照常保留
+        self._procedure_depth += 1
+        try:
+            return super().proc_declaration()
+        finally:
+            self._procedure_depth -= 1
+
+    def build_node(self, node_type, value=None, start=None, sym=None):
+        node = super().build_node(node_type, value, start, sym)
+        # 过程声明之外建立的第一个 StmLK 就是主程序体 (if 语句的分支 StmLK 都在它之后建立)
+        if node_type == "StmLK" and self.main_body is None and self._procedure_depth == 0:
+            self.main_body = node
+            self.on_declarations(self.root)
+        return node
+
+    def attach(self, parent, child):
+        if parent is self.main_body:
+            if child is not None:
+                self.statement_count += 1
+                self.on_statement(child)
+        else:
+            parent.add_child(child)
+
+
+def check_streaming(source_code, on_statement=None, interner=None, trace_to_console=False):
+    """
+    对源码 (字符串或文本文件对象，后者按块读取) 做流式的词法、语法和语义分析。
+    每条主程序体语句检查完后交给 on_statement(语句节点) (可以为 None)，然后不再保留。
+    返回 (符号表条目, 错误列表, 分析日志, 主程序体语句数)，前三项与 SemanticAnalyzer.analyze 相同。
+    词法和语法错误与 generate_ast_from_source 一样抛出 (此时不返回语义分析结果)。
+    """
+    if interner is None:
+        interner = SymbolInterner()
+    if isinstance(source_code, str):
+        lexer = Lexer(source_code, interner=interner)
+    else:
+        lexer = Lexer.from_stream(source_code, interner=interner)
+    analyzer = SemanticAnalyzer(trace_to_console=trace_to_console, line_index=lexer.line_index, interner=interner)
+
+    def check_statement(stmt_node):
+        analyzer.analyze_statement(stmt_node)
+        if on_statement is not None:
+            on_statement(stmt_node)
+
+    parser = StreamingParser(lexer.iter_tokens(), analyzer.begin_analysis, check_statement, line_index=lexer.line_index)
+    parser.parse()
+    entries, errors, listing = analyzer.finish_analysis()
+    return entries, errors, listing, parser.statement_count
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("用法: python stream_check.py 源文件")
+        return
+    try:
+        tracemalloc.start()
+        start = time.perf_counter()
+        with open(sys.argv[1], encoding="utf-8") as f:
+            entries, errors, listing, statement_count = check_streaming(f)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        for message in errors:
+            print(message)
+        print(f"\n主程序体语句数: {statement_count}, 符号表条目: {len(entries)}, 语义错误: {len(errors)}")
+        print(f"耗时: {elapsed:.2f} s, 峰值内存: {peak / 2**20:.1f} MB")
+    except Exception as e:
+        print(f"错误: {e}")
+
+
+if __name__ == "__main__":
+    main()
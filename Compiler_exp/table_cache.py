@@ -0,0 +1,34 @@
+# table_cache.py
+# 生成代价较高的表 (dfa_lexer 的 DFA 转移表、ll1_parser 的 LL(1) 分析表) 以 JSON 缓存在 __pycache__ 中。
+# 缓存文件名带有规则或文法内容的摘要，内容不变时后续进程直接加载，不再重新生成。
+
+import json
+import os
+
+CACHE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "__pycache__")
+
+
+def load_cached_table(path, version, key, build, rebuild=False):
+    """
+    读取缓存文件 path 中的表 (version 和 key 都与参数相同时才采用)；不存在、已失效或 rebuild=True 时
+    调用 build() 生成，记下 key 后写入缓存。目录不可写时只是不缓存。
+    """
+    if not rebuild:
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == version and data.get("key") == key:
+                return data
+        except (OSError, ValueError):
+            pass
+    data = build()
+    data["key"] = key
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(temporary_path, path) # 原子替换，多个进程同时生成也不会读到半个文件
+    except OSError:
+        pass
+    return data
@@ -0,0 +1,20 @@
+# conftest.py
+# 测试与 benchmark.py 等脚本一样直接导入 Compiler_exp 下的模块，所以把这个目录加入 sys.path。
+
+import os
+import sys
+
+import pytest
+
+SOURCE_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SOURCE_DIRECTORY)
+
+
+@pytest.fixture(scope="session")
+def samples():
+    """Compiler_exp 下的示例程序：文件名 -> 源码。"""
+    result = {}
+    for name in ("test1.txt", "test2.txt"):
+        with open(os.path.join(SOURCE_DIRECTORY, name), encoding="utf-8") as f:
+            result[name] = f.read()
+    return result
@@ -0,0 +1,59 @@
+# test_analysis_listing.py
+# perform_semantic_analysis_from_source 在各详细程度下生成的分析日志：
+# LISTING_ERRORS 只有错误 (包括词法、语法错误)，LISTING_NORMAL 不含符号表快照，LISTING_FULL 是完整日志。
+
+import pytest
+
+from analysis_listing import LISTING_ERRORS, LISTING_FULL, LISTING_NORMAL
+from analyzer import perform_semantic_analysis_from_source
+
+LEXICAL_ERROR = "program p var integer x; begin x := # end."
+SYNTAX_ERROR = "program p var integer x; begin x := ; end."
+SEMANTIC_ERROR = "program p var integer x; begin y := 1 end."
+SNAPSHOT_END = "--- 快照结束"
+
+
+def listing_lines(source, level):
+    return list(perform_semantic_analysis_from_source(source, listing_level=level)[3])
+
+
+@pytest.mark.parametrize("source, expected", [
+    (LEXICAL_ERROR, "未知字符 #"),
+    (SYNTAX_ERROR, "Invalid factor"),
+    (SEMANTIC_ERROR, "变量 'y' 未声明"),
+])
+def test_errors_level_lists_exactly_the_errors(source, expected):
+    lines = listing_lines(source, LISTING_ERRORS)
+    assert len(lines) == 1
+    assert expected in lines[0]
+    assert lines[0] in listing_lines(source, LISTING_NORMAL)
+    assert lines[0] in listing_lines(source, LISTING_FULL)
+
+
+@pytest.mark.parametrize("source", [LEXICAL_ERROR, SYNTAX_ERROR])
+def test_lexical_and_syntax_errors_are_rendered_without_a_prefix(source):
+    lines = listing_lines(source, LISTING_FULL)
+    errors = [line for line in lines if line.startswith(("语法/词法分析错误", "分析过程中发生意外错误"))]
+    assert len(errors) == 1
+    assert not any(line.startswith("错误: ") for line in lines)
+
+
+def test_lexical_error_traceback_is_not_chained():
+    traceback = "".join(line for line in listing_lines(LEXICAL_ERROR, LISTING_FULL) if line.startswith("Traceback"))
+    assert traceback.count("Traceback") == 1
+    assert "LexicalError: 词法错误" in traceback
+    assert "direct cause" not in traceback and "During handling" not in traceback
+
+
+def test_normal_level_omits_only_the_snapshots(samples):
+    source = samples["test2.txt"]
+    normal = listing_lines(source, LISTING_NORMAL)
+    full = listing_lines(source, LISTING_FULL)
+    assert not any(line.startswith(SNAPSHOT_END) for line in normal)
+    assert any(line.startswith(SNAPSHOT_END) for line in full)
+    snapshot_lines = set(full) - set(normal)
+    assert [line for line in full if line not in snapshot_lines] == normal
+
+
+def test_errors_level_is_empty_for_a_valid_program(samples):
+    assert listing_lines(samples["test1.txt"], LISTING_ERRORS) == []
@@ -0,0 +1,92 @@
+# test_ast_file.py
+# 二进制 AST 文件 (ast_file.py)：保存后用 mmap 载入的 AST 与原 AST 的每个节点 (类型、值、起始偏移、符号 id) 都相同。
+
+import pytest
+
+from analyzer import SemanticAnalyzer
+from arena_ast import AstArena, generate_arena_ast_from_source
+from ast_file import load_ast, save_ast
+from ASTparser import format_ast_to_display_string, generate_ast_from_source
+from benchmark import generate_snl_program
+from Lexer import SymbolInterner
+
+
+def nodes(root):
+    """按先序遍历列出所有节点的 (类型, 值, 起始偏移, 符号 id, 子节点数)。"""
+    result, stack = [], [root]
+    while stack:
+        node = stack.pop()
+        children = list(node.children)
+        result.append((node.node_type, node.value, node.start, node.sym, len(children)))
+        stack.extend(reversed(children))
+    return result
+
+
+@pytest.fixture(scope="module")
+def programs(samples):
+    result = dict(samples)
+    result["合成程序"] = generate_snl_program(300)
+    return result
+
+
+def test_round_trip_keeps_every_node(programs, tmp_path):
+    path = str(tmp_path / "program.ast")
+    for name, source in programs.items():
+        interner = SymbolInterner()
+        ast = generate_ast_from_source(source, interner=interner)
+        assert save_ast(ast, path, source=source, interner=interner) == len(nodes(ast))
+        with load_ast(path) as mapped:
+            root = mapped.view()
+            assert nodes(root) == nodes(ast), name
+            assert format_ast_to_display_string(root) == format_ast_to_display_string(ast)
+            assert mapped.matches_source(source)
+            assert not mapped.matches_source(source + " ")
+            assert mapped.interner.names == interner.names
+            del root
+
+
+def test_arena_and_mapped_ast_can_be_saved_again(samples, tmp_path):
+    source = samples["test1.txt"]
+    arena = generate_arena_ast_from_source(source)
+    assert isinstance(arena, AstArena)
+    save_ast(arena, str(tmp_path / "first.ast"))
+    with load_ast(str(tmp_path / "first.ast")) as first:
+        save_ast(first, str(tmp_path / "second.ast"))
+        with load_ast(str(tmp_path / "second.ast")) as second:
+            assert nodes(second.view()) == nodes(first.view()) == nodes(arena.view())
+        assert not first.matches_source(source) # 保存时没有给出源码
+
+
+def test_loaded_ast_gives_the_same_semantic_analysis(samples, tmp_path):
+    path = str(tmp_path / "program.ast")
+    for source in samples.values():
+        interner = SymbolInterner()
+        ast = generate_ast_from_source(source, interner=interner)
+        save_ast(ast, path, source=source, interner=interner)
+        expected = SemanticAnalyzer(interner=interner).analyze(ast)
+        with load_ast(path) as mapped:
+            root = mapped.view()
+            entries, errors, listing = SemanticAnalyzer(interner=mapped.interner).analyze(root)
+            assert [str(entry) for entry in entries] == [str(entry) for entry in expected[0]]
+            assert errors == expected[1]
+            assert list(listing) == list(expected[2])
+            del root
+
+
+@pytest.mark.parametrize("content, message", [
+    (b"", "文件太短"),
+    (b"XXXX" + bytes(60), "魔数不匹配"),
+])
+def test_invalid_files_are_rejected(tmp_path, content, message):
+    path = tmp_path / "bad.ast"
+    path.write_bytes(content)
+    with pytest.raises(Exception, match=message):
+        load_ast(str(path))
+
+
+def test_truncated_file_is_rejected(samples, tmp_path):
+    path = tmp_path / "program.ast"
+    save_ast(generate_ast_from_source(samples["test1.txt"]), str(path))
+    path.write_bytes(path.read_bytes()[:-8])
+    with pytest.raises(Exception, match="文件长度应为"):
+        load_ast(str(path))
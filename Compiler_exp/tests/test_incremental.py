@@ -0,0 +1,137 @@
+# test_incremental.py
+# 增量词法分析 (incremental_lexer.py) 和增量语法分析 (incremental_parser.py)：
+# 每次编辑之后的 Token 序列、AST 和错误信息都与对新源码完整重新分析的结果相同。
+
+import random
+
+import pytest
+
+from ASTparser import generate_ast_from_source
+from benchmark import generate_snl_program
+from incremental_lexer import IncrementalLexer, edit_from_sources
+from incremental_parser import IncrementalParser
+from Lexer import Lexer
+
+# 随机编辑插入的文本：大多数中间状态仍能通过词法分析，少数 (例如删掉 := 中的 =) 会产生词法错误
+INSERTIONS = ["a", "1", " ", "\n", "+", ";", "x1", " := ", "{c}", "end", "(", ")"]
+
+
+class SmallBlockLexer(IncrementalLexer):
+    """很小的分片和分块，少量编辑就会拆分、合并块和分片。"""
+    PIECE_SIZE = 64
+    BLOCK_SIZE = 8
+    WINDOW_SIZE = 16
+
+
+def signature(tokens):
+    return [(t.type, t.value, t.start, t.end) for t in tokens]
+
+
+def nodes(root):
+    """按先序遍历列出所有节点的 (类型, 值, 起始偏移, 子节点数)。"""
+    result, stack = [], [root]
+    while stack:
+        node = stack.pop()
+        children = list(node.children)
+        result.append((node.node_type, node.value, node.start, len(children)))
+        stack.extend(reversed(children))
+    return result
+
+
+def random_edits(source, count, seed, accept):
+    """
+    依次产生 count 个编辑后的源码：在随机位置插入 INSERTIONS 中的文本，或删除一小段。
+    下一次编辑在 accept(源码) 为真的最近一个版本上进行，出错的版本不会一直累积下去。
+    """
+    rng = random.Random(seed)
+    for _ in range(count):
+        position = rng.randrange(len(source) + 1)
+        if rng.random() < 0.6 or not source:
+            new_source = source[:position] + rng.choice(INSERTIONS) + source[position:]
+        else:
+            new_source = source[:position] + source[position + rng.randrange(1, 6):]
+        yield new_source
+        if accept(new_source):
+            source = new_source
+
+
+def full_result(analyze, source):
+    try:
+        return analyze(source), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+
+def relex(source):
+    return full_result(lambda text: signature(Lexer(text).tokenize()), source)
+
+
+def reparse(source):
+    return full_result(lambda text: nodes(generate_ast_from_source(text)), source)
+
+
+def test_edit_from_sources():
+    assert edit_from_sources("begin x end", "begin yy end") == (6, 7, "yy")
+    assert edit_from_sources("abc", "abc") == (3, 3, "")
+
+
+@pytest.mark.parametrize("lexer_class", [IncrementalLexer, SmallBlockLexer])
+def test_lexer_matches_full_relex_after_every_edit(samples, lexer_class):
+    source = samples["test2.txt"] + generate_snl_program(20)
+    lexer = lexer_class(source)
+    for new_source in random_edits(source, 300, 1, lambda text: relex(text)[1] is None):
+        tokens, error = relex(new_source)
+        before = lexer.source
+        try:
+            lexer.update(new_source)
+        except Exception as e:
+            assert f"{type(e).__name__}: {e}" == error
+            assert lexer.source == before # 词法错误时保持编辑前的状态
+            continue
+        assert error is None
+        assert signature(lexer.tokens) == tokens
+        assert signature(lexer.iter_tokens(len(tokens) // 2)) == tokens[len(tokens) // 2:]
+
+
+def test_apply_edit_reports_the_replaced_tokens(samples):
+    source = samples["test1.txt"]
+    lexer = IncrementalLexer(source)
+    old_tokens = signature(lexer.tokens)
+    position = source.index("10")
+    first, old_stop, new_stop = lexer.apply_edit(position, position + 2, "12345")
+    new_tokens = signature(lexer.tokens)
+    shift = 3
+    assert old_tokens[:first] == new_tokens[:first]
+    assert [(kind, value, start + shift, end + shift) for kind, value, start, end in old_tokens[old_stop:]] == \
+        new_tokens[new_stop:]
+    assert ("INTC", "12345", position, position + 5) in new_tokens[first:new_stop]
+
+
+def test_parser_matches_full_parse_while_typing(samples):
+    # 在过程体和主程序体中逐个字符输入一条新语句，中间状态多数有语法错误
+    source = samples["test2.txt"]
+    parser = IncrementalParser()
+    for anchor, typed in (("write(a)", ";\n   a := a * (i + 2)"), ("q(v1)", ";\n   write(v1 - 1)")):
+        insertion_point = source.index(anchor) + len(anchor)
+        for length in range(len(typed) + 1):
+            new_source = source[:insertion_point] + typed[:length] + source[insertion_point:]
+            assert full_result(lambda text: nodes(parser.update(text)), new_source) == reparse(new_source), new_source
+        source = new_source
+
+
+def test_parser_matches_full_parse_after_random_edits():
+    source = generate_snl_program(60, procedure_count=6)
+    parser = IncrementalParser(source)
+    parser.update(source)
+    for new_source in random_edits(source, 200, 3, lambda text: reparse(text)[1] is None):
+        assert full_result(lambda text: nodes(parser.update(text)), new_source) == reparse(new_source)
+
+
+def test_earlier_asts_stay_valid(samples):
+    source = samples["test2.txt"]
+    parser = IncrementalParser()
+    first = parser.update(source)
+    expected = nodes(first)
+    position = source.index("q(v1)")
+    parser.update(source[:position] + "   " + source[position:])
+    assert nodes(first) == expected
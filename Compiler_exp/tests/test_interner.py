@@ -0,0 +1,44 @@
+# test_interner.py
+# 标识符驻留表 (SymbolInterner) 与符号表：只有给出生成 AST 的驻留表时，语义分析才用节点上的符号 id 作为键。
+
+import pytest
+
+from analyzer import SemanticAnalyzer
+from ASTparser import generate_ast_from_source
+from Lexer import SymbolInterner
+
+# 预定义类型 boolean 在新驻留表中的 id 与另一个驻留表中程序的第一个标识符 (程序名) 相同
+COLLIDING_PROGRAMS = [
+    "program p var boolean b; integer a; begin a := 1 end.",
+    "program p type t = integer; var t v; begin v := 1 end.",
+]
+
+
+def analysis_result(analyzer, ast):
+    entries, errors, listing = analyzer.analyze(ast)
+    return [str(entry) for entry in entries], errors, list(listing)
+
+
+@pytest.mark.parametrize("source", COLLIDING_PROGRAMS)
+def test_ast_from_a_separate_interner_is_keyed_by_name(source):
+    ast = generate_ast_from_source(source, interner=SymbolInterner())
+    entries, errors, listing = SemanticAnalyzer().analyze(ast)
+    assert errors == []
+    assert {"boolean", "p"} <= {entry.name for entry in entries}
+
+
+@pytest.mark.parametrize("source", COLLIDING_PROGRAMS + ["program p var integer a; begin a := zz + 1; q(a) end."])
+def test_separate_and_shared_interners_give_the_same_analysis(source):
+    separate = analysis_result(SemanticAnalyzer(), generate_ast_from_source(source))
+    interner = SymbolInterner()
+    shared = analysis_result(SemanticAnalyzer(interner=interner), generate_ast_from_source(source, interner=interner))
+    assert separate == shared
+
+
+def test_shared_interner_keys_the_table_by_symbol_id():
+    interner = SymbolInterner()
+    ast = generate_ast_from_source(COLLIDING_PROGRAMS[0], interner=interner)
+    analyzer = SemanticAnalyzer(interner=interner)
+    analyzer.analyze(ast)
+    assert analyzer.symbol_table.find("p", interner.get("p")).name == "p"
+    assert analyzer.symbol_table.find("boolean").name == "boolean"
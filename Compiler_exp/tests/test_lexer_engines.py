@@ -0,0 +1,116 @@
+# test_lexer_engines.py
+# 各种词法分析方式 (Lexer.SCAN_ENGINES 中的引擎、按块读取、多进程分块、mmap 字节扫描) 产生完全相同的 Token 序列和词法错误。
+
+import io
+import sys
+
+import pytest
+
+from benchmark import generate_snl_program
+from Lexer import SCAN_ENGINES, Lexer
+from mmap_lexer import WHITESPACE_CHARS, tokenize_bytes, tokenize_file
+from parallel_lexer import parallel_tokenize_to_buffer
+
+LEXICAL_ERRORS = [
+    "program p\nvar integer x;\nbegin\n  x := 1 ? 2\nend.",
+    "program p\nvar integer x;\nbegin\n  x : 1\nend.",
+    "program p\nbegin\n  { 注释没有结束\nend.",
+]
+
+
+@pytest.fixture(scope="module")
+def corpus(samples):
+    result = dict(samples)
+    result["合成程序"] = generate_snl_program(300)
+    return result
+
+
+def signature(tokens):
+    return [(t.type, t.value, t.start, t.end) for t in tokens]
+
+
+def buffer_signature(buffer):
+    return [(buffer.type_at(i), buffer.value_at(i), buffer.starts[i], buffer.ends[i]) for i in range(len(buffer))]
+
+
+def lexical_error(tokenize):
+    with pytest.raises(Exception) as info:
+        tokenize()
+    return str(info.value)
+
+
+@pytest.mark.parametrize("engine", [engine for engine in SCAN_ENGINES if engine != "regex"])
+def test_engines_give_the_same_tokens(corpus, engine):
+    for source in corpus.values():
+        assert signature(Lexer(source, engine).tokenize()) == signature(Lexer(source).tokenize())
+
+
+@pytest.mark.parametrize("engine", list(SCAN_ENGINES))
+@pytest.mark.parametrize("source", LEXICAL_ERRORS)
+def test_engines_give_the_same_lexical_errors(engine, source):
+    assert lexical_error(lambda: Lexer(source, engine).tokenize()) == lexical_error(lambda: Lexer(source).tokenize())
+
+
+@pytest.mark.parametrize("engine", list(SCAN_ENGINES))
+def test_streamed_source_gives_the_same_tokens(corpus, engine):
+    for source in corpus.values():
+        streamed = Lexer.from_stream(io.StringIO(source), chunk_size=7, engine=engine).tokenize()
+        assert signature(streamed) == signature(Lexer(source).tokenize())
+
+
+def test_token_buffer_matches_token_list(corpus):
+    for source in corpus.values():
+        assert buffer_signature(Lexer(source).tokenize_to_buffer()) == signature(Lexer(source).tokenize())
+
+
+@pytest.mark.parametrize("engine", ["regex", "dfa"])
+def test_parallel_lexing_matches_serial(corpus, engine):
+    source = corpus["合成程序"]
+    buffer = parallel_tokenize_to_buffer(source, workers=2, engine=engine, min_parallel_size=0)
+    assert buffer_signature(buffer) == buffer_signature(Lexer(source, engine).tokenize_to_buffer())
+
+
+def test_parallel_lexing_reports_the_first_lexical_error():
+    source = generate_snl_program(300)
+    position = source.index(":=", len(source) // 2)
+    source = source[:position] + "?" + source[position + 1:]
+    serial = lexical_error(lambda: Lexer(source).tokenize_to_buffer())
+    assert lexical_error(lambda: parallel_tokenize_to_buffer(source, workers=2, min_parallel_size=0)) == serial
+
+
+def char_offsets(data):
+    """UTF-8 字节偏移 -> 字符偏移。"""
+    offsets, position = {}, 0
+    for index, char in enumerate(data.decode("utf-8")):
+        offsets[position] = index
+        position += len(char.encode("utf-8"))
+    offsets[position] = len(data.decode("utf-8"))
+    return offsets
+
+
+def test_mmap_lexing_matches_str_lexing(corpus, tmp_path):
+    for name, source in corpus.items():
+        path = tmp_path / "source.snl"
+        path.write_bytes(source.encode("utf-8"))
+        buffer = tokenize_file(str(path))
+        try:
+            offsets = char_offsets(bytes(buffer.source))
+            mapped = [(kind, value, offsets[start], offsets[end]) for kind, value, start, end in buffer_signature(buffer)]
+        finally:
+            buffer.close()
+        assert mapped == buffer_signature(Lexer(source).tokenize_to_buffer()), name
+
+
+def test_mmap_whitespace_matches_str_isspace():
+    assert WHITESPACE_CHARS == "".join(chr(code) for code in range(sys.maxunicode + 1) if chr(code).isspace())
+
+
+def test_mmap_lexing_skips_unicode_whitespace():
+    source = "program\u3000p\xa0begin\u2028  x := 1\u2009+\x852\nend."
+    buffer = tokenize_bytes(source.encode("utf-8"))
+    assert [buffer.value_at(i) for i in range(len(buffer))] == [t.value for t in Lexer(source).tokenize()]
+
+
+@pytest.mark.parametrize("source", LEXICAL_ERRORS)
+def test_mmap_lexing_gives_the_same_lexical_errors(source):
+    assert lexical_error(lambda: tokenize_bytes(source.encode("utf-8"))) == lexical_error(lambda: Lexer(source).tokenize())
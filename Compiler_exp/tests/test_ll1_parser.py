@@ -0,0 +1,65 @@
+# test_ll1_parser.py
+# 表驱动的 LL(1) 分析 (ll1_parser.py) 与递归下降 (ASTparser.Parser)：生成相同的 AST，拒绝相同的输入，出错位置相同。
+
+import pytest
+
+from ASTparser import Parser, format_ast_to_display_string, generate_ast_from_source
+from benchmark import generate_expression_program, generate_snl_program
+from Lexer import Lexer
+from ll1_parser import LL1Parser, LL1Table, build_ll1_table, generate_ll1_ast_from_source
+
+SYNTAX_ERRORS = [
+    "program p\nvar integer x;\nbegin\n  x := 1\n  x := 2\nend.",
+    "program p\nvar integer x;\nbegin\n  x := ;\nend.",
+    "program p\nvar integer x;\nbegin\n  if x < 1 then x := 1 else x := 2\nend.",
+    "program p\nvar integer x\nbegin\n  x := 1\nend.",
+    "program p\ntype t = array [1..] of integer;\nbegin\n  x := 1\nend.",
+    "program p\nbegin\n  x := 1\nend",
+    "program p\nbegin\n  x := 1\nend. x",
+    "program p\nprocedure q(integer a; var b);\nbegin\n  x := 1\nend\nbegin\n  q(1, 2)\nend.",
+    "program p\nbegin\n  while x < 1 do x := 1 end\nend.",
+    "program p\nbegin\n  x := (1 + 2\nend.",
+    "program p\nbegin\n  x := a[1 + \nend.",
+]
+
+
+def syntax_error(parse, source):
+    with pytest.raises(SyntaxError) as info:
+        parse(source)
+    return str(info.value)
+
+
+def error_location(message):
+    """错误信息中由 Parser._error_context 给出的位置部分 (没有位置的错误返回整条信息)。"""
+    return message[message.find(" (在词法单元索引"):]
+
+
+def test_same_ast_as_recursive_descent(samples):
+    programs = list(samples.values()) + [generate_snl_program(300), generate_expression_program(300)]
+    for source in programs:
+        assert format_ast_to_display_string(generate_ll1_ast_from_source(source)) == \
+            format_ast_to_display_string(generate_ast_from_source(source))
+
+
+def test_deep_nesting_does_not_hit_the_recursion_limit():
+    depth = 5_000
+    source = "program deep\nvar integer x;\nbegin\n" + "if x < 1 then " * depth + "x := 1" + " fi" * depth + "\nend.\n"
+    if_count, stack = 0, [generate_ll1_ast_from_source(source)]
+    while stack:
+        node = stack.pop()
+        if_count += node.value == "If"
+        stack.extend(node.children)
+    assert if_count == depth
+
+
+@pytest.mark.parametrize("source", SYNTAX_ERRORS)
+def test_rejects_the_same_inputs_at_the_same_position(source):
+    recursive = syntax_error(generate_ast_from_source, source)
+    table_driven = syntax_error(generate_ll1_ast_from_source, source)
+    assert error_location(table_driven) == error_location(recursive)
+
+
+def test_cached_table_matches_the_grammar():
+    tokens = Lexer(generate_snl_program(100)).tokenize()
+    fresh = LL1Parser(tokens, table=LL1Table(build_ll1_table())).parse()
+    assert format_ast_to_display_string(fresh) == format_ast_to_display_string(Parser(tokens).parse())
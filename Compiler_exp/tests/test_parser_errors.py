@@ -0,0 +1,21 @@
+# test_parser_errors.py
+# 语法错误信息的格式：出错位置只由 Parser._error_context() 给出一次。
+
+import pytest
+
+from ASTparser import generate_ast_from_source, parse_with_recovery
+
+MISSING_SEMICOLON = "program p\nvar integer x;\nbegin\n  x := 1\n  x := 2\nend."
+
+
+def test_mismatch_reports_its_location_once():
+    with pytest.raises(SyntaxError) as raised:
+        generate_ast_from_source(MISSING_SEMICOLON)
+    message = str(raised.value)
+    assert message == ("语法分析意外中断: 语法错误: 期待类型 KEYWORD, 实际 ID (x) "
+                       "(在词法单元索引 10 附近 (行:列 5:3), 当前词法单元: (ID, x))")
+
+
+def test_recorded_mismatch_reports_its_location_once():
+    ast, errors = parse_with_recovery(MISSING_SEMICOLON)
+    assert errors == ["语法错误: 期待类型 ;, 实际 ID (x) (在词法单元索引 10 附近 (行:列 5:3), 当前词法单元: (ID, x))"]
@@ -0,0 +1,59 @@
+# test_parser_recovery.py
+# 语法错误恢复模式 (parse_with_recovery)：一次解析报告所有相互独立的语法错误，每个错误只报告一次。
+
+import re
+
+from ASTparser import format_ast_to_display_string, generate_ast_from_source, parse_with_recovery
+
+LOCATION = re.compile(r"在词法单元索引 \d+ 附近 \(行:列 (\d+:\d+)\)")
+
+
+def error_locations(errors):
+    return [LOCATION.search(error).group(1) for error in errors]
+
+
+def test_missing_semicolon_does_not_stop_the_statement_list():
+    source = "program p\nvar integer x;\nbegin\n  x := 1\n  x := 2;\n  x := ;\nend."
+    ast, errors = parse_with_recovery(source)
+    assert error_locations(errors) == ["5:3", "6:8"]
+    assert "期待类型 ;" in errors[0]
+    assert "Invalid factor" in errors[1]
+    assert len(ast.children[-1].children) == 2 # 出错的第三条语句之外，前两条都在 AST 中
+
+
+def test_independent_errors_in_procedure_main_body_and_if():
+    source = ("program p\n"
+              "var integer x;\n"
+              "procedure q();\n"
+              "begin\n"
+              "  x := 1\n"
+              "  x := 2\n"
+              "end\n"
+              "begin\n"
+              "  if x < 1 then x := 1 x := ; else write(x) fi;\n"
+              "  x := ;\n"
+              "  x := 3 +\n"
+              "end.")
+    ast, errors = parse_with_recovery(source)
+    assert error_locations(errors) == ["6:3", "9:24", "9:29", "10:8", "12:1"]
+    assert len(set(errors)) == len(errors)
+
+
+def test_cascading_errors_at_one_token_are_reported_once():
+    # 缺少 end 之后又缺少 "." 和 "输入未完全解析"，都停在同一个 Token 上
+    ast, errors = parse_with_recovery("program p\nvar integer x;\nbegin\n  x := 1\n  ) x := 2\nend.")
+    assert error_locations(errors) == ["5:3"]
+
+
+def test_valid_programs_parse_the_same_as_normal_mode(samples):
+    for source in samples.values():
+        ast, errors = parse_with_recovery(source)
+        assert errors == []
+        assert format_ast_to_display_string(ast) == format_ast_to_display_string(generate_ast_from_source(source))
+
+
+def test_error_count_is_capped():
+    body = ";\n".join(["  x := "] * 20)
+    ast, errors = parse_with_recovery(f"program p\nvar integer x;\nbegin\n{body}\nend.", max_errors=5)
+    assert len(errors) == 6
+    assert errors[-1].startswith("语法错误过多")
@@ -0,0 +1,74 @@
+# test_stream_check.py
+# 流式检查 (stream_check.check_streaming) 与先生成完整 AST 再做语义分析的结果相同：符号表、错误和分析日志都一致。
+
+import io
+
+import pytest
+
+from analyzer import SemanticAnalyzer
+from ASTparser import Parser
+from benchmark import generate_snl_program
+from Lexer import Lexer, SymbolInterner
+from stream_check import check_streaming
+
+SEMANTIC_ERRORS = [
+    "program p\nvar integer a;\nbegin\n  a := zz + 1;\n  q(a);\n  write(c)\nend.",
+    "program p\ntype t = integer; t = char;\nvar t v; u w; integer v;\nbegin\n  v := w;\n  p := 1;\n  a[1] := 2\nend.",
+    "program p\nvar integer a;\nprocedure q(integer x; var integer y);\nvar integer a;\nbegin\n  y := x + a\nend\n"
+    "begin\n  q(1);\n  q(1, 2);\n  read(b)\nend.",
+]
+
+
+def full_analysis(source):
+    interner = SymbolInterner()
+    lexer = Lexer(source, interner=interner)
+    ast = Parser(lexer.iter_tokens(), line_index=lexer.line_index).parse()
+    entries, errors, listing = SemanticAnalyzer(line_index=lexer.line_index, interner=interner).analyze(ast)
+    return [str(entry) for entry in entries], errors, list(listing), len(ast.children[-1].children)
+
+
+def streamed_analysis(source):
+    entries, errors, listing, statement_count = check_streaming(source)
+    return [str(entry) for entry in entries], errors, list(listing), statement_count
+
+
+@pytest.fixture(scope="module")
+def programs(samples):
+    synthetic = generate_snl_program(300).replace("   w0 := v1 + w0", "   w0 := zz + w0")
+    return list(samples.values()) + SEMANTIC_ERRORS + [synthetic]
+
+
+def test_same_result_as_full_analysis(programs):
+    for source in programs:
+        assert streamed_analysis(source) == full_analysis(source)
+
+
+def test_semantic_errors_are_reported(programs):
+    for source in SEMANTIC_ERRORS:
+        assert streamed_analysis(source)[1]
+
+
+def test_file_object_gives_the_same_result(programs):
+    for source in programs:
+        entries, errors, listing, statement_count = check_streaming(io.StringIO(source))
+        assert ([str(entry) for entry in entries], errors, list(listing), statement_count) == full_analysis(source)
+
+
+def test_statements_are_handed_out_in_order(samples):
+    source = samples["test1.txt"]
+    seen = []
+    check_streaming(source, on_statement=lambda node: seen.append(str(node)))
+    assert seen == [str(statement) for statement in Parser(Lexer(source).tokenize()).parse().children[-1].children]
+
+
+@pytest.mark.parametrize("source", [
+    "program p\nvar integer x;\nbegin\n  x := 1\n  x := 2\nend.",
+    "program p\nvar integer x;\nbegin\n  x := 1 ? 2\nend.",
+])
+def test_lexical_and_syntax_errors_are_raised_like_the_full_parse(source):
+    lexer = Lexer(source)
+    with pytest.raises(Exception) as expected:
+        Parser(lexer.iter_tokens(), line_index=lexer.line_index).parse()
+    with pytest.raises(type(expected.value)) as streamed:
+        check_streaming(source)
+    assert str(streamed.value) == str(expected.value)